@@ -6,7 +6,6 @@ from .extensions import db, migrate, jwt, cors
 
 # Add these imports for logging
 import logging
-from logging.handlers import RotatingFileHandler
 
 def create_app(config_name='dev'):
     app = Flask(__name__)
@@ -41,6 +40,10 @@ def create_app(config_name='dev'):
     # cors.init_app(app, resources={r"/api/*": {"origins": "*"}}) # Adjust origins for production
     cors.init_app(app, supports_credentials=True, origins="*")
 
+    # Wake long-poll/SSE status requests when a paper's processing stage is committed
+    from .services.status_notifier import register_session_listeners
+    register_session_listeners()
+
     # --- Logging Configuration ---
     if True: #not app.debug and not app.testing: # Only enable file logging when not in debug or testing
         # Define log directory (one level up from app.root_path, then into 'logs')
@@ -56,34 +59,12 @@ def create_app(config_name='dev'):
         # Log file path
         log_file = os.path.join(log_dir, 'app.log')
 
-        # Rotating File Handler
-        # Max 10MB per file, keep last 5 backup files
-        file_handler = RotatingFileHandler(log_file, maxBytes=1024 * 1024 * 10, backupCount=5, encoding='utf-8')
-        
-        # Log Formatter
-        # Example format: 2023-10-27 10:30:00,123 INFO in module:message (lineno)
-        log_formatter = logging.Formatter(
-            '%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]'
-        )
-        file_handler.setFormatter(log_formatter)
-        
-        # Set Log Level for the file handler
-        # You can get this from app.config if you want to make it configurable
-        file_handler.setLevel(logging.INFO) # Or logging.WARNING, logging.ERROR
-
-        # Add the file handler to the Flask app's logger
-        # app.logger is a standard Python logger, so you can add handlers to it.
-        # If you want to log Werkzeug requests as well, you might need to configure the root logger
-        # or Werkzeug's specific logger, but app.logger handles app-specific logs.
-        
-        # Clear existing handlers if any (e.g., default StreamHandler)
-        # if you want *only* file logging and not console output in production.
-        # Be careful with this if other extensions add handlers.
-        # app.logger.handlers.clear() # Optional: if you want ONLY file logging
-
-        app.logger.addHandler(file_handler)
-        app.logger.setLevel(logging.INFO) # Set overall app logger level
-        
+        # Records are queued and written (file and console) by a listener thread, as JSON lines with request/job IDs
+        from flask.logging import default_handler
+        from .logging_setup import configure_logging
+        app.logger.removeHandler(default_handler) # Console output moves to the listener thread as well
+        configure_logging(app, log_file)
+
         # Log that the logger itself is configured
         app.logger.info('Application logging to file configured.')
     else:
@@ -97,20 +78,43 @@ def create_app(config_name='dev'):
     from .api.auth import auth_bp
     from .api.papers import papers_bp
     from .api.rag import rag_bp
+    from .api.admin import admin_bp
 
     app.register_blueprint(auth_bp, url_prefix='/api/auth')
     app.register_blueprint(papers_bp, url_prefix='/api/papers')
     app.register_blueprint(rag_bp, url_prefix='/api/rag')
+    app.register_blueprint(admin_bp, url_prefix='/api/admin')
+
+    # Request IDs for log records (and the X-Request-ID response header)
+    from .logging_setup import register_request_ids
+    register_request_ids(app)
+
+    # Tracing spans (TRACING_ENABLED): one server span per request, after the request ID is bound
+    from .tracing import configure_tracing, register_request_spans
+    configure_tracing(app)
+    register_request_spans(app)
+
+    # On-demand sampling profiler (admin switch or X-Profile header), writes folded stacks to PROFILE_DIR
+    from .profiling import register_profiling
+    register_profiling(app)
+
+    # Compress large JSON responses (chat sources, search results)
+    from .api.utils import gzip_response
+    app.after_request(gzip_response)
+
+    # Custom flask CLI commands
+    from .cli import register_cli
+    register_cli(app)
 
     # Shell context for flask cli
     @app.shell_context_processor
     def ctx():
         from app.models.user import User
-        from app.models.paper import PaperMetadata
+        from app.models.paper import PaperMetadata, PaperSummary
         from app.models.chat import ChatMessage, ChatSession
         return {
             'app': app, 'db': db, 
-            'User': User, 'PaperMetadata': PaperMetadata, 
+            'User': User, 'PaperMetadata': PaperMetadata, 'PaperSummary': PaperSummary,
             'ChatMessage': ChatMessage, 'ChatSession': ChatSession
         }
 
@@ -0,0 +1,58 @@
+# app/api/admin.py
+import functools
+import os
+from flask import Blueprint, request, jsonify, current_app, send_from_directory
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from app.profiling import profiling_switch, is_admin
+
+admin_bp = Blueprint('admin_bp', __name__)
+
+def admin_required(view):
+    """jwt_required, plus the user must be listed in ADMIN_USER_IDS."""
+    @functools.wraps(view)
+    @jwt_required()
+    def wrapper(*args, **kwargs):
+        if not is_admin(get_jwt_identity()):
+            return jsonify({"msg": "Admin access required"}), 403
+        return view(*args, **kwargs)
+    return wrapper
+
+def _profiling_state() -> dict:
+    profile_dir = current_app.config['PROFILE_DIR']
+    profiles = []
+    if os.path.isdir(profile_dir):
+        entries = sorted((entry for entry in os.scandir(profile_dir) if entry.name.endswith(".folded")), key=lambda entry: entry.stat().st_mtime, reverse=True)
+        profiles = [{"name": entry.name, "size": entry.stat().st_size} for entry in entries]
+    return {**profiling_switch.state(profile_dir), "profiles": profiles}
+
+@admin_bp.route('/profiling', methods=['GET'])
+@admin_required
+def get_profiling():
+    """The sampling switch and the stored profiles (newest first)."""
+    return jsonify(_profiling_state()), 200
+
+@admin_bp.route('/profiling', methods=['PUT'])
+@admin_required
+def set_profiling():
+    """Profiles a fraction of all requests for a limited time; sample_rate 0 switches it off."""
+    data = request.get_json(silent=True) or {}
+    try:
+        sample_rate = float(data.get("sample_rate", 0))
+        duration_seconds = int(data.get("duration_seconds", current_app.config.get('PROFILE_DEFAULT_DURATION_SECONDS', 600)))
+    except (TypeError, ValueError):
+        return jsonify({"msg": "sample_rate must be a number and duration_seconds an integer"}), 400
+    if not 0 <= sample_rate <= 1 or duration_seconds <= 0:
+        return jsonify({"msg": "sample_rate must be between 0 and 1 and duration_seconds positive"}), 400
+
+    duration_seconds = min(duration_seconds, current_app.config.get('PROFILE_MAX_DURATION_SECONDS', 3600))
+    profiling_switch.set(current_app.config['PROFILE_DIR'], sample_rate, duration_seconds)
+    current_app.logger.info(f"Request profiling set to sample_rate={sample_rate} for {duration_seconds}s by user {get_jwt_identity()}")
+    return jsonify(_profiling_state()), 200
+
+@admin_bp.route('/profiling/<path:name>', methods=['GET'])
+@admin_required
+def download_profile(name):
+    """One profile in folded-stacks format (e.g. for flamegraph.pl or speedscope)."""
+    if not name.endswith(".folded"):
+        return jsonify({"msg": "Profile not found"}), 404
+    return send_from_directory(current_app.config['PROFILE_DIR'], name, mimetype='text/plain') # Rejects paths outside the directory
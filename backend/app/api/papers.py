@@ -1,5 +1,5 @@
 # app/api/papers.py
-from flask import Blueprint, request, jsonify, current_app
+from flask import Blueprint, request, jsonify, current_app, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from app.extensions import db
 from app.models.user import User
@@ -9,74 +9,230 @@ from app.core.summarizer_service import SummarizerService
 from app.core.download_service import DownloadService
 from app.core.processing_service import ProcessingService
 from app.core.rag_service import RAGService # For indexing
+from app.api.utils import sse_event
+from app.services.status_notifier import status_notifier
+from app.db_sessions import worker_session, read_session
+from app.logging_setup import log_context, new_id, propagate_context
+from app.tracing import span
 import datetime
+import hashlib
+import time
+from pathlib import Path
 import threading # For simple background tasks, consider Celery for production
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 papers_bp = Blueprint('papers_bp', __name__)
 
-def process_paper_background(app_context, paper_metadata_id):
-    """Helper function to run paper processing in a background thread."""
-    with app_context: # Use the app context in the new thread
+def _set_paper_fields(paper_metadata_id: int, **fields) -> None:
+    """Updates one paper in a short transaction of its own."""
+    with worker_session() as session:
+        paper = session.get(PaperMetadata, paper_metadata_id)
+        for name, value in fields.items():
+            setattr(paper, name, value)
+
+def _record_processing_failure(paper_metadata_id: int, stage: str, error) -> None:
+    with worker_session() as session:
+        ProcessingService.record_failure(session.get(PaperMetadata, paper_metadata_id), stage, error)
+
+def process_paper_background(app, paper_metadata_id, retry_now=False):
+    """
+    Helper function to run paper processing in a background thread.
+    The thread pushes its own app context. Each stage update is a short worker_session transaction,
+    so no pool connection is held while the PDF downloads, the text is extracted or the chunks are embedded.
+    The run starts by claiming the paper (ProcessingService.claim); if another worker holds it, it does nothing.
+    """
+    # Log records of this run share a job ID (and the ID of the request that started it, if any)
+    with app.app_context(), log_context(job_id=f"process-{paper_metadata_id}-{new_id()}"), \
+         span("process_paper", paper_db_id=paper_metadata_id) as job_span:
         current_app.logger.info(f"Background processing started for paper ID: {paper_metadata_id}")
-        paper = db.session.get(PaperMetadata, paper_metadata_id) # Use db.session.get for simplicity
+        with worker_session() as session:
+            claimed = ProcessingService.claim(session, paper_metadata_id, retry_now=retry_now)
+            paper = session.get(PaperMetadata, paper_metadata_id)
+            if paper:
+                # Plain values for the stages below: the instance is detached once the session closes
+                arxiv_id, title, pdf_url, local_pdf_path = paper.arxiv_id, paper.title, paper.pdf_url, paper.local_pdf_path
         if not paper:
             current_app.logger.error(f"PaperMetadata with id {paper_metadata_id} not found in background task.")
+            job_span.set_error("Paper not found")
+            return
+        if not claimed:
+            current_app.logger.info(f"Paper {arxiv_id} was claimed by another worker or is not due; skipping.")
+            job_span.set_attribute("skipped", True)
             return
 
         try:
             # 1. Download (if not already) - DownloadService now returns path
-            if not paper.local_pdf_path or not Path(paper.local_pdf_path).exists():
-                pdf_info = [{"pdf_url": paper.pdf_url, "paper_id": paper.arxiv_id}]
-                downloaded_paths = DownloadService.download_paper_pdfs(pdf_info)
+            if not local_pdf_path or not Path(local_pdf_path).exists():
+                pdf_info = [{"pdf_url": pdf_url, "paper_id": arxiv_id}]
+                with span("process_paper.download", paper_id=arxiv_id):
+                    downloaded_paths = DownloadService.download_paper_pdfs(pdf_info)
                 if downloaded_paths:
-                    paper.local_pdf_path = downloaded_paths[0]
-                    paper.downloaded_at = datetime.datetime.now(datetime.timezone.utc)
-                    db.session.commit()
-                    current_app.logger.info(f"PDF downloaded for {paper.arxiv_id} to {paper.local_pdf_path}")
+                    local_pdf_path = downloaded_paths[0]
+                    _set_paper_fields(paper_metadata_id, local_pdf_path=local_pdf_path, downloaded_at=datetime.datetime.now(datetime.timezone.utc))
+                    current_app.logger.info(f"PDF downloaded for {arxiv_id} to {local_pdf_path}")
                 else:
-                    current_app.logger.error(f"Failed to download PDF for {paper.arxiv_id}")
-                    paper.source = f"{paper.source} (Download Failed)" # Update status
-                    db.session.commit()
+                    current_app.logger.error(f"Failed to download PDF for {arxiv_id}")
+                    _record_processing_failure(paper_metadata_id, "download", "PDF download failed")
+                    job_span.set_error("download: PDF download failed")
                     return # Stop if download fails
 
-            # 2. Extract Text
-            raw_text = ProcessingService.extract_text(paper.local_pdf_path)
-            if raw_text:
-                paper.text_extracted_at = datetime.datetime.now(datetime.timezone.utc)
-                db.session.commit()
-                current_app.logger.info(f"Text extracted for {paper.arxiv_id}")
+            # 2. Extract Text (per page, so chunks can keep page numbers)
+            with span("process_paper.extract", paper_id=arxiv_id) as stage_span:
+                raw_pages = ProcessingService.extract_pages(local_pdf_path)
+                stage_span.set_attribute("pages", len(raw_pages or []))
+            if raw_pages and any(page.strip() for page in raw_pages):
+                _set_paper_fields(paper_metadata_id, text_extracted_at=datetime.datetime.now(datetime.timezone.utc))
+                current_app.logger.info(f"Text extracted for {arxiv_id}")
             else:
-                current_app.logger.error(f"Failed to extract text for {paper.arxiv_id}")
-                paper.source = f"{paper.source} (Extraction Failed)"
-                db.session.commit()
+                current_app.logger.error(f"Failed to extract text for {arxiv_id}")
+                _record_processing_failure(paper_metadata_id, "extract", "No text could be extracted")
+                job_span.set_error("extract: No text could be extracted")
                 return # Stop if extraction fails
 
-            # 3. Clean Text
-            cleaned_text = ProcessingService.clean_text(raw_text)
-            paper.cleaned_text_at = datetime.datetime.now(datetime.timezone.utc)
+            # 3. Clean Text and split it into section-aware chunks
+            with span("process_paper.clean_chunk", paper_id=arxiv_id) as stage_span:
+                chunks = ProcessingService.build_chunks(raw_pages)
+                stage_span.set_attribute("chunks", len(chunks))
             # Not storing full cleaned_text in DB to avoid large data, it's used for indexing
-            db.session.commit()
-            current_app.logger.info(f"Text cleaned for {paper.arxiv_id}")
-
-            # 4. Chunk and Index
-            collection_name = RAGService.index_paper_content(
-                paper_id=paper.arxiv_id, # This is the ArXiv ID like "2303.08774v1"
-                paper_title=paper.title,
-                paper_text=cleaned_text
-            )
+            _set_paper_fields(paper_metadata_id, cleaned_text_at=datetime.datetime.now(datetime.timezone.utc))
+            current_app.logger.info(f"Text cleaned for {arxiv_id} ({len(chunks)} chunks)")
+
+            # 4. Index
+            with span("process_paper.index", paper_id=arxiv_id):
+                collection_name = RAGService.index_paper_content(
+                    paper_id=arxiv_id, # This is the ArXiv ID like "2303.08774v1"
+                    paper_title=title,
+                    chunks=chunks
+                )
             if collection_name:
-                paper.qdrant_collection_name = collection_name
-                paper.indexed_at = datetime.datetime.now(datetime.timezone.utc)
-                db.session.commit()
-                current_app.logger.info(f"Paper {paper.arxiv_id} indexed into Qdrant collection: {collection_name}")
+                with worker_session() as session:
+                    session.get(PaperMetadata, paper_metadata_id).mark_indexed(collection_name, datetime.datetime.now(datetime.timezone.utc))
+                current_app.logger.info(f"Paper {arxiv_id} indexed into Qdrant collection: {collection_name}")
             else:
-                current_app.logger.error(f"Failed to index paper {paper.arxiv_id}")
-                paper.source = f"{paper.source} (Indexing Failed)"
-                db.session.commit()
+                current_app.logger.error(f"Failed to index paper {arxiv_id}")
+                _record_processing_failure(paper_metadata_id, "index", "Indexing failed")
+                job_span.set_error("index: Indexing failed")
         except Exception as e:
-            current_app.logger.error(f"Error processing paper {paper.arxiv_id} in background: {e}")
-            paper.source = f"{paper.source} (Processing Error: {str(e)[:50]})" # Store a snippet of the error
-            db.session.commit()
+            current_app.logger.error(f"Error processing paper {arxiv_id} in background: {e}")
+            job_span.set_error(e)
+            _record_processing_failure(paper_metadata_id, "processing", e) # A fresh session: the failed one was rolled back
+
+
+def _upsert_search_results(arxiv_results: list[dict]) -> tuple[list[dict], list[int]]:
+    """
+    Stores/updates paper metadata for the search results.
+    Returns (papers_for_summary, db ids of papers that still need background processing).
+    Shared by the Flask view and the ASGI handler (which runs it in a worker thread).
+    """
+    papers_for_summary = []
+    paper_objects_for_processing = []
+    for res in arxiv_results:
+        paper = PaperMetadata.upsert_from_arxiv(res)
+
+        papers_for_summary.append({
+            "paper_id": paper.arxiv_id,
+            "title": paper.title,
+            "abstract": paper.abstract,
+            "pdf_url": paper.pdf_url, # For frontend to show link
+            "db_id": paper.id, # Internal DB ID
+            "indexed_at": paper.indexed_at,
+            "abstract_indexed_at": paper.abstract_indexed_at,
+            "qdrant_collection_name": paper.qdrant_collection_name,
+        })
+        paper_objects_for_processing.append(paper)
+
+    db.session.commit() # Commit all new/updated papers
+
+    # Only process papers that are new, or whose failed attempt is due for a retry (one indexed query)
+    to_process = [paper.id for paper in ProcessingService.eligible_papers_query([p.id for p in paper_objects_for_processing])]
+    for p_obj in paper_objects_for_processing:
+        if p_obj.indexed_at:
+            current_app.logger.info(f"Paper {p_obj.arxiv_id} already indexed. Skipping background processing.")
+        elif p_obj.id not in to_process:
+            current_app.logger.info(f"Paper {p_obj.arxiv_id} is being processed or waiting for its retry ({p_obj.processing_state.value}). Skipping background processing.")
+    return papers_for_summary, to_process
+
+def _index_abstracts(papers_for_summary: list[dict]) -> list[int]:
+    """
+    Preliminary chat index: embeds the abstracts of papers that have neither a full-text nor an abstract
+    entry yet (one batched embedding call) and marks them. Updates the dicts in place; returns the db ids indexed.
+    Failures are logged and leave the papers as they were (chat simply waits for full text).
+    """
+    todo = [p for p in papers_for_summary if not p['indexed_at'] and not p['abstract_indexed_at'] and p.get('abstract')]
+    if not todo:
+        return []
+    try:
+        indexed = set(RAGService.index_abstracts(todo))
+    except Exception as e:
+        current_app.logger.error(f"Abstract indexing failed for {len(todo)} papers: {e}")
+        return []
+    now = datetime.datetime.now(datetime.timezone.utc)
+    db_ids = []
+    for p in todo:
+        if p['paper_id'] in indexed:
+            paper = db.session.get(PaperMetadata, p['db_id'])
+            paper.abstract_indexed_at = p['abstract_indexed_at'] = now
+            db_ids.append(p['db_id'])
+    db.session.commit()
+    current_app.logger.info(f"Abstracts indexed for {len(db_ids)} papers (chat available before full-text indexing).")
+    return db_ids
+
+def _index_abstracts_in_context(app, papers_for_summary: list[dict]) -> list[int]:
+    with app.app_context():
+        return _index_abstracts(papers_for_summary)
+
+def _start_background_processing(paper_db_ids: list[int]) -> None:
+    """Asynchronously download, extract text, clean, and index papers."""
+    # Each thread pushes its own app context (and so gets its own sessions)
+    app = current_app._get_current_object()
+    for paper_db_id in paper_db_ids:
+        thread = threading.Thread(target=propagate_context(process_paper_background), args=(app, paper_db_id))
+        thread.start()
+
+def _paper_output(res: dict, db_paper: dict | None, ind_summary_obj: dict | None) -> dict:
+    """One row of the papers table the frontend shows."""
+    return {
+        "db_id": db_paper['db_id'] if db_paper else None,
+        "paper_id": res['paper_id'],
+        "title": res['title'],
+        "authors": res['authors'],
+        "published": str(res['published']), # Ensure string for JSON
+        "pdf_url": res['pdf_url'],
+        "abstract": res.get('abstract'),
+        "individual_summary": ind_summary_obj['summary'] if ind_summary_obj else "Summary not available.",
+        "source": res.get('source', 'arXiv'),
+        "is_processed_for_chat": bool(db_paper['indexed_at']) if db_paper else False, # Indicate if ready for chat
+        "chat_mode": ("full_text" if db_paper['indexed_at'] else "abstract" if db_paper['abstract_indexed_at'] else None) if db_paper else None,
+        "qdrant_collection_name": db_paper['qdrant_collection_name'] if db_paper and db_paper['indexed_at'] else None
+    }
+
+def _consolidated_output(consolidated_summary_data: dict) -> dict:
+    return {
+        "consolidated_summary": consolidated_summary_data['content'], # This is the text
+        "token_usage_consolidated": {
+            "input": consolidated_summary_data.get('input_tokens'),
+            "output": consolidated_summary_data.get('output_tokens')
+        },
+    }
+
+def _build_search_output(arxiv_results: list[dict], papers_for_summary: list[dict], individual_summaries: list[dict], consolidated_summary_data: dict) -> dict:
+    """Combines results for the frontend: consolidated summary, and table of individual papers with their summaries."""
+    output_papers = []
+    for res in arxiv_results: # Original search results
+        paper_id = res['paper_id']
+        ind_summary_obj = next((s for s in individual_summaries if s['paper_id'] == paper_id), None)
+        db_paper = next((p for p in papers_for_summary if p['paper_id'] == paper_id), None)
+        output_papers.append(_paper_output(res, db_paper, ind_summary_obj))
+
+    return {
+        **_consolidated_output(consolidated_summary_data),
+        "papers": output_papers # List of papers with their individual summaries & metadata
+    }
+
+def _summarize_one(app, paper: dict) -> dict:
+    """Summarizes a single paper in a pool thread."""
+    with app.app_context():
+        return SummarizerService.generate_individual_summaries([paper])[0]
 
 
 @papers_bp.route('/search', methods=['POST'])
@@ -96,42 +252,11 @@ def search_and_summarize_papers():
             return jsonify({"msg": "No papers found for your query."}), 404
 
         # Store/Update paper metadata in DB and prepare for summary
-        papers_for_summary = []
-        paper_objects_for_processing = []
-        for res in arxiv_results:
-            paper = PaperMetadata.query.filter_by(arxiv_id=res['paper_id']).first()
-            if not paper:
-                paper = PaperMetadata(
-                    arxiv_id=res['paper_id'],
-                    title=res['title'],
-                    authors=res['authors'], # Assuming this is JSON compatible (list of strings)
-                    abstract=res.get('abstract'), # res['abstract']
-                    published_date=res['published'], # Ensure this is a date object or parsable string
-                    pdf_url=res['pdf_url'],
-                    entry_id=res['entry_id'],
-                    source=res.get('source', 'arXiv')
-                )
-                db.session.add(paper)
-            else: # Update if exists, e.g. abstract or pdf_url might change (though unlikely for arxiv_id)
-                paper.title = res['title']
-                paper.authors = res['authors']
-                paper.abstract = res.get('abstract')
-                paper.published_date = res['published']
-                paper.pdf_url = res['pdf_url']
-                paper.entry_id = res['entry_id']
-                paper.updated_at = datetime.datetime.now(datetime.timezone.utc)
-            db.session.flush() # Assigns ID to 'paper' if new, before commit
-
-            papers_for_summary.append({
-                "paper_id": paper.arxiv_id,
-                "title": paper.title,
-                "abstract": paper.abstract,
-                "pdf_url": paper.pdf_url, # For frontend to show link
-                "db_id": paper.id # Internal DB ID
-            })
-            paper_objects_for_processing.append(paper)
-        
-        db.session.commit() # Commit all new/updated papers
+        papers_for_summary, to_process = _upsert_search_results(arxiv_results)
+
+        # Embed the abstracts for instant (abstract-level) chat while the summaries are being generated
+        abstract_thread = threading.Thread(target=propagate_context(_index_abstracts_in_context), args=(current_app._get_current_object(), papers_for_summary))
+        abstract_thread.start()
 
         # 2. Generate Individual Summaries (based on abstracts)
         # These are quick summaries from abstracts, not full text
@@ -139,80 +264,255 @@ def search_and_summarize_papers():
 
         # 3. Generate Consolidated Summary (from individual summaries)
         consolidated_summary_data = SummarizerService.generate_consolidated_summary(individual_summaries, query)
+        abstract_thread.join()
 
         # 4. Asynchronously download, extract text, clean, and index papers
-        # Create a copy of the app context for the new thread
-        app_ctx = current_app.app_context()
-        for p_obj in paper_objects_for_processing:
-            # Only process if not already indexed or failed previously
-            if not p_obj.indexed_at and "Failed" not in (p_obj.source or "") and "Error" not in (p_obj.source or ""):
-                 thread = threading.Thread(target=process_paper_background, args=(app_ctx, p_obj.id))
-                 thread.start()
-            elif p_obj.indexed_at:
-                current_app.logger.info(f"Paper {p_obj.arxiv_id} already indexed. Skipping background processing.")
-            else:
-                current_app.logger.info(f"Paper {p_obj.arxiv_id} previously failed processing or download. Skipping background processing.")
-
-
-        # Combine results for the frontend
-        # Frontend needs: consolidated summary, and table of individual papers with their summaries
-        # Each item in individual_summaries already has paper_id, title, abstract, summary.
-        # We should merge this with other metadata from arxiv_results.
-        
-        output_papers = []
-        for res in arxiv_results: # Original search results
-            paper_id = res['paper_id']
-            ind_summary_obj = next((s for s in individual_summaries if s['paper_id'] == paper_id), None)
-            db_paper = next((p for p in paper_objects_for_processing if p.arxiv_id == paper_id), None)
-
-            output_papers.append({
-                "db_id": db_paper.id if db_paper else None,
-                "paper_id": paper_id,
-                "title": res['title'],
-                "authors": res['authors'],
-                "published": str(res['published']), # Ensure string for JSON
-                "pdf_url": res['pdf_url'],
-                "abstract": res.get('abstract'),
-                "individual_summary": ind_summary_obj['summary'] if ind_summary_obj else "Summary not available.",
-                "source": res.get('source', 'arXiv'),
-                "is_processed_for_chat": bool(db_paper.indexed_at) if db_paper else False, # Indicate if ready for chat
-                "qdrant_collection_name": db_paper.qdrant_collection_name if db_paper and db_paper.indexed_at else None
-            })
-            
-        return jsonify({
-            "consolidated_summary": consolidated_summary_data['content'], # This is the text
-            "token_usage_consolidated": {
-                "input": consolidated_summary_data.get('input_tokens'),
-                "output": consolidated_summary_data.get('output_tokens')
-            },
-            "papers": output_papers # List of papers with their individual summaries & metadata
-        }), 200
+        _start_background_processing(to_process)
+
+        return jsonify(_build_search_output(arxiv_results, papers_for_summary, individual_summaries, consolidated_summary_data)), 200
 
     except Exception as e:
         current_app.logger.error(f"Error in search_and_summarize_papers: {e}", exc_info=True)
         return jsonify({"msg": "An internal error occurred.", "error": str(e)}), 500
 
 
+@papers_bp.route('/search/stream', methods=['POST'])
+@jwt_required()
+def search_and_summarize_papers_stream():
+    """
+    Streaming variant of /search (server-sent events). Each arXiv result is stored, queued for
+    background processing and summarized as soon as it is parsed, while later results are still
+    arriving. Events, in order of availability:
+      paper         one per result, same fields as an item of /search's "papers" (summary pending)
+      summary       {"paper_id", "db_id", "individual_summary"} once that paper's summary is ready
+      chat_ready    {"db_ids", "chat_mode": "abstract"} once the abstracts are embedded for preliminary chat
+      consolidated  {"consolidated_summary", "token_usage_consolidated"}, always the last data event
+      error         {"msg", "error"?} if the search fails; the stream ends after it
+    """
+    data = request.get_json()
+    query = data.get('query')
+
+    if not query:
+        return jsonify({"msg": "Query is required"}), 400
+
+    app = current_app._get_current_object()
+
+    def generate():
+        pool = ThreadPoolExecutor(max_workers=app.config.get('SEARCH_SUMMARY_WORKERS', 5) + 1) # + the abstract-indexing job
+        pending = {} # future -> (paper_id, db_id)
+        individual_summaries = {}
+
+        def drain(block: bool):
+            done = as_completed(list(pending)) if block else [f for f in list(pending) if f.done()]
+            for future in done:
+                paper_id, db_id = pending.pop(future)
+                summary = future.result()
+                individual_summaries[paper_id] = summary
+                yield sse_event('summary', {
+                    "paper_id": paper_id,
+                    "db_id": db_id,
+                    "individual_summary": summary['summary'],
+                })
+
+        try:
+            arxiv_results = []
+            all_papers = []
+            for res in ArxivService.iter_papers(query):
+                # Store it and start downloading/indexing it right away
+                papers_for_summary, to_process = _upsert_search_results([res])
+                _start_background_processing(to_process)
+                db_paper = papers_for_summary[0]
+                arxiv_results.append(res)
+                all_papers.append(db_paper)
+
+                paper_event = _paper_output(res, db_paper, None)
+                paper_event["individual_summary"] = None # Follows in a "summary" event
+                yield sse_event('paper', paper_event)
+
+                pending[pool.submit(propagate_context(_summarize_one), app, db_paper)] = (res['paper_id'], db_paper['db_id'])
+                yield from drain(block=False)
+
+            if not arxiv_results:
+                yield sse_event('error', {"msg": "No papers found for your query."})
+                return
+
+            # All abstracts in one embedding call, alongside the summaries still running
+            abstracts_future = pool.submit(propagate_context(_index_abstracts_in_context), app, all_papers)
+
+            yield from drain(block=True)
+
+            abstract_db_ids = abstracts_future.result()
+            if abstract_db_ids:
+                yield sse_event('chat_ready', {"db_ids": abstract_db_ids, "chat_mode": "abstract"})
+
+            # Synthesis over the summaries, in search-result order
+            ordered = [individual_summaries[res['paper_id']] for res in arxiv_results if res['paper_id'] in individual_summaries]
+            consolidated_summary_data = SummarizerService.generate_consolidated_summary(ordered, query)
+            yield sse_event('consolidated', _consolidated_output(consolidated_summary_data))
+        except Exception as e:
+            current_app.logger.error(f"Error in search_and_summarize_papers_stream: {e}", exc_info=True)
+            yield sse_event('error', {"msg": "An internal error occurred.", "error": str(e)})
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True) # Client may have disconnected mid-stream
+
+    return current_app.response_class(stream_with_context(generate()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no', # Don't let nginx buffer the stream
+    })
+
+
+def _parse_status_ids() -> tuple[list[int] | None, str | None]:
+    """Reads `ids` (comma separated and/or repeated) from the query string."""
+    raw = ",".join(request.args.getlist('ids'))
+    try:
+        ids = list(dict.fromkeys(int(part) for part in raw.split(",") if part.strip()))
+    except ValueError:
+        return None, "ids must be a comma-separated list of paper DB IDs"
+    if not ids:
+        return None, "ids is required"
+    max_ids = current_app.config.get('STATUS_MAX_IDS', 100)
+    if len(ids) > max_ids:
+        return None, f"At most {max_ids} ids per request"
+    return ids, None
+
+def _load_statuses(paper_db_ids: list[int]) -> dict:
+    """One query for all papers, in the requested order (on the read replica, if configured)."""
+    with read_session() as session:
+        papers = {p.id: p.to_status_dict() for p in session.scalars(db.select(PaperMetadata).where(PaperMetadata.id.in_(paper_db_ids)))}
+    # End the transaction: the connection goes back to the pool while we wait, and the next load reads fresh rows
+    db.session.close()
+    return {
+        "papers": [papers[paper_db_id] for paper_db_id in paper_db_ids if paper_db_id in papers],
+        "missing": [paper_db_id for paper_db_id in paper_db_ids if paper_db_id not in papers],
+    }
+
+def _status_etag(body: dict) -> str:
+    return hashlib.sha1(current_app.json.dumps(body).encode("utf-8")).hexdigest()
+
+def _is_final_status(status: dict) -> bool:
+    """Nothing more will happen to this paper without a new request (indexed or failed)."""
+    return status["chat_mode"] == "full_text" or status["processing_failed"]
+
+@papers_bp.route('/status', methods=['GET'])
+@jwt_required()
+def get_papers_processing_status():
+    """
+    Bulk status for many papers in one query: GET /status?ids=1,2,3.
+    Send the last ETag as If-None-Match to get a 304 when nothing changed; add `wait=<seconds>` to
+    long-poll, i.e. hold the request until one of the papers changes (200) or the wait runs out (304).
+    """
+    paper_db_ids, error = _parse_status_ids()
+    if error:
+        return jsonify({"msg": error}), 400
+    try:
+        wait = min(max(float(request.args.get('wait', 0)), 0), current_app.config.get('STATUS_MAX_WAIT_SECONDS', 30))
+    except ValueError:
+        return jsonify({"msg": "wait must be a number of seconds"}), 400
+
+    recheck = current_app.config.get('STATUS_RECHECK_SECONDS', 5)
+    deadline = time.monotonic() + wait
+    while True:
+        version = status_notifier.version # Read before the query, so a commit racing with it still wakes us
+        body = _load_statuses(paper_db_ids)
+        etag = _status_etag(body)
+        not_modified = request.if_none_match.contains_weak(etag)
+        remaining = deadline - time.monotonic()
+        if not not_modified or remaining <= 0:
+            break
+        status_notifier.wait(paper_db_ids, version, min(remaining, recheck))
+
+    response = current_app.response_class(status=304) if not_modified else jsonify(body)
+    response.set_etag(etag, weak=True) # Weak: the gzip hook may re-encode the body
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+@papers_bp.route('/status/stream', methods=['GET'])
+@jwt_required()
+def stream_papers_processing_status():
+    """
+    Server-sent events for GET /status/stream?ids=1,2,3: the current status of every paper first, then
+    a `status` event whenever one of them changes, and `done` once all are indexed or failed.
+    """
+    paper_db_ids, error = _parse_status_ids()
+    if error:
+        return jsonify({"msg": error}), 400
+
+    config = current_app.config
+    recheck = config.get('STATUS_RECHECK_SECONDS', 5)
+    deadline = time.monotonic() + config.get('STATUS_STREAM_MAX_SECONDS', 600)
+
+    def generate():
+        last_sent = {}
+        while True:
+            version = status_notifier.version
+            body = _load_statuses(paper_db_ids)
+            if not last_sent and body["missing"]:
+                yield sse_event("missing", {"db_ids": body["missing"]})
+            for status in body["papers"]:
+                if last_sent.get(status["db_id"]) != status:
+                    last_sent[status["db_id"]] = status
+                    yield sse_event("status", status)
+
+            if all(_is_final_status(status) for status in body["papers"]):
+                yield sse_event("done", {"db_ids": [status["db_id"] for status in body["papers"]]})
+                return
+            if time.monotonic() >= deadline:
+                return # The client reconnects and gets a fresh snapshot
+            if not status_notifier.wait(paper_db_ids, version, recheck):
+                yield ": keep-alive\n\n" # Also lets the server notice disconnected clients
+
+    return current_app.response_class(stream_with_context(generate()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',
+    })
+
 @papers_bp.route('/<int:paper_db_id>/status', methods=['GET'])
 @jwt_required()
 def get_paper_processing_status(paper_db_id):
     """Endpoint for frontend to poll processing status."""
+    with read_session() as session:
+        paper = session.get(PaperMetadata, paper_db_id)
+        if not paper:
+            return jsonify({"msg": "Paper not found"}), 404
+        return jsonify(paper.to_status_dict()), 200
+
+@papers_bp.route('/<int:paper_db_id>/full-summary', methods=['GET'])
+@jwt_required()
+def get_full_text_summary(paper_db_id):
+    """The cached full-text summary for the configured model; 404 until one has been generated."""
     paper = db.session.get(PaperMetadata, paper_db_id)
     if not paper:
         return jsonify({"msg": "Paper not found"}), 404
-    
-    return jsonify({
-        "paper_id": paper.arxiv_id,
-        "db_id": paper.id,
-        "title": paper.title,
-        "downloaded_at": paper.downloaded_at.isoformat() if paper.downloaded_at else None,
-        "text_extracted_at": paper.text_extracted_at.isoformat() if paper.text_extracted_at else None,
-        "cleaned_text_at": paper.cleaned_text_at.isoformat() if paper.cleaned_text_at else None,
-        "indexed_at": paper.indexed_at.isoformat() if paper.indexed_at else None,
-        "qdrant_collection_name": paper.qdrant_collection_name,
-        "is_ready_for_chat": bool(paper.indexed_at),
-        "processing_status_notes": paper.source # If any errors were appended here
-    }), 200
+
+    cached = SummarizerService.get_cached_full_text_summary(paper)
+    if not cached:
+        return jsonify({"msg": "No full-text summary yet. POST to this endpoint to generate one."}), 404
+    return jsonify({**cached.to_dict(), "cached": True}), 200
+
+@papers_bp.route('/<int:paper_db_id>/full-summary', methods=['POST'])
+@jwt_required()
+def generate_full_text_summary(paper_db_id):
+    """Summarizes the paper's indexed full text (map-reduce over its chunks); returns the cached summary when there is one."""
+    paper = db.session.get(PaperMetadata, paper_db_id)
+    if not paper:
+        return jsonify({"msg": "Paper not found"}), 404
+    if not paper.indexed_at:
+        return jsonify({"msg": "Paper full text is not indexed yet. Check the status endpoint.", "chat_mode": paper.chat_mode}), 409
+
+    data = request.get_json(silent=True) or {}
+    refresh = bool(data.get("refresh"))
+    cached = None if refresh else SummarizerService.get_cached_full_text_summary(paper)
+    if cached:
+        return jsonify({**cached.to_dict(), "cached": True}), 200
+
+    try:
+        summary = SummarizerService.generate_full_text_summary(paper, refresh=refresh)
+    except ValueError as e: # No chunk text found for the paper
+        return jsonify({"msg": str(e)}), 409
+    except Exception as e:
+        current_app.logger.error(f"Error in full-text summary for paper {paper_db_id}: {e}", exc_info=True)
+        return jsonify({"msg": "An internal error occurred.", "error": str(e)}), 500
+    return jsonify({**summary.to_dict(), "cached": False}), 200
 
 # Optional: Manual trigger for processing a paper if needed for retry
 @papers_bp.route('/<int:paper_db_id>/process-manual', methods=['POST'])
@@ -225,16 +525,14 @@ def manual_process_paper(paper_db_id):
     if paper.indexed_at:
         return jsonify({"msg": "Paper already processed and indexed."}), 200
     
-    if "Failed" in (paper.source or "") or "Error" in (paper.source or ""):
-        # Optionally reset status before retrying
-        # paper.source = "arXiv (Retrying)" # Or original source
-        # paper.downloaded_at = None
-        # ... reset other statuses
-        # db.session.commit()
-        current_app.logger.info(f"Retrying processing for paper {paper.arxiv_id} (DB ID: {paper.id}) which previously failed.")
+    if ProcessingService.is_claimed(paper):
+        return jsonify({"msg": "Paper is already being processed."}), 409
+
+    if paper.processing_failed:
+        # A manual retry doesn't wait for next_retry_at (and also works after the automatic retries gave up)
+        current_app.logger.info(f"Retrying processing for paper {paper.arxiv_id} (DB ID: {paper.id}) which previously failed: {paper.last_error}")
     
-    app_ctx = current_app.app_context()
-    thread = threading.Thread(target=process_paper_background, args=(app_ctx, paper.id))
+    thread = threading.Thread(target=propagate_context(process_paper_background), args=(current_app._get_current_object(), paper.id, True))
     thread.start()
     
     return jsonify({"msg": f"Processing re-initiated for paper {paper.arxiv_id}. Check status endpoint."}), 202
\ No newline at end of file
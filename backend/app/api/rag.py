@@ -6,50 +6,58 @@ from app.models.user import User
 from app.models.paper import PaperMetadata
 from app.models.chat import ChatSession, ChatMessage
 from app.core.rag_service import RAGService
+from app.db_sessions import read_session
 import datetime
+import uuid
 
 rag_bp = Blueprint('rag_bp', __name__)
 
-@rag_bp.route('/chat', methods=['POST'])
-@jwt_required()
-def chat_with_selected_papers():
-    current_user_id = int(get_jwt_identity())
-    data = request.get_json()
-
+def _prepare_chat(current_user_id: int, data: dict):
+    """
+    Validates a chat request and loads everything the RAG call needs.
+    Returns ((error_body, status), None) on failure, or (None, (chat_session_id, selected_papers_metadata, chat_history)).
+    Shared by the Flask view and the ASGI handler (which runs it in a worker thread).
+    """
     user_query = data.get('query')
     selected_paper_db_ids = data.get('selected_paper_ids') # Expecting list of DB PaperMetadata IDs
     chat_session_id = data.get('chat_session_id') # Optional: to continue an existing session
 
     if not user_query or not selected_paper_db_ids:
-        return jsonify({"msg": "Query and selected_paper_ids are required"}), 400
+        return ({"msg": "Query and selected_paper_ids are required"}, 400), None
 
     user = db.session.get(User, current_user_id)
     if not user:
-        return jsonify({"msg": "User not found"}), 401 # Should not happen if JWT is valid
+        return ({"msg": "User not found"}, 401), None # Should not happen if JWT is valid
 
     # Fetch PaperMetadata objects for selected IDs, ensuring they are processed
     selected_papers_metadata_objects = []
     for pid in selected_paper_db_ids:
         paper = db.session.get(PaperMetadata, pid)
         if not paper:
-            return jsonify({"msg": f"Paper with DB ID {pid} not found."}), 404
-        if not paper.indexed_at or not paper.qdrant_collection_name:
-            return jsonify({"msg": f"Paper '{paper.title}' (ID: {paper.arxiv_id}) is not yet processed for chat."}), 400
-        selected_papers_metadata_objects.append({
+            return ({"msg": f"Paper with DB ID {pid} not found."}, 404), None
+        chat_mode = paper.chat_mode
+        if not chat_mode:
+            return ({"msg": f"Paper '{paper.title}' (ID: {paper.arxiv_id}) is not yet processed for chat."}, 400), None
+        paper_meta = {
             "arxiv_id": paper.arxiv_id, # RAG service needs arxiv_id
+            "db_id": paper.id, # Returned with each source so the client can fetch full chunk text
             "title": paper.title,
             "qdrant_collection_name": paper.qdrant_collection_name
             # Add any other fields retrieve_context_external expects in selected_papers_metadata
-        })
+        }
+        if chat_mode == "abstract":
+            # Full text still being processed: answer from the abstract entry meanwhile
+            paper_meta.update(RAGService.abstract_chat_metadata(paper.arxiv_id))
+        selected_papers_metadata_objects.append(paper_meta)
 
     if not selected_papers_metadata_objects:
-        return jsonify({"msg": "No valid (processed) papers selected for chat."}), 400
+        return ({"msg": "No valid (processed) papers selected for chat."}, 400), None
 
     # Manage Chat Session and History
     if chat_session_id:
         chat_session = db.session.get(ChatSession, chat_session_id)
         if not chat_session or chat_session.user_id != user.id:
-            return jsonify({"msg": "Chat session not found or access denied."}), 403
+            return ({"msg": "Chat session not found or access denied."}, 403), None
     else: # Create new session
         # Create a default name for the session, perhaps from the first query or paper titles
         first_paper_title = selected_papers_metadata_objects[0]['title'][:50] if selected_papers_metadata_objects else "Chat"
@@ -72,76 +80,129 @@ def chat_with_selected_papers():
     # Format for RAGService: list of {'role': 'user'/'assistant', 'content': '...'}
     formatted_chat_history = [msg.to_dict() for msg in db_chat_history] # Use to_dict or manual conversion
 
+    return None, (chat_session.id, selected_papers_metadata_objects, formatted_chat_history)
+
+def _save_chat_turn(chat_session_id: int, user_query: str, rag_response_data: dict) -> dict:
+    """Saves user message and assistant response to DB and returns the response body."""
+    chat_session = db.session.get(ChatSession, chat_session_id)
+    user_message = ChatMessage(session_id=chat_session_id, role="user", content=user_query)
+    assistant_message = ChatMessage(
+        session_id=chat_session_id,
+        role="assistant",
+        content=rag_response_data['response'],
+        # sources_json=rag_response_data.get('sources'), # If you decide to store sources
+        # token_usage_json=rag_response_data.get('token_usage') # If storing token usage
+    )
+    db.session.add_all([user_message, assistant_message])
+    chat_session.updated_at = datetime.datetime.now(datetime.timezone.utc) # Update session timestamp
+    db.session.commit()
+
+    return {
+        "chat_session_id": chat_session_id,
+        "response": rag_response_data['response'],
+        "sources": rag_response_data.get('sources'), # For frontend display
+        "token_usage": rag_response_data.get('token_usage'),
+        "retrieval_mode": rag_response_data.get('retrieval_mode') # "full_text", "abstract" (preliminary) or "mixed"
+    }
+
+@rag_bp.route('/chat', methods=['POST'])
+@jwt_required()
+def chat_with_selected_papers():
+    current_user_id = int(get_jwt_identity())
+    data = request.get_json()
+
+    error, prepared = _prepare_chat(current_user_id, data)
+    if error:
+        return jsonify(error[0]), error[1]
+    chat_session_id, selected_papers_metadata_objects, formatted_chat_history = prepared
 
     try:
         # Get RAG response
         rag_response_data = RAGService.get_chat_response(
             selected_papers_metadata=selected_papers_metadata_objects,
-            query=user_query,
+            query=data.get('query'),
             chat_history=formatted_chat_history # Pass the history
         )
-
-        # Save user message and assistant response to DB
-        user_message = ChatMessage(session_id=chat_session.id, role="user", content=user_query)
-        assistant_message = ChatMessage(
-            session_id=chat_session.id,
-            role="assistant",
-            content=rag_response_data['response'],
-            # sources_json=rag_response_data.get('sources'), # If you decide to store sources
-            # token_usage_json=rag_response_data.get('token_usage') # If storing token usage
-        )
-        db.session.add_all([user_message, assistant_message])
-        chat_session.updated_at = datetime.datetime.now(datetime.timezone.utc) # Update session timestamp
-        db.session.commit()
-
-        return jsonify({
-            "chat_session_id": chat_session.id,
-            "response": rag_response_data['response'],
-            "sources": rag_response_data.get('sources'), # For frontend display
-            "token_usage": rag_response_data.get('token_usage')
-        }), 200
+        return jsonify(_save_chat_turn(chat_session_id, data.get('query'), rag_response_data)), 200
 
     except Exception as e:
         current_app.logger.error(f"Error in RAG chat: {e}", exc_info=True)
         return jsonify({"msg": "An error occurred during chat.", "error": str(e)}), 500
 
 
+@rag_bp.route('/papers/<int:paper_db_id>/chunks/<chunk_id>', methods=['GET'])
+@jwt_required()
+def get_chunk_text(paper_db_id, chunk_id):
+    """Full text for a chunk referenced in a chat response's sources."""
+    try:
+        uuid.UUID(chunk_id) # Chunk IDs are content-hash UUIDs
+    except ValueError:
+        return jsonify({"msg": "Chunk not found."}), 404
+
+    # Chunk IDs are derived from the chunk content, so a given ID always maps to the same text
+    etag = f'"{chunk_id}"'
+    if etag in request.headers.get('If-None-Match', ''):
+        response = current_app.response_class(status=304)
+    else:
+        paper = db.session.get(PaperMetadata, paper_db_id)
+        if not paper or not paper.chat_mode:
+            return jsonify({"msg": "Paper not found or not processed for chat."}), 404
+        if paper.chat_mode == "abstract":
+            collection_name = RAGService.abstract_chat_metadata(paper.arxiv_id)["qdrant_collection_name"]
+        else:
+            collection_name = paper.qdrant_collection_name
+        try:
+            text = RAGService.get_chunk_text(paper.arxiv_id, collection_name, chunk_id)
+        except Exception as e:
+            current_app.logger.error(f"Error fetching chunk {chunk_id} for paper {paper_db_id}: {e}", exc_info=True)
+            return jsonify({"msg": "An error occurred while fetching the chunk.", "error": str(e)}), 500
+        if text is None:
+            return jsonify({"msg": "Chunk not found."}), 404
+        response = jsonify({"paper_id": paper.arxiv_id, "db_id": paper.id, "chunk_id": chunk_id, "text": text})
+
+    response.headers['ETag'] = etag
+    response.headers['Cache-Control'] = 'private, max-age=86400, immutable'
+    return response
+
+
 @rag_bp.route('/sessions', methods=['GET'])
 @jwt_required()
 def list_chat_sessions():
     current_user_id = int(get_jwt_identity())
-    user = db.session.get(User, current_user_id)
-    if not user:
-        return jsonify({"msg": "User not found"}), 401
+    with read_session() as db_session: # Read replica, if configured
+        user = db_session.get(User, current_user_id)
+        if not user:
+            return jsonify({"msg": "User not found"}), 401
+
+        sessions = db_session.scalars(db.select(ChatSession).filter_by(user_id=user.id).order_by(ChatSession.updated_at.desc())).all()
 
-    sessions = ChatSession.query.filter_by(user_id=user.id).order_by(ChatSession.updated_at.desc()).all()
-    
-    return jsonify([{
-        "id": session.id,
-        "session_name": session.session_name,
-        "created_at": session.created_at.isoformat(),
-        "updated_at": session.updated_at.isoformat(),
-        "paper_ids_in_session": [p.id for p in session.papers_in_session] # DB IDs
-    } for session in sessions]), 200
+        return jsonify([{
+            "id": session.id,
+            "session_name": session.session_name,
+            "created_at": session.created_at.isoformat(),
+            "updated_at": session.updated_at.isoformat(),
+            "paper_ids_in_session": [p.id for p in session.papers_in_session] # DB IDs
+        } for session in sessions]), 200
 
 
 @rag_bp.route('/sessions/<int:session_id>/messages', methods=['GET'])
 @jwt_required()
 def get_chat_session_messages(session_id):
     current_user_id = int(get_jwt_identity())
-    chat_session = db.session.get(ChatSession, session_id)
-
-    if not chat_session or chat_session.user_id != current_user_id:
-        return jsonify({"msg": "Chat session not found or access denied."}), 403 # Or 404
-
-    messages = ChatMessage.query.filter_by(session_id=chat_session.id).order_by(ChatMessage.timestamp.asc()).all()
-    
-    # Get associated paper titles for this session
-    paper_titles = [p.title for p in chat_session.papers_in_session]
-
-    return jsonify({
-        "session_id": chat_session.id,
-        "session_name": chat_session.session_name,
-        "associated_paper_titles": paper_titles,
-        "messages": [msg.to_dict() for msg in messages]
-    }), 200
\ No newline at end of file
+    with read_session() as db_session: # Read replica, if configured
+        chat_session = db_session.get(ChatSession, session_id)
+
+        if not chat_session or chat_session.user_id != current_user_id:
+            return jsonify({"msg": "Chat session not found or access denied."}), 403 # Or 404
+
+        messages = db_session.scalars(db.select(ChatMessage).filter_by(session_id=chat_session.id).order_by(ChatMessage.timestamp.asc())).all()
+
+        # Get associated paper titles for this session
+        paper_titles = [p.title for p in chat_session.papers_in_session]
+
+        return jsonify({
+            "session_id": chat_session.id,
+            "session_name": chat_session.session_name,
+            "associated_paper_titles": paper_titles,
+            "messages": [msg.to_dict() for msg in messages]
+        }), 200
\ No newline at end of file
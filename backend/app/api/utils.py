@@ -0,0 +1,32 @@
+# app/api/utils.py
+import gzip
+from flask import request, current_app
+
+def gzip_response(response):
+    """
+    after_request hook: gzip-compresses large JSON responses when the client accepts it.
+    Streamed responses (e.g. server-sent events) and already-encoded bodies are left alone.
+    """
+    if (
+        response.status_code != 200
+        or response.mimetype != 'application/json'
+        or response.direct_passthrough
+        or response.is_streamed
+        or 'Content-Encoding' in response.headers
+        or 'gzip' not in request.headers.get('Accept-Encoding', '').lower()
+    ):
+        return response
+
+    body = response.get_data()
+    if len(body) < current_app.config.get('GZIP_MIN_SIZE', 1024):
+        return response
+
+    response.set_data(gzip.compress(body, compresslevel=current_app.config.get('GZIP_LEVEL', 6)))
+    response.headers['Content-Encoding'] = 'gzip'
+    response.headers['Content-Length'] = str(len(response.get_data()))
+    response.vary.add('Accept-Encoding')
+    return response
+
+def sse_event(event: str, data) -> str:
+    """Formats one server-sent event with a JSON payload."""
+    return f"event: {event}\ndata: {current_app.json.dumps(data)}\n\n"
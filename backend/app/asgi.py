@@ -0,0 +1,203 @@
+# app/asgi.py
+"""
+ASGI entry point. The two slow, I/O-bound endpoints (POST /api/papers/search and POST /api/rag/chat)
+are served by native coroutines that await arXiv, LiteLLM and Qdrant, so a waiting request no longer
+pins a worker thread. Every other route (auth, status, sessions, CORS preflights) is passed through to
+the regular Flask app via asgiref's WsgiToAsgi adapter.
+
+JWT checks, DB access and response bodies match the Flask views; the blocking SQLAlchemy work runs
+in worker threads (asyncio.to_thread), each with its own app context and therefore its own session.
+"""
+import asyncio
+import gzip
+import json
+
+from flask_jwt_extended import decode_token
+from flask_jwt_extended.exceptions import JWTExtendedException
+from jwt import ExpiredSignatureError, InvalidTokenError
+
+from app import create_app
+from app.logging_setup import log_context, new_id, request_id_var
+from app.tracing import span
+
+def _header(scope, name: bytes) -> str:
+    for key, value in scope.get("headers", []):
+        if key.lower() == name:
+            return value.decode("latin-1")
+    return ""
+
+async def _read_body(receive) -> bytes:
+    body = b""
+    while True:
+        message = await receive()
+        body += message.get("body", b"")
+        if not message.get("more_body"):
+            return body
+
+async def _send_json(flask_app, scope, send, payload, status: int = 200):
+    """Serializes like jsonify, then applies the same gzip rule as the after_request hook and the CORS headers Flask-CORS would add."""
+    body = flask_app.json.dumps(payload).encode("utf-8")
+    headers = [(b"content-type", b"application/json")]
+
+    if (
+        status == 200
+        and "gzip" in _header(scope, b"accept-encoding").lower()
+        and len(body) >= flask_app.config.get("GZIP_MIN_SIZE", 1024)
+    ):
+        body = gzip.compress(body, compresslevel=flask_app.config.get("GZIP_LEVEL", 6))
+        headers += [(b"content-encoding", b"gzip"), (b"vary", b"Accept-Encoding")]
+
+    origin = _header(scope, b"origin")
+    if origin:
+        headers += [
+            (b"access-control-allow-origin", origin.encode("latin-1")),
+            (b"access-control-allow-credentials", b"true"),
+            (b"access-control-expose-headers", b"Authorization"),
+            (b"vary", b"Origin"),
+        ]
+    if request_id_var.get():
+        headers.append((b"x-request-id", request_id_var.get().encode("latin-1")))
+    headers.append((b"content-length", str(len(body)).encode()))
+
+    await send({"type": "http.response.start", "status": status, "headers": headers})
+    await send({"type": "http.response.body", "body": body})
+
+def _authenticate(flask_app, scope):
+    """Mirrors @jwt_required(): returns (user_id, None) or (None, (error_body, status))."""
+    auth_header = _header(scope, b"authorization")
+    if not auth_header:
+        return None, ({"msg": "Missing Authorization Header"}, 401)
+    parts = auth_header.split()
+    if len(parts) != 2 or parts[0] != "Bearer":
+        return None, ({"msg": "Bad Authorization header. Expected 'Authorization: Bearer <JWT>'"}, 422)
+    try:
+        decoded = decode_token(parts[1]) # Needs an app context for the JWT settings
+    except ExpiredSignatureError:
+        return None, ({"msg": "Token has expired"}, 401)
+    except (InvalidTokenError, JWTExtendedException) as e:
+        return None, ({"msg": str(e)}, 422)
+    if decoded.get("type") != "access":
+        return None, ({"msg": "Only non-refresh tokens are allowed"}, 422)
+    return int(decoded[flask_app.config["JWT_IDENTITY_CLAIM"]]), None
+
+async def _in_thread(flask_app, func, *args):
+    """Runs blocking DB work in a worker thread under a fresh app context (own SQLAlchemy session, removed on teardown)."""
+    def run():
+        with flask_app.app_context():
+            return func(*args)
+    return await asyncio.to_thread(run)
+
+async def _search_papers(flask_app, user_id, data):
+    from app.api.papers import _upsert_search_results, _index_abstracts, _start_background_processing, _build_search_output
+    from app.core.arxiv_service import ArxivService
+    from app.core.summarizer_service import SummarizerService
+
+    query = data.get("query")
+    if not query:
+        return {"msg": "Query is required"}, 400
+
+    try:
+        # 1. Search ArXiv
+        arxiv_results = await ArxivService.asearch_papers(query)
+        if not arxiv_results:
+            return {"msg": "No papers found for your query."}, 404
+
+        # Store/Update paper metadata in DB and prepare for summary
+        papers_for_summary, to_process = await _in_thread(flask_app, _upsert_search_results, arxiv_results)
+
+        # Embed the abstracts for instant chat while the summaries are being generated
+        abstract_task = asyncio.create_task(_in_thread(flask_app, _index_abstracts, papers_for_summary))
+
+        # 2. Individual summaries, all abstracts concurrently
+        individual_summaries = await SummarizerService.agenerate_individual_summaries(papers_for_summary)
+
+        # 3. Consolidated summary
+        consolidated_summary_data = await SummarizerService.agenerate_consolidated_summary(individual_summaries, query)
+        await abstract_task
+
+        # 4. Download, extract, clean and index in background threads (unchanged from the Flask view)
+        await _in_thread(flask_app, _start_background_processing, to_process)
+
+        return _build_search_output(arxiv_results, papers_for_summary, individual_summaries, consolidated_summary_data), 200
+    except Exception as e:
+        flask_app.logger.error(f"Error in search_and_summarize_papers: {e}", exc_info=True)
+        return {"msg": "An internal error occurred.", "error": str(e)}, 500
+
+async def _chat(flask_app, user_id, data):
+    from app.api.rag import _prepare_chat, _save_chat_turn
+    from app.core.rag_service import RAGService
+
+    error, prepared = await _in_thread(flask_app, _prepare_chat, user_id, data)
+    if error:
+        return error
+    chat_session_id, selected_papers_metadata_objects, formatted_chat_history = prepared
+
+    try:
+        rag_response_data = await RAGService.aget_chat_response(
+            selected_papers_metadata=selected_papers_metadata_objects,
+            query=data.get("query"),
+            chat_history=formatted_chat_history,
+        )
+        return await _in_thread(flask_app, _save_chat_turn, chat_session_id, data.get("query"), rag_response_data), 200
+    except Exception as e:
+        flask_app.logger.error(f"Error in RAG chat: {e}", exc_info=True)
+        return {"msg": "An error occurred during chat.", "error": str(e)}, 500
+
+ASYNC_ROUTES = {
+    ("POST", "/api/papers/search"): _search_papers,
+    ("POST", "/api/rag/chat"): _chat,
+}
+
+def create_asgi_app(config_name: str = "dev"):
+    from asgiref.wsgi import WsgiToAsgi
+
+    flask_app = create_app(config_name)
+    wsgi_app = WsgiToAsgi(flask_app)
+
+    async def lifespan(receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                from app.warmup import warmup
+                await asyncio.to_thread(warmup, flask_app)
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                from app.services import qdrant_client_setup
+                if qdrant_client_setup.async_qdrant_client is not None:
+                    await qdrant_client_setup.async_qdrant_client.close()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def app(scope, receive, send):
+        if scope["type"] == "lifespan":
+            return await lifespan(receive, send)
+
+        handler = ASYNC_ROUTES.get((scope.get("method"), scope.get("path", "").rstrip("/"))) if scope["type"] == "http" else None
+        if handler is None:
+            return await wsgi_app(scope, receive, send)
+
+        # Context vars are per task, so this app context is private to the request (and copied into gathered subtasks)
+        # and so is the request ID its log records carry, as in the Flask views
+        method, path = scope["method"], scope["path"].rstrip("/")
+        with flask_app.app_context(), log_context(request_id=_header(scope, b"x-request-id")[:64] or new_id()), \
+             span(f"{method} {path}", "server", _header(scope, b"traceparent"), **{"http.method": method, "http.route": path}) as request_span:
+            user_id, error = _authenticate(flask_app, scope)
+            if error:
+                request_span.set_attribute("http.status_code", error[1])
+                return await _send_json(flask_app, scope, send, error[0], error[1])
+            try:
+                data = json.loads(await _read_body(receive) or b"null")
+            except ValueError:
+                data = None
+            if not isinstance(data, dict):
+                request_span.set_attribute("http.status_code", 400)
+                return await _send_json(flask_app, scope, send, {"msg": "Request body must be a JSON object"}, 400)
+
+            payload, status = await handler(flask_app, user_id, data)
+            request_span.set_attribute("http.status_code", status)
+            if status >= 500:
+                request_span.set_error(payload.get("error") or f"HTTP {status}")
+            await _send_json(flask_app, scope, send, payload, status)
+
+    app.flask_app = flask_app
+    return app
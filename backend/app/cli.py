@@ -0,0 +1,118 @@
+# app/cli.py
+import click
+
+def register_cli(app):
+    """Registers the app's custom `flask` CLI commands."""
+
+    @app.cli.command('warmup')
+    def warmup_command():
+        """Preload heavy dependencies and open the Qdrant client (readiness check)."""
+        from app.warmup import warmup
+        elapsed_ms = warmup(app)
+        click.echo(f"Warmup finished in {elapsed_ms:.0f} ms")
+
+    @app.cli.command('trace-show')
+    @click.argument('trace_or_request_id')
+    def trace_show_command(trace_or_request_id):
+        """Print the latency breakdown of one traced request (by trace ID or X-Request-ID) from the trace file."""
+        from app.tracing import load_trace, format_trace
+        spans = load_trace(app.config['TRACING_FILE_PATH'], trace_or_request_id)
+        if not spans:
+            click.echo(f"No spans found for {trace_or_request_id} in {app.config['TRACING_FILE_PATH']}.")
+            raise SystemExit(1)
+        click.echo(format_trace(spans))
+
+    @app.cli.command('refresh-arxiv-metadata')
+    @click.argument('arxiv_ids', nargs=-1)
+    def refresh_arxiv_metadata_command(arxiv_ids):
+        """Refresh stored metadata from arXiv (all known papers, or just ARXIV_IDS) in batched id_list requests."""
+        import datetime
+        from app.extensions import db
+        from app.models.paper import PaperMetadata
+        from app.core.arxiv_service import ArxivService
+
+        query = PaperMetadata.query.filter(PaperMetadata.arxiv_id.in_(arxiv_ids)) if arxiv_ids else PaperMetadata.query
+        papers = {paper.arxiv_id: paper for paper in query.all()}
+        if not papers:
+            click.echo("No matching papers.")
+            return
+
+        results = ArxivService.fetch_metadata(list(papers))
+        for res in results:
+            paper = papers.get(res['paper_id'])
+            if not paper:
+                continue
+            paper.apply_arxiv_result(res)
+            paper.updated_at = datetime.datetime.now(datetime.timezone.utc)
+        db.session.commit()
+        click.echo(f"Refreshed {len(results)} of {len(papers)} papers.")
+
+    @app.cli.command('ingest')
+    @click.argument('arxiv_ids', nargs=-1)
+    @click.option('--ids-file', type=click.File('r'), help='File with one arXiv ID per line (# starts a comment).')
+    @click.option('--pdf-dir', type=click.Path(exists=True, file_okay=False), help='Directory of local PDFs to ingest.')
+    @click.option('--download-workers', default=4, show_default=True, help='Concurrent PDF downloads.')
+    @click.option('--extract-workers', default=None, type=int, help='Processes for extraction/cleaning/chunking [default: CPU count].')
+    @click.option('--index-workers', default=4, show_default=True, help='Concurrent embed + upsert jobs.')
+    @click.option('--checkpoint', 'checkpoint_path', default=None, help='Resume file [default: INGEST_CHECKPOINT_PATH].')
+    @click.option('--force', is_flag=True, help='Re-ingest papers that are already indexed.')
+    @click.option('--retry-failed', is_flag=True, help='Retry papers that failed in an earlier run.')
+    def ingest_command(arxiv_ids, ids_file, pdf_dir, download_workers, extract_workers, index_workers, checkpoint_path, force, retry_failed):
+        """Pre-index a corpus: ARXIV_IDS (and/or --ids-file) and/or a --pdf-dir of local PDFs."""
+        from app.core.ingestion_service import IngestionService
+
+        arxiv_ids = list(arxiv_ids)
+        if ids_file:
+            arxiv_ids += [line.split('#', 1)[0].strip() for line in ids_file if line.split('#', 1)[0].strip()]
+        if not arxiv_ids and not pdf_dir:
+            raise click.UsageError("Give arXiv IDs, --ids-file or --pdf-dir.")
+
+        paper_db_ids = []
+        if arxiv_ids:
+            arxiv_ids = list(dict.fromkeys(arxiv_ids)) # De-duplicate, keep order
+            click.echo(f"Fetching arXiv metadata for {len(arxiv_ids)} IDs...")
+            found_ids, unknown = IngestionService.papers_from_arxiv_ids(arxiv_ids)
+            paper_db_ids += found_ids
+            if unknown:
+                click.echo(f"arXiv returned nothing for {len(unknown)} IDs: {', '.join(unknown[:10])}{' ...' if len(unknown) > 10 else ''}", err=True)
+        if pdf_dir:
+            paper_db_ids += IngestionService.papers_from_pdf_dir(pdf_dir)
+
+        counts = IngestionService.run(
+            paper_db_ids,
+            download_workers=download_workers,
+            extract_workers=extract_workers,
+            index_workers=index_workers,
+            checkpoint_path=checkpoint_path or app.config.get('INGEST_CHECKPOINT_PATH'),
+            force=force,
+            retry_failed=retry_failed,
+            progress=click.echo,
+        )
+        if counts["failed"]:
+            raise SystemExit(1)
+
+    @app.cli.command('process-pending')
+    @click.option('--limit', default=100, show_default=True, help='Most papers to process in this run.')
+    @click.option('--download-workers', default=4, show_default=True, help='Concurrent PDF downloads.')
+    @click.option('--extract-workers', default=None, type=int, help='Processes for extraction/cleaning/chunking [default: CPU count].')
+    @click.option('--index-workers', default=4, show_default=True, help='Concurrent embed + upsert jobs.')
+    def process_pending_command(limit, download_workers, extract_workers, index_workers):
+        """Process papers that were never processed or whose retry is due (run it periodically, e.g. from cron)."""
+        from app.core.ingestion_service import IngestionService
+        from app.core.processing_service import ProcessingService
+
+        paper_db_ids = [paper.id for paper in ProcessingService.eligible_papers_query().limit(limit)]
+        if not paper_db_ids:
+            click.echo("No papers are due for processing.")
+            return
+
+        counts = IngestionService.run(
+            paper_db_ids,
+            download_workers=download_workers,
+            extract_workers=extract_workers,
+            index_workers=index_workers,
+            checkpoint_path=None, # The processing state columns decide what is due
+            progress=click.echo,
+        )
+        if counts["failed"]:
+            raise SystemExit(1)
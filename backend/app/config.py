@@ -10,11 +10,30 @@ if os.path.exists(dotenv_path):
 else:
     print(f"Warning: .env file not found at {dotenv_path}. Using environment variables directly.")
 
+def _engine_options(database_url: str | None) -> dict:
+    """
+    Connection pool settings for one database (SQLALCHEMY_ENGINE_OPTIONS, or a bind's options).
+    In-memory SQLite runs on a single shared connection and takes no pool settings.
+    """
+    if not database_url or (database_url.startswith('sqlite') and (':memory:' in database_url or database_url.rstrip('/') == 'sqlite:')):
+        return {}
+    return {
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', 10)), # Connections kept open per process
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 20)), # Extra connections under bursts, closed when returned
+        'pool_timeout': float(os.environ.get('DB_POOL_TIMEOUT', 30)), # Seconds to wait for a free connection before failing
+        'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', 1800)), # Replace connections older than this (server-side idle timeouts)
+        'pool_pre_ping': os.environ.get('DB_POOL_PRE_PING', 'true').lower() == 'true', # Test connections on checkout (drops dead ones after DB restarts)
+    }
+
 class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'you-will-never-guess'
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or \
         'sqlite:///' + os.path.join(os.path.abspath(os.path.dirname(os.path.dirname(__file__))), 'instance', 'app.db')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    SQLALCHEMY_ENGINE_OPTIONS = _engine_options(SQLALCHEMY_DATABASE_URI)
+    # Optional read replica: chat history and processing status reads go there (see app/db_sessions.py)
+    DATABASE_REPLICA_URL = os.environ.get('DATABASE_REPLICA_URL')
+    SQLALCHEMY_BINDS = {'replica': {'url': DATABASE_REPLICA_URL, **_engine_options(DATABASE_REPLICA_URL)}} if DATABASE_REPLICA_URL else {}
 
     JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY') or os.environ.get('SECRET_KEY') # Use SECRET_KEY if JWT_SECRET_KEY is not set
     JWT_ACCESS_TOKEN_EXPIRES = False # Or set a timedelta, e.g., timedelta(hours=1)
@@ -22,9 +41,16 @@ class Config:
 
     QDRANT_URL = os.environ.get('QDRANT_URL')
     QDRANT_API_KEY = os.environ.get('QDRANT_API_KEY') # Optional
+    QDRANT_PREFER_GRPC = os.environ.get('QDRANT_PREFER_GRPC', 'false').lower() == 'true' # gRPC transport (smaller, faster upserts)
+    QDRANT_GRPC_PORT = int(os.environ.get('QDRANT_GRPC_PORT', 6334))
+    # Indexing upserts: split into batches sent in parallel, each retried on its own
+    QDRANT_UPSERT_BATCH_SIZE = int(os.environ.get('QDRANT_UPSERT_BATCH_SIZE', 256))
+    QDRANT_UPSERT_PARALLEL = int(os.environ.get('QDRANT_UPSERT_PARALLEL', 4))
+    QDRANT_UPSERT_RETRIES = int(os.environ.get('QDRANT_UPSERT_RETRIES', 3))
 
     # LiteLLM model configuration
     LITELLM_MODEL_SUMMARIZE = os.environ.get('LITELLM_MODEL_SUMMARIZE', 'gemini/gemini-2.0-flash')
+    LITELLM_MODEL_FULL_SUMMARY = os.environ.get('LITELLM_MODEL_FULL_SUMMARY') or LITELLM_MODEL_SUMMARIZE # Full-text (map-reduce) summaries
     LITELLM_MODEL_CHAT = os.environ.get('LITELLM_MODEL_CHAT', 'gemini/gemini-2.0-flash')
     # Embedding model (can be specified for LiteLLM or a separate sentence-transformer)
     EMBEDDING_MODEL_NAME = os.environ.get('EMBEDDING_MODEL_NAME', 'gemini/text-embedding-004') # Example
@@ -32,6 +58,38 @@ class Config:
     # Directories
     PAPER_SAVE_DIR = os.environ.get('PAPER_SAVE_DIR') or os.path.join(os.path.abspath(os.path.dirname(os.path.dirname(__file__))), 'data', 'papers')
     PROMPTS_DIR = os.environ.get('PROMPTS_DIR') or os.path.join(os.path.abspath(os.path.dirname(os.path.dirname(__file__))), 'prompts')
+    # Per-paper chunk manifests used to re-index only changed chunks
+    INDEX_MANIFEST_DIR = os.environ.get('INDEX_MANIFEST_DIR') or os.path.join(os.path.abspath(os.path.dirname(os.path.dirname(__file__))), 'data', 'manifests')
+    # Local BM25 indexes for hybrid lexical + vector retrieval
+    BM25_INDEX_DIR = os.environ.get('BM25_INDEX_DIR') or os.path.join(os.path.abspath(os.path.dirname(os.path.dirname(__file__))), 'data', 'bm25')
+    BM25_CACHE_SIZE = int(os.environ.get('BM25_CACHE_SIZE', 128)) # Indexes kept loaded per process (LRU; each holds its vocabulary in memory)
+    # Chunk text lives in this local compressed SQLite store (zstd if installed, else zlib), not in the Qdrant payloads; empty keeps it in the payloads
+    CHUNK_STORE_PATH = os.environ.get('CHUNK_STORE_PATH', os.path.join(os.path.abspath(os.path.dirname(os.path.dirname(__file__))), 'data', 'chunk_store.sqlite3'))
+
+    # Logging: records go through a queue to a listener thread that writes logs/app.log (rotated) and the console
+    LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
+    LOG_FORMAT = os.environ.get('LOG_FORMAT', 'json') # 'json' (one object per line, with request_id/job_id) or 'text'
+    LOG_QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE', 10000)) # Records beyond this are dropped rather than blocking the caller
+    LOG_DEBUG_SAMPLE_RATE = float(os.environ.get('LOG_DEBUG_SAMPLE_RATE', 0.1)) # Fraction of requests/jobs whose DEBUG records are kept
+    # Tracing: spans per request, service call and external call, exported in batches by a background thread
+    TRACING_ENABLED = os.environ.get('TRACING_ENABLED', 'false').lower() == 'true'
+    TRACING_SAMPLE_RATE = float(os.environ.get('TRACING_SAMPLE_RATE', 1.0)) # Fraction of traces recorded (when the caller sent no traceparent)
+    TRACING_EXPORTER = os.environ.get('TRACING_EXPORTER', 'file') # 'file' (JSON lines, read with `flask trace-show`) or 'otlp'
+    TRACING_FILE_PATH = os.environ.get('TRACING_FILE_PATH') or os.path.join(os.path.abspath(os.path.dirname(os.path.dirname(__file__))), 'logs', 'traces.jsonl')
+    TRACING_FILE_MAX_BYTES = int(os.environ.get('TRACING_FILE_MAX_BYTES', 50 * 1024 * 1024)) # Then rotated to traces.jsonl.1
+    TRACING_OTLP_ENDPOINT = os.environ.get('TRACING_OTLP_ENDPOINT', 'http://localhost:4318/v1/traces') # OTLP/HTTP (JSON) collector
+    TRACING_SERVICE_NAME = os.environ.get('TRACING_SERVICE_NAME', 'ai-research-assistant')
+    TRACING_EXPORT_INTERVAL = float(os.environ.get('TRACING_EXPORT_INTERVAL', 2.0)) # Seconds between exports
+    TRACING_QUEUE_SIZE = int(os.environ.get('TRACING_QUEUE_SIZE', 10000)) # Finished spans beyond this are dropped
+    # Users allowed to call /api/admin (comma-separated user IDs)
+    ADMIN_USER_IDS = [int(user_id) for user_id in os.environ.get('ADMIN_USER_IDS', '').split(',') if user_id.strip()]
+    # On-demand request profiling: folded stacks (flame-graph input) per profiled request, newest PROFILE_MAX_FILES kept
+    PROFILE_DIR = os.environ.get('PROFILE_DIR') or os.path.join(os.path.abspath(os.path.dirname(os.path.dirname(__file__))), 'logs', 'profiles')
+    PROFILE_MAX_FILES = int(os.environ.get('PROFILE_MAX_FILES', 200))
+    PROFILE_INTERVAL_MS = float(os.environ.get('PROFILE_INTERVAL_MS', 5)) # Stack sampling interval
+    PROFILE_MAX_CONCURRENT = int(os.environ.get('PROFILE_MAX_CONCURRENT', 4)) # Requests profiled at once per process
+    PROFILE_DEFAULT_DURATION_SECONDS = int(os.environ.get('PROFILE_DEFAULT_DURATION_SECONDS', 600)) # How long a sampling switch stays on
+    PROFILE_MAX_DURATION_SECONDS = int(os.environ.get('PROFILE_MAX_DURATION_SECONDS', 3600))
 
     # Celery (Optional, for background tasks)
     # CELERY_BROKER_URL = os.environ.get('CELERY_BROKER_URL') or 'redis://localhost:6379/0'
@@ -39,6 +97,63 @@ class Config:
 
     # Other configurations
     MAX_ARXIV_RESULTS = int(os.environ.get('MAX_ARXIV_RESULTS', 5))
+    SEARCH_SUMMARY_WORKERS = int(os.environ.get('SEARCH_SUMMARY_WORKERS', 5)) # Concurrent abstract summaries in /search/stream
+    LLM_MAX_CONCURRENCY = int(os.environ.get('LLM_MAX_CONCURRENCY', 8)) # In-flight LLM completions per process; 0 = unlimited
+
+    # Full-text summaries (POST /api/papers/<id>/full-summary): chunk groups are summarized concurrently, then reduced in a tree
+    FULL_SUMMARY_GROUP_TOKENS = int(os.environ.get('FULL_SUMMARY_GROUP_TOKENS', 6000)) # Chunk text per map call
+    FULL_SUMMARY_REDUCE_TOKENS = int(os.environ.get('FULL_SUMMARY_REDUCE_TOKENS', 12000)) # Partial summaries per reduce call
+    FULL_SUMMARY_PARTIAL_MAX_TOKENS = int(os.environ.get('FULL_SUMMARY_PARTIAL_MAX_TOKENS', 300)) # Output of each map/intermediate call
+    FULL_SUMMARY_MAX_TOKENS = int(os.environ.get('FULL_SUMMARY_MAX_TOKENS', 800)) # Output of the final call
+
+    # Bulk status endpoint (GET /api/papers/status): long-poll and SSE limits
+    STATUS_MAX_IDS = int(os.environ.get('STATUS_MAX_IDS', 100)) # Papers per request
+    STATUS_MAX_WAIT_SECONDS = int(os.environ.get('STATUS_MAX_WAIT_SECONDS', 30)) # Longest long-poll a client can ask for
+    STATUS_RECHECK_SECONDS = float(os.environ.get('STATUS_RECHECK_SECONDS', 5)) # DB recheck while waiting (catches changes made by other processes)
+    STATUS_STREAM_MAX_SECONDS = int(os.environ.get('STATUS_STREAM_MAX_SECONDS', 600)) # An SSE status stream is closed after this; clients reconnect
+
+    # arXiv API client and persistent query-result cache (shared by all workers on the host)
+    ARXIV_PAGE_SIZE = int(os.environ.get('ARXIV_PAGE_SIZE', 100)) # Results per API request; also the id_list batch size
+    ARXIV_DELAY_SECONDS = float(os.environ.get('ARXIV_DELAY_SECONDS', 3.0)) # arXiv asks for at most one request every 3 s
+    ARXIV_NUM_RETRIES = int(os.environ.get('ARXIV_NUM_RETRIES', 3))
+    ARXIV_CACHE_PATH = os.environ.get('ARXIV_CACHE_PATH') or os.path.join(os.path.abspath(os.path.dirname(os.path.dirname(__file__))), 'data', 'arxiv_cache.sqlite3')
+    ARXIV_CACHE_TTL = int(os.environ.get('ARXIV_CACHE_TTL', 86400)) # Seconds; 0 disables the cache
+    # `flask ingest` resume file (JSON lines, one record per finished paper)
+    INGEST_CHECKPOINT_PATH = os.environ.get('INGEST_CHECKPOINT_PATH') or os.path.join(os.path.abspath(os.path.dirname(os.path.dirname(__file__))), 'data', 'ingest_checkpoint.jsonl')
+
+    # Background processing retries: exponential backoff from PROCESSING_RETRY_BASE_SECONDS, capped; give up after PROCESSING_MAX_ATTEMPTS
+    PROCESSING_MAX_ATTEMPTS = int(os.environ.get('PROCESSING_MAX_ATTEMPTS', 5))
+    PROCESSING_RETRY_BASE_SECONDS = int(os.environ.get('PROCESSING_RETRY_BASE_SECONDS', 60))
+    PROCESSING_RETRY_MAX_SECONDS = int(os.environ.get('PROCESSING_RETRY_MAX_SECONDS', 6 * 3600))
+    PROCESSING_LEASE_SECONDS = int(os.environ.get('PROCESSING_LEASE_SECONDS', 1800)) # A claimed paper is considered abandoned after this
+
+    # Indexing jobs share embedding requests: texts from all concurrent jobs are packed into batches
+    EMBEDDING_AGGREGATOR_ENABLED = os.environ.get('EMBEDDING_AGGREGATOR_ENABLED', 'true').lower() == 'true'
+    EMBEDDING_BATCH_SIZE = int(os.environ.get('EMBEDDING_BATCH_SIZE', 100)) # Texts per provider call
+    EMBEDDING_BATCH_LINGER_MS = float(os.environ.get('EMBEDDING_BATCH_LINGER_MS', 50)) # Max wait for a batch to fill
+    EMBEDDING_BATCH_CONCURRENCY = int(os.environ.get('EMBEDDING_BATCH_CONCURRENCY', 2)) # Provider calls in flight
+    EMBEDDING_BATCH_TIMEOUT = float(os.environ.get('EMBEDDING_BATCH_TIMEOUT', 300)) # Max wait of a job for its vectors
+
+    # Shared Qdrant collection of search-result abstracts, used for chat until a paper's full text is indexed
+    ABSTRACT_COLLECTION_NAME = os.environ.get('ABSTRACT_COLLECTION_NAME', 'paper_abstracts')
+
+    # Chunking and retrieval
+    CHUNK_MAX_TOKENS = int(os.environ.get('CHUNK_MAX_TOKENS', 400))
+    CHUNK_OVERLAP_TOKENS = int(os.environ.get('CHUNK_OVERLAP_TOKENS', 40))
+    RAG_TOP_K = int(os.environ.get('RAG_TOP_K', 3)) # Max chunks per paper in the chat context
+    RAG_CANDIDATES_PER_PAPER = int(os.environ.get('RAG_CANDIDATES_PER_PAPER', 8)) # Hits fetched per paper before pooling
+    RAG_CONTEXT_CHUNK_BUDGET = int(os.environ.get('RAG_CONTEXT_CHUNK_BUDGET', 6)) # Max chunks across all selected papers
+    RAG_MMR_LAMBDA = float(os.environ.get('RAG_MMR_LAMBDA', 0.7)) # 1.0 = pure relevance, 0.0 = pure diversity
+
+    # Per-process caches for chat turns (entries, seconds)
+    QUERY_EMBEDDING_CACHE_SIZE = int(os.environ.get('QUERY_EMBEDDING_CACHE_SIZE', 1024))
+    QUERY_EMBEDDING_CACHE_TTL = int(os.environ.get('QUERY_EMBEDDING_CACHE_TTL', 3600))
+    RETRIEVAL_CACHE_SIZE = int(os.environ.get('RETRIEVAL_CACHE_SIZE', 512))
+    RETRIEVAL_CACHE_TTL = int(os.environ.get('RETRIEVAL_CACHE_TTL', 600))
+
+    # Responses: JSON bodies at least this large are gzip-compressed when the client accepts it
+    GZIP_MIN_SIZE = int(os.environ.get('GZIP_MIN_SIZE', 1024))
+    GZIP_LEVEL = int(os.environ.get('GZIP_LEVEL', 6))
 
 class DevelopmentConfig(Config):
     DEBUG = True
@@ -47,6 +162,8 @@ class DevelopmentConfig(Config):
 class TestingConfig(Config):
     TESTING = True
     SQLALCHEMY_DATABASE_URI = os.environ.get('TEST_DATABASE_URL') or 'sqlite:///:memory:'
+    SQLALCHEMY_ENGINE_OPTIONS = _engine_options(SQLALCHEMY_DATABASE_URI)
+    SQLALCHEMY_BINDS = {}
     WTF_CSRF_ENABLED = False # Disable CSRF for testing forms if you use Flask-WTF
 
 class ProductionConfig(Config):
@@ -1,21 +1,93 @@
 # app/core/arxiv_service.py
+from functools import lru_cache
 from flask import current_app
-from retriever.arxiv_client import search_arxiv as search_arxiv_external # Assuming this is accessible
+from retriever.arxiv_client import (
+    search_arxiv as search_arxiv_external,
+    iter_arxiv as iter_arxiv_external,
+    asearch_arxiv as asearch_arxiv_external,
+    fetch_arxiv_metadata as fetch_arxiv_metadata_external,
+    get_arxiv_client,
+) # Assuming this is accessible
+from retriever.arxiv_cache import ArxivQueryCache
 # If retriever is a sub-module of app, e.g., app.retriever.arxiv_client:
 # from app.retriever.arxiv_client import search_arxiv as search_arxiv_external
 
+@lru_cache(maxsize=None)
+def _query_cache(path: str, ttl: int) -> ArxivQueryCache:
+    return ArxivQueryCache(path, ttl)
+
 class ArxivService:
+    @staticmethod
+    def _client():
+        config = current_app.config
+        return get_arxiv_client(
+            page_size=config.get('ARXIV_PAGE_SIZE', 100),
+            delay_seconds=config.get('ARXIV_DELAY_SECONDS', 3.0),
+            num_retries=config.get('ARXIV_NUM_RETRIES', 3),
+        )
+
+    @staticmethod
+    def _cache():
+        """The persistent query-result cache, or None when disabled (ARXIV_CACHE_TTL <= 0)."""
+        config = current_app.config
+        ttl = config.get('ARXIV_CACHE_TTL', 86400)
+        if ttl <= 0 or not config.get('ARXIV_CACHE_PATH'):
+            return None
+        return _query_cache(config['ARXIV_CACHE_PATH'], ttl)
+
     @staticmethod
     def search_papers(query: str):
         max_results = current_app.config.get('MAX_ARXIV_RESULTS', 5)
         try:
             # search_arxiv_external returns (results, pdf_urls)
             # We are interested in the 'results' part which is List[Dict]
-            results, _ = search_arxiv_external(query=query, max_results=max_results)
+            results, _ = search_arxiv_external(query=query, max_results=max_results, client=ArxivService._client(), cache=ArxivService._cache())
             # Ensure results have 'paper_id' which is 'result.get_short_id()' from your client
             # Your arxiv_client.py already creates 'paper_id'.
             return results
         except Exception as e:
             current_app.logger.error(f"Error searching arXiv for query '{query}': {e}")
             # Consider re-raising a custom service exception or returning an error indicator
-            raise  # Or return None / empty list and handle in API layer
\ No newline at end of file
+            raise  # Or return None / empty list and handle in API layer
+
+    @staticmethod
+    def iter_papers(query: str):
+        """Like search_papers, but yields each result as soon as it is parsed (used by the streaming search)."""
+        max_results = current_app.config.get('MAX_ARXIV_RESULTS', 5)
+        try:
+            yield from iter_arxiv_external(query=query, max_results=max_results, client=ArxivService._client(), cache=ArxivService._cache())
+        except Exception as e:
+            current_app.logger.error(f"Error searching arXiv for query '{query}': {e}")
+            raise
+
+    @staticmethod
+    async def asearch_papers(query: str):
+        """Async variant of search_papers (queries the arXiv Atom API directly over httpx, spaced by ARXIV_DELAY_SECONDS)."""
+        max_results = current_app.config.get('MAX_ARXIV_RESULTS', 5)
+        cache = ArxivService._cache()
+        try:
+            cached = cache.get(query, max_results) if cache else None # Local SQLite read, fast enough to do inline
+            if cached is not None:
+                return cached
+            results, _ = await asearch_arxiv_external(
+                query=query, max_results=max_results, delay_seconds=current_app.config.get('ARXIV_DELAY_SECONDS', 3.0),
+            )
+            if cache:
+                cache.set(query, max_results, results)
+            return results
+        except Exception as e:
+            current_app.logger.error(f"Error searching arXiv for query '{query}': {e}")
+            raise
+
+    @staticmethod
+    def fetch_metadata(arxiv_ids: list[str]) -> list[dict]:
+        """Current arXiv metadata for many known papers, batched into as few API requests as possible."""
+        try:
+            return fetch_arxiv_metadata_external(
+                arxiv_ids,
+                client=ArxivService._client(),
+                batch_size=current_app.config.get('ARXIV_PAGE_SIZE', 100),
+            )
+        except Exception as e:
+            current_app.logger.error(f"Error fetching arXiv metadata for {len(arxiv_ids)} papers: {e}")
+            raise
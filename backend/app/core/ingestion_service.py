@@ -0,0 +1,250 @@
+# app/core/ingestion_service.py
+"""
+Offline bulk ingestion (`flask ingest`): download -> extract/clean/chunk -> embed/upsert as a pipeline.
+
+Each stage has its own pool and papers flow through them independently, so downloads, CPU-bound
+PDF parsing and network-bound indexing all overlap:
+  download   threads   (network)
+  extract    processes (PyMuPDF + cleaning + chunking are CPU bound and hold the GIL)
+  index      threads   (embedding API + Qdrant upserts)
+All DB writes happen on the calling thread. A JSON-lines checkpoint records every finished paper,
+so an interrupted run picks up where it stopped.
+"""
+import datetime
+import hashlib
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, FIRST_COMPLETED, wait
+from pathlib import Path
+
+from flask import current_app
+from app.extensions import db
+from app.models.paper import PaperMetadata
+from app.core.arxiv_service import ArxivService
+from app.core.download_service import DownloadService
+from app.core.processing_service import ProcessingService
+from app.core.rag_service import RAGService
+from app.logging_setup import propagate_context, with_job_id
+from app.tracing import span
+
+def extract_and_chunk_pdf(pdf_path: str, max_tokens: int, overlap_tokens: int) -> list[dict]:
+    """Runs in a worker process (no app context): per-page extraction, cleaning and structure-aware chunking."""
+    from processor.pdf_extractor import extract_pages_from_pdf
+    from processor.text_cleaner import TextCleaner
+    from rag.structure_chunker import chunk_pages
+
+    pages = extract_pages_from_pdf(pdf_path)
+    if not pages or not any(page.strip() for page in pages):
+        raise RuntimeError("No text could be extracted")
+    return chunk_pages(pages, clean_func=TextCleaner().clean, max_tokens=max_tokens, overlap_tokens=overlap_tokens)
+
+def load_checkpoint(path: str) -> dict:
+    """paper_id -> last recorded {"status": "done"|"failed", ...}. Later lines win."""
+    records = {}
+    if not path or not os.path.exists(path):
+        return records
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue # A line cut short by the interruption
+            records[record["paper_id"]] = record
+    return records
+
+class _Checkpoint:
+    def __init__(self, path: str | None):
+        self._file = None
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._file = open(path, "a", encoding="utf-8")
+
+    def record(self, paper_id: str, status: str, **extra):
+        if self._file:
+            self._file.write(json.dumps({"paper_id": paper_id, "status": status, **extra}) + "\n")
+            self._file.flush() # Survive a kill -9
+
+    def close(self):
+        if self._file:
+            self._file.close()
+
+def local_paper_id(stem: str) -> str:
+    """
+    ID of a local PDF: "local:<file stem>". Stems too long for the arxiv_id column become
+    "local:<first 30 characters>-<8 hex digits of the stem's SHA-1>", still one ID per file.
+    """
+    paper_id = f"local:{stem}"
+    if len(paper_id) <= PaperMetadata.arxiv_id.type.length:
+        return paper_id
+    return f"local:{stem[:30]}-{hashlib.sha1(stem.encode('utf-8')).hexdigest()[:8]}"
+
+class IngestionService:
+    @staticmethod
+    def papers_from_arxiv_ids(arxiv_ids: list[str]) -> tuple[list[int], list[str]]:
+        """Creates/updates metadata rows for arXiv IDs (batched id_list lookups). Returns (db ids, IDs arXiv didn't know)."""
+        results = ArxivService.fetch_metadata(arxiv_ids)
+        db_ids = [PaperMetadata.upsert_from_arxiv(res).id for res in results]
+        db.session.commit()
+        found = {res['paper_id'] for res in results}
+        # Bare IDs come back versioned ("2303.08774" -> "2303.08774v5")
+        found |= {paper_id.rsplit('v', 1)[0] for paper_id in found}
+        return db_ids, [arxiv_id for arxiv_id in arxiv_ids if arxiv_id not in found]
+
+    @staticmethod
+    def papers_from_pdf_dir(pdf_dir: str) -> list[int]:
+        """Creates metadata rows for local PDFs (arxiv_id from local_paper_id), already marked as downloaded."""
+        db_ids = []
+        for pdf_path in sorted(Path(pdf_dir).glob("*.pdf")):
+            paper_id = local_paper_id(pdf_path.stem)
+            paper = PaperMetadata.query.filter_by(arxiv_id=paper_id).first()
+            if not paper:
+                paper = PaperMetadata(arxiv_id=paper_id, title=pdf_path.stem.replace('_', ' '), source="local")
+                db.session.add(paper)
+            paper.local_pdf_path = str(pdf_path.resolve())
+            paper.downloaded_at = paper.downloaded_at or datetime.datetime.now(datetime.timezone.utc)
+            db.session.flush()
+            db_ids.append(paper.id)
+        db.session.commit()
+        return db_ids
+
+    @staticmethod
+    @with_job_id("ingest") # Tags the run's log records, including those of its download/index threads
+    def run(
+        paper_db_ids: list[int],
+        download_workers: int = 4,
+        extract_workers: int | None = None,
+        index_workers: int = 4,
+        checkpoint_path: str | None = None,
+        force: bool = False,
+        retry_failed: bool = False,
+        progress=print,
+    ) -> dict:
+        """
+        Pushes the papers through the pipeline. Papers already indexed (or marked done in the checkpoint)
+        are skipped unless `force`; papers that failed in an earlier run are skipped unless `retry_failed`.
+        Returns counts {"done", "failed", "skipped"}.
+        """
+        app = current_app._get_current_object()
+        config = app.config
+        extract_workers = extract_workers or os.cpu_count() or 1
+        checkpoint = load_checkpoint(checkpoint_path)
+
+        queue = []
+        counts = {"done": 0, "failed": 0, "skipped": 0}
+        for paper in db.session.query(PaperMetadata).filter(PaperMetadata.id.in_(paper_db_ids)).all():
+            previous = checkpoint.get(paper.arxiv_id, {}).get("status")
+            if not force and (paper.indexed_at or previous == "done" or (previous == "failed" and not retry_failed)):
+                counts["skipped"] += 1
+                continue
+            queue.append(paper.id)
+        total = len(queue)
+        progress(f"{total} papers to ingest, {counts['skipped']} skipped (already indexed or in checkpoint).")
+        if not total:
+            return counts
+
+        def download(pdf_url, arxiv_id):
+            with app.app_context(), span("ingest.download", paper_id=arxiv_id):
+                paths = DownloadService.download_paper_pdfs([{"pdf_url": pdf_url, "paper_id": arxiv_id}])
+            if not paths:
+                raise RuntimeError("Download failed")
+            return paths[0]
+
+        def index(arxiv_id, title, chunks):
+            with app.app_context(), span("ingest.index", paper_id=arxiv_id, chunks=len(chunks)):
+                collection_name = RAGService.index_paper_content(paper_id=arxiv_id, paper_title=title, chunks=chunks)
+            if not collection_name:
+                raise RuntimeError("Indexing failed")
+            return collection_name
+
+        log = _Checkpoint(checkpoint_path)
+        # Bound the number of papers in flight, so pages of chunk text don't pile up between stages
+        max_in_flight = 2 * (download_workers + extract_workers + index_workers)
+        started_at = time.monotonic()
+        in_flight = {} # future -> (stage, paper db id)
+
+        def fail(paper, stage, error):
+            counts["failed"] += 1
+            current_app.logger.error(f"Ingestion of {paper.arxiv_id} failed at {stage}: {error}")
+            ProcessingService.record_failure(paper, stage, error)
+            db.session.commit()
+            log.record(paper.arxiv_id, "failed", stage=stage, error=str(error)[:200])
+            progress(f"[{counts['done'] + counts['failed']}/{total}] {paper.arxiv_id} FAILED at {stage}: {error}")
+
+        def submit_extract(paper):
+            in_flight[extract_pool.submit(
+                extract_and_chunk_pdf, paper.local_pdf_path,
+                config.get('CHUNK_MAX_TOKENS', 400), config.get('CHUNK_OVERLAP_TOKENS', 40),
+            )] = ("extract", paper.id)
+
+        now = lambda: datetime.datetime.now(datetime.timezone.utc)
+        # spawn: forking a process that already runs download/index threads is not safe
+        with ThreadPoolExecutor(max_workers=download_workers) as download_pool, \
+             ProcessPoolExecutor(max_workers=extract_workers, mp_context=multiprocessing.get_context("spawn")) as extract_pool, \
+             ThreadPoolExecutor(max_workers=index_workers) as index_pool:
+            try:
+                while queue or in_flight:
+                    while queue and len(in_flight) < max_in_flight:
+                        paper = db.session.get(PaperMetadata, queue.pop(0))
+                        # Not while a search-triggered thread or another run is processing it
+                        claimed = ProcessingService.claim(db.session, paper.id, retry_now=True)
+                        db.session.commit()
+                        if not claimed:
+                            counts["skipped"] += 1
+                            progress(f"{paper.arxiv_id} skipped: another worker is processing it.")
+                            continue
+                        if paper.local_pdf_path and Path(paper.local_pdf_path).exists():
+                            submit_extract(paper)
+                        elif paper.pdf_url:
+                            in_flight[download_pool.submit(propagate_context(download), paper.pdf_url, paper.arxiv_id)] = ("download", paper.id)
+                        else:
+                            fail(paper, "download", "No PDF URL or local file")
+
+                    if not in_flight:
+                        continue
+                    done, _ = wait(list(in_flight), return_when=FIRST_COMPLETED)
+                    for future in done:
+                        stage, paper_db_id = in_flight.pop(future)
+                        paper = db.session.get(PaperMetadata, paper_db_id)
+                        try:
+                            result = future.result()
+                        except Exception as e:
+                            fail(paper, stage, e)
+                            continue
+
+                        if stage == "download":
+                            paper.local_pdf_path = result
+                            paper.downloaded_at = now()
+                            submit_extract(paper)
+                        elif stage == "extract":
+                            paper.text_extracted_at = paper.cleaned_text_at = now()
+                            in_flight[index_pool.submit(propagate_context(index), paper.arxiv_id, paper.title, result)] = ("index", paper.id)
+                        else:
+                            paper.mark_indexed(result, now())
+                            counts["done"] += 1
+                            log.record(paper.arxiv_id, "done", collection=result)
+                            elapsed = time.monotonic() - started_at
+                            finished = counts["done"] + counts["failed"]
+                            eta = elapsed / finished * (total - finished)
+                            progress(
+                                f"[{finished}/{total}] {paper.arxiv_id} indexed "
+                                f"({counts['done'] / elapsed * 60:.1f} papers/min, ETA {eta / 60:.1f} min)"
+                            )
+                        db.session.commit()
+            finally:
+                log.close()
+                for future in in_flight:
+                    future.cancel() # Interrupted: queued work is dropped, the checkpoint lets the next run resume
+                if in_flight:
+                    # Release the claims of unfinished papers, so a resumed run doesn't skip them until the lease lapses
+                    db.session.rollback()
+                    released = ProcessingService.release_claims(db.session, [paper_db_id for _, paper_db_id in in_flight.values()])
+                    db.session.commit()
+                    progress(f"Interrupted: released {released} unfinished papers.")
+
+        progress(f"Finished in {time.monotonic() - started_at:.0f} s: {counts['done']} indexed, {counts['failed']} failed, {counts['skipped']} skipped.")
+        return counts
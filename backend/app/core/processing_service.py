@@ -1,13 +1,22 @@
 # app/core/processing_service.py
+import datetime
 from flask import current_app
 from pathlib import Path
+from sqlalchemy import and_, or_, update
+from app.models.paper import PaperMetadata, ProcessingState
+from app.services.status_notifier import mark_papers_changed
 # Assuming processor.pdf_extractor and processor.text_cleaner are accessible
-from processor.pdf_extractor import extract_text_from_pdf as extract_text_external
+from processor.pdf_extractor import extract_text_from_pdf as extract_text_external, extract_pages_from_pdf as extract_pages_external
 from processor.text_cleaner import TextCleaner # Your TextCleaner is a class
+from rag.structure_chunker import chunk_pages as chunk_pages_external
 
 # Initialize cleaner once, or make its methods static if no state is stored
 text_cleaner_instance = TextCleaner()
 
+def _utcnow() -> datetime.datetime:
+    # Naive UTC, compared against next_retry_at in SQL
+    return datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+
 class ProcessingService:
     @staticmethod
     def extract_text(pdf_path: str) -> str | None:
@@ -26,6 +35,34 @@ class ProcessingService:
             return None
 
 
+    @staticmethod
+    def extract_pages(pdf_path: str) -> list[str] | None:
+        """Extracts text from a given PDF path, one string per page."""
+        try:
+            return extract_pages_external(pdf_path)
+        except FileNotFoundError:
+            current_app.logger.error(f"PDF not found for extraction: {pdf_path}")
+            return None
+        except RuntimeError as e:
+            current_app.logger.error(f"Error extracting text from PDF {pdf_path}: {e}")
+            return None
+        except Exception as e:
+            current_app.logger.error(f"Unexpected error extracting text from PDF {pdf_path}: {e}")
+            return None
+
+    @staticmethod
+    def build_chunks(pages: list[str]) -> list[dict]:
+        """
+        Cleans per-page text and splits it into section-aware, token-sized chunks.
+        Each chunk carries 'text', 'section', 'page_start' and 'page_end'.
+        """
+        return chunk_pages_external(
+            pages,
+            clean_func=ProcessingService.clean_text,
+            max_tokens=current_app.config.get('CHUNK_MAX_TOKENS', 400),
+            overlap_tokens=current_app.config.get('CHUNK_OVERLAP_TOKENS', 40),
+        )
+
     @staticmethod
     def clean_text(raw_text: str) -> str:
         """Cleans the extracted text."""
@@ -35,4 +72,103 @@ class ProcessingService:
         except Exception as e:
             current_app.logger.error(f"Error cleaning text: {e}")
             # Return raw text or empty string on failure, or raise
-            return raw_text # Or raise, depending on desired behavior
\ No newline at end of file
+            return raw_text # Or raise, depending on desired behavior
+
+    # --- Processing state and retry policy ---
+
+    @staticmethod
+    def retry_delay(attempts: int) -> datetime.timedelta | None:
+        """Exponential backoff after `attempts` failed attempts; None once PROCESSING_MAX_ATTEMPTS is reached."""
+        config = current_app.config
+        if attempts >= config.get('PROCESSING_MAX_ATTEMPTS', 5):
+            return None
+        delay = config.get('PROCESSING_RETRY_BASE_SECONDS', 60) * 2 ** max(attempts - 1, 0)
+        return datetime.timedelta(seconds=min(delay, config.get('PROCESSING_RETRY_MAX_SECONDS', 6 * 3600)))
+
+    @staticmethod
+    def claim(session, paper_db_id: int, retry_now: bool = False) -> bool:
+        """
+        Claims the paper for a worker with one conditional UPDATE, so of two workers racing for the same
+        paper exactly one wins. Returns False if the paper is missing, already claimed, or not due.
+        retry_now (manual retry, `flask ingest`) skips the retry wait and also takes failed or indexed
+        papers, but never an unexpired claim. The claim lapses after PROCESSING_LEASE_SECONDS, so a
+        crashed worker doesn't leave the paper stuck. The caller commits.
+        """
+        now = _utcnow()
+        claim_lapsed = and_(PaperMetadata.processing_state == ProcessingState.IN_PROGRESS, PaperMetadata.next_retry_at <= now)
+        if retry_now:
+            claimable = or_(PaperMetadata.processing_state != ProcessingState.IN_PROGRESS, claim_lapsed)
+        else:
+            claimable = and_(
+                PaperMetadata.indexed_at.is_(None),
+                or_(
+                    PaperMetadata.processing_state == ProcessingState.PENDING,
+                    and_(PaperMetadata.processing_state == ProcessingState.FAILED, PaperMetadata.next_retry_at <= now),
+                    claim_lapsed,
+                ),
+            )
+        result = session.execute(
+            update(PaperMetadata)
+            .where(PaperMetadata.id == paper_db_id, claimable)
+            .values(
+                processing_state=ProcessingState.IN_PROGRESS,
+                processing_attempts=PaperMetadata.processing_attempts + 1,
+                next_retry_at=now + datetime.timedelta(seconds=current_app.config.get('PROCESSING_LEASE_SECONDS', 1800)),
+            )
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount != 1:
+            return False
+        mark_papers_changed(session, [paper_db_id])
+        return True
+
+    @staticmethod
+    def release_claims(session, paper_db_ids: list[int]) -> int:
+        """
+        Hands claimed papers back (IN_PROGRESS -> PENDING), e.g. when an interrupted run drops its
+        unfinished work, so the next run can take them without waiting for the lease. The caller commits.
+        """
+        if not paper_db_ids:
+            return 0
+        result = session.execute(
+            update(PaperMetadata)
+            .where(PaperMetadata.id.in_(paper_db_ids), PaperMetadata.processing_state == ProcessingState.IN_PROGRESS)
+            .values(processing_state=ProcessingState.PENDING, next_retry_at=None)
+            .execution_options(synchronize_session=False)
+        )
+        mark_papers_changed(session, paper_db_ids)
+        return result.rowcount
+
+    @staticmethod
+    def record_failure(paper: PaperMetadata, stage: str, error) -> None:
+        delay = ProcessingService.retry_delay(paper.processing_attempts or 0)
+        paper.mark_processing_failed(stage, error, _utcnow() + delay if delay else None)
+        if delay:
+            current_app.logger.info(f"Paper {paper.arxiv_id} failed at {stage} (attempt {paper.processing_attempts}); retry after {delay}.")
+        else:
+            current_app.logger.warning(f"Paper {paper.arxiv_id} failed at {stage} after {paper.processing_attempts} attempts; giving up.")
+
+    @staticmethod
+    def is_claimed(paper: PaperMetadata) -> bool:
+        """A worker is processing the paper right now (and its claim hasn't lapsed)."""
+        return paper.processing_state == ProcessingState.IN_PROGRESS and paper.next_retry_at is not None and paper.next_retry_at > _utcnow()
+
+    @staticmethod
+    def eligible_papers_query(paper_db_ids: list[int] | None = None):
+        """
+        Papers that should be processed now: never attempted, or failed/abandoned with their retry time passed.
+        Served by the (processing_state, next_retry_at) index.
+        """
+        query = PaperMetadata.query.filter(
+            PaperMetadata.indexed_at.is_(None),
+            or_(
+                PaperMetadata.processing_state == ProcessingState.PENDING,
+                and_(
+                    PaperMetadata.processing_state.in_([ProcessingState.FAILED, ProcessingState.IN_PROGRESS]),
+                    PaperMetadata.next_retry_at <= _utcnow(),
+                ),
+            ),
+        )
+        if paper_db_ids is not None:
+            query = query.filter(PaperMetadata.id.in_(paper_db_ids))
+        return query.order_by(PaperMetadata.id)
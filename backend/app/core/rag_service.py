@@ -1,21 +1,60 @@
 # app/core/rag_service.py
+from functools import lru_cache
 from flask import current_app
-from app.services.qdrant_client_setup import get_qdrant_client, create_qdrant_collection
-from app.services.embedding_service import get_embedding as get_embedding_func # Renamed for clarity
-from app.services.litellm_service import completion as litellm_completion_wrapper
+from app.services.qdrant_client_setup import get_qdrant_client, get_async_qdrant_client, create_qdrant_collection, delete_qdrant_collection, forget_missing_collection
+from app.services.embedding_service import get_embedding as get_embedding_func, get_embedding_model_name, get_query_embedding, aget_query_embedding # Renamed for clarity
+from app.services.embedding_batcher import get_batched_embedding
+from app.services.cache_service import get_cache, get_collection_generation, invalidate_collection
+from app.models.paper import PaperMetadata, ProcessingState
+from app.db_sessions import worker_session
+from app.services.status_notifier import mark_papers_changed
+import hashlib
+from app.tracing import traced
+from app.services.litellm_service import completion as litellm_completion_wrapper, acompletion as litellm_acompletion_wrapper
 
 # Assuming rag.chunk_and_index, rag.context_retriever, rag.format_context, rag.chat_with_papers are accessible
 # and have been ADAPTED as discussed earlier.
 from rag.chunk_and_index import chunk_and_index_paper as chunk_and_index_external
-from rag.context_retriever import retrieve_context as retrieve_context_external
-from rag.format_context import format_llm_context # This one might not need changes if it's pure Python
-from rag.chat_with_papers import chat_with_papers as chat_with_papers_external
+from rag.context_retriever import retrieve_context as retrieve_context_external, aretrieve_context as aretrieve_context_external, load_paper_chunks as load_paper_chunks_external
+from rag.context_selection import select_context
+from rag.abstract_index import index_abstracts as index_abstracts_external, abstract_point_id
+from rag.chunk_store import ChunkStore
+from rag.chunk_and_index import base_paper_id
+from rag.format_context import format_llm_context, build_source_refs # This one might not need changes if it's pure Python
+from rag.chat_with_papers import chat_with_papers as chat_with_papers_external, achat_with_papers as achat_with_papers_external
+
+@lru_cache(maxsize=None)
+def _chunk_store_at(path: str) -> ChunkStore:
+    return ChunkStore(path)
 
 class RAGService:
     @staticmethod
-    def index_paper_content(paper_id: str, paper_title: str, paper_text: str) -> str | None:
+    def _chunk_store() -> ChunkStore | None:
+        """The local chunk-text store, or None when disabled (empty CHUNK_STORE_PATH: text stays in the Qdrant payloads)."""
+        path = current_app.config.get('CHUNK_STORE_PATH')
+        return _chunk_store_at(path) if path else None
+
+    @staticmethod
+    def _invalidate_versions(paper_ids: list[str]) -> None:
+        """Sends versions whose chunks were dropped (embedding model change) back to the processing queue."""
+        with worker_session() as session:
+            papers = session.query(PaperMetadata).filter(PaperMetadata.arxiv_id.in_(paper_ids))
+            mark_papers_changed(session, [paper_db_id for (paper_db_id,) in papers.with_entities(PaperMetadata.id)])
+            papers.update({
+                PaperMetadata.indexed_at: None,
+                PaperMetadata.processing_state: ProcessingState.PENDING,
+                PaperMetadata.processing_attempts: 0,
+                PaperMetadata.next_retry_at: None,
+            }, synchronize_session=False)
+        current_app.logger.warning(f"Embedding model changed: versions {', '.join(paper_ids)} must be re-indexed.")
+
+    @staticmethod
+    @traced()
+    def index_paper_content(paper_id: str, paper_title: str, paper_text: str | None = None, chunks: list[dict] | None = None) -> str | None:
         """
         Chunks text and indexes it in Qdrant.
+        Pass `chunks` (from ProcessingService.build_chunks) to keep section and page metadata;
+        otherwise `paper_text` is split by characters.
         Returns the Qdrant collection name if successful, else None.
         """
         qdrant_client = get_qdrant_client()
@@ -27,38 +66,211 @@ class RAGService:
                 paper_text=paper_text,
                 qdrant_client_instance=qdrant_client,
                 create_collection_func=create_qdrant_collection, # From qdrant_client_setup
-                embedding_func=get_embedding_func, # From embedding_service
+                embedding_func=get_batched_embedding, # Shared cross-job batches (embedding_batcher)
+                manifest_dir=current_app.config.get('INDEX_MANIFEST_DIR'), # Enables incremental re-indexing
+                embedding_model=get_embedding_model_name(),
+                chunks=chunks,
+                bm25_dir=current_app.config.get('BM25_INDEX_DIR'),
+                upsert_batch_size=current_app.config.get('QDRANT_UPSERT_BATCH_SIZE', 256),
+                upsert_parallel=current_app.config.get('QDRANT_UPSERT_PARALLEL', 4),
+                upsert_retries=current_app.config.get('QDRANT_UPSERT_RETRIES', 3),
+                chunk_store=RAGService._chunk_store(), # Text goes to the local store, not the Qdrant payload
+                invalidate_versions_func=RAGService._invalidate_versions,
+                collection_error_func=forget_missing_collection, # Deleted elsewhere: recreate it next time
+                delete_collection_func=delete_qdrant_collection,
                 # chunk_size and chunk_overlap can be taken from current_app.config if needed
             )
+            if collection_name:
+                invalidate_collection(collection_name) # Cached retrieval results for this paper are now stale
             return collection_name
         except Exception as e:
             current_app.logger.error(f"Error in RAGService during indexing paper {paper_id}: {e}")
             raise # Or return None and handle in API layer
 
     @staticmethod
+    @traced()
+    def index_abstracts(papers: list[dict]) -> list[str]:
+        """
+        Embeds the abstracts of search results (one batched call) into the shared abstract collection,
+        so the papers can be chatted with before their full text is indexed.
+        papers: dicts with 'paper_id', 'title', 'abstract'. Returns the paper_ids that were indexed.
+        """
+        collection_name = current_app.config.get('ABSTRACT_COLLECTION_NAME', 'paper_abstracts')
+        try:
+            indexed = index_abstracts_external(
+                papers,
+                collection_name=collection_name,
+                qdrant_client_instance=get_qdrant_client(),
+                create_collection_func=create_qdrant_collection,
+                embedding_func=get_embedding_func, # Direct call: this is on the search request path, no linger
+                chunk_store=RAGService._chunk_store(),
+            )
+            if indexed:
+                invalidate_collection(collection_name)
+            return indexed
+        except Exception as e:
+            current_app.logger.error(f"Error in RAGService indexing abstracts for {len(papers)} papers: {e}")
+            forget_missing_collection(collection_name, e)
+            raise
+
+    @staticmethod
+    def abstract_chat_metadata(paper_id: str) -> dict:
+        """Where a paper's abstract entry lives: merge into the selected-paper metadata for abstract-mode chat."""
+        return {
+            "qdrant_collection_name": current_app.config.get('ABSTRACT_COLLECTION_NAME', 'paper_abstracts'),
+            "point_ids": [abstract_point_id(paper_id)],
+            "retrieval_mode": "abstract",
+        }
+
+    @staticmethod
+    def _retrieval_mode(selected_papers_metadata: list[dict]) -> str:
+        modes = {paper.get('retrieval_mode', 'full_text') for paper in selected_papers_metadata}
+        return modes.pop() if len(modes) == 1 else "mixed"
+
+    @staticmethod
+    def _retrieval_cache_lookup(selected_papers_metadata: list[dict], query_vector):
+        """Returns (cache, key, cached_value_or_None) for the retrieval-result cache."""
+        config = current_app.config
+        retrieval_cache = get_cache(
+            'retrieval_results',
+            maxsize=config.get('RETRIEVAL_CACHE_SIZE', 512),
+            ttl=config.get('RETRIEVAL_CACHE_TTL', 600),
+        )
+        # arxiv_id is part of the key because papers can share a collection (the abstract index)
+        collections = sorted(
+            (paper['qdrant_collection_name'], paper['arxiv_id'], get_collection_generation(paper['qdrant_collection_name']))
+            for paper in selected_papers_metadata if paper.get('qdrant_collection_name')
+        )
+        cache_key = (
+            hashlib.sha256(query_vector.tobytes()).hexdigest(),
+            tuple(collections),
+            config.get('RAG_CANDIDATES_PER_PAPER', 8),
+            config.get('RAG_CONTEXT_CHUNK_BUDGET', 6),
+            config.get('RAG_TOP_K', 3),
+            config.get('RAG_MMR_LAMBDA', 0.7),
+        )
+        return retrieval_cache, cache_key, retrieval_cache.get(cache_key)
+
+    @staticmethod
+    def _finalize_context(candidates: dict, query_vector, retrieval_cache, cache_key) -> tuple[str, dict]:
+        config = current_app.config
+        # Pool candidates across papers, drop near-duplicates and fill the global chunk budget with MMR
+        raw_context_dict = select_context(
+            candidates,
+            query_vector=query_vector,
+            chunk_budget=config.get('RAG_CONTEXT_CHUNK_BUDGET', 6),
+            max_per_paper=config.get('RAG_TOP_K', 3),
+            mmr_lambda=config.get('RAG_MMR_LAMBDA', 0.7),
+        )
+        formatted_context = format_llm_context(raw_context_dict)
+        if not any(paper.get("error") for paper in raw_context_dict.values()):
+            retrieval_cache.set(cache_key, (formatted_context, raw_context_dict)) # Don't cache transient failures
+        return formatted_context, raw_context_dict
+
+    @staticmethod
+    @traced()
     def get_relevant_context(selected_papers_metadata: list[dict], query: str) -> tuple[str, dict]:
         """
         Retrieves context from selected papers for a query.
         selected_papers_metadata: List of dicts, each with 'arxiv_id', 'title', 'qdrant_collection_name'.
         Returns a tuple: (formatted_llm_context_string, raw_context_dict_with_sources).
         """
-        qdrant_client = get_qdrant_client()
+        config = current_app.config
         try:
+            query_vector = get_query_embedding(query)
+
+            # Repeated turns (same query vector, same papers, same settings) skip the vector searches entirely
+            retrieval_cache, cache_key, cached = RAGService._retrieval_cache_lookup(selected_papers_metadata, query_vector)
+            if cached is not None:
+                current_app.logger.info("Retrieval result served from cache.")
+                return cached
+
+            qdrant_client = get_qdrant_client()
             # retrieve_context_external now expects paper_meta with 'qdrant_collection_name'
-            raw_context_dict = retrieve_context_external(
+            candidates = retrieve_context_external(
                 selected_papers_metadata=selected_papers_metadata,
                 query=query,
                 qdrant_client_instance=qdrant_client,
                 embedding_func=get_embedding_func,
-                # top_k can be from current_app.config
+                top_k=config.get('RAG_CANDIDATES_PER_PAPER', 8),
+                bm25_dir=config.get('BM25_INDEX_DIR'), # Hybrid lexical + dense retrieval
+                bm25_cache_size=config.get('BM25_CACHE_SIZE', 128),
+                query_vector=query_vector,
+                with_vectors=True, # MMR reuses the stored vectors instead of re-embedding chunks
+                chunk_store=RAGService._chunk_store(), # Texts of all hits in one local lookup
+                collection_error_func=forget_missing_collection,
             )
-            formatted_context = format_llm_context(raw_context_dict)
-            return formatted_context, raw_context_dict # Return both for LLM and for sending sources to frontend
+            return RAGService._finalize_context(candidates, query_vector, retrieval_cache, cache_key) # Return both for LLM and for sending sources to frontend
         except Exception as e:
             current_app.logger.error(f"Error in RAGService retrieving context for query '{query}': {e}")
             raise
 
     @staticmethod
+    @traced()
+    async def aget_relevant_context(selected_papers_metadata: list[dict], query: str) -> tuple[str, dict]:
+        """Async variant of get_relevant_context (AsyncQdrantClient, litellm.aembedding); shares its caches."""
+        config = current_app.config
+        try:
+            query_vector = await aget_query_embedding(query)
+            retrieval_cache, cache_key, cached = RAGService._retrieval_cache_lookup(selected_papers_metadata, query_vector)
+            if cached is not None:
+                current_app.logger.info("Retrieval result served from cache.")
+                return cached
+
+            candidates = await aretrieve_context_external(
+                selected_papers_metadata=selected_papers_metadata,
+                query=query,
+                async_qdrant_client_instance=get_async_qdrant_client(),
+                query_vector=query_vector,
+                top_k=config.get('RAG_CANDIDATES_PER_PAPER', 8),
+                bm25_dir=config.get('BM25_INDEX_DIR'),
+                bm25_cache_size=config.get('BM25_CACHE_SIZE', 128),
+                with_vectors=True,
+                chunk_store=RAGService._chunk_store(),
+                collection_error_func=forget_missing_collection,
+            )
+            return RAGService._finalize_context(candidates, query_vector, retrieval_cache, cache_key)
+        except Exception as e:
+            current_app.logger.error(f"Error in RAGService retrieving context for query '{query}': {e}")
+            raise
+
+    @staticmethod
+    def get_chunk_text(paper_id: str, collection_name: str, chunk_id: str) -> str | None:
+        """Returns the full text of one indexed chunk, or None if the paper has no such chunk."""
+        chunk_store = RAGService._chunk_store()
+        if chunk_store:
+            # Full-text chunks are stored under the unversioned ID (shared by the paper's versions), abstracts under the paper's own
+            texts = chunk_store.get_many([(base_paper_id(paper_id), chunk_id), (paper_id, chunk_id)])
+            if texts:
+                return next(iter(texts.values()))
+
+        # Points indexed before the chunk store existed still carry their text in the payload
+        qdrant_client = get_qdrant_client()
+        try:
+            records = qdrant_client.retrieve(collection_name=collection_name, ids=[chunk_id], with_payload=True)
+        except Exception as e:
+            current_app.logger.error(f"Error in RAGService fetching chunk {chunk_id} from {collection_name}: {e}")
+            raise
+        if not records or not records[0].payload:
+            return None
+        return records[0].payload.get("text")
+
+    @staticmethod
+    @traced()
+    def get_paper_chunks(paper_meta: dict) -> list[dict]:
+        """All indexed chunks of a paper in document order, with their text (for whole-paper operations)."""
+        try:
+            return load_paper_chunks_external(
+                paper_meta=paper_meta,
+                qdrant_client_instance=get_qdrant_client(),
+                chunk_store=RAGService._chunk_store(),
+            )
+        except Exception as e:
+            current_app.logger.error(f"Error in RAGService loading chunks of paper {paper_meta.get('arxiv_id')}: {e}")
+            raise
+
+    @staticmethod
+    @traced()
     def get_chat_response(
             selected_papers_metadata: list[dict], # To fetch context
             query: str,
@@ -83,9 +295,35 @@ class RAGService:
                 # history_window, max_tokens, temperature, top_p can be from current_app.config
             )
             
-            # Add sources (retrieved context chunks) to the response for the frontend
-            response_data["sources"] = raw_context_dict
-            return response_data # dict with 'response', 'token_usage', 'sources'
+            # Add sources to the response for the frontend as compact chunk references;
+            # full chunk text is fetched on demand from /api/rag/papers/<db_id>/chunks/<chunk_id>
+            response_data["sources"] = build_source_refs(raw_context_dict)
+            response_data["retrieval_mode"] = RAGService._retrieval_mode(selected_papers_metadata) # "full_text", "abstract" or "mixed"
+            return response_data # dict with 'response', 'token_usage', 'sources', 'retrieval_mode'
+        except Exception as e:
+            current_app.logger.error(f"Error in RAGService getting chat response for query '{query}': {e}")
+            raise
+
+    @staticmethod
+    @traced()
+    async def aget_chat_response(
+            selected_papers_metadata: list[dict],
+            query: str,
+            chat_history: list = None
+        ) -> dict:
+        """Async variant of get_chat_response for the ASGI serving path."""
+        try:
+            formatted_llm_context, raw_context_dict = await RAGService.aget_relevant_context(selected_papers_metadata, query)
+            response_data = await achat_with_papers_external(
+                llm_context=formatted_llm_context,
+                query=query,
+                config=current_app.config,
+                allm_completion_func=litellm_acompletion_wrapper,
+                chat_history=chat_history,
+            )
+            response_data["sources"] = build_source_refs(raw_context_dict)
+            response_data["retrieval_mode"] = RAGService._retrieval_mode(selected_papers_metadata)
+            return response_data
         except Exception as e:
             current_app.logger.error(f"Error in RAGService getting chat response for query '{query}': {e}")
             raise
\ No newline at end of file
@@ -3,9 +3,27 @@ from flask import current_app
 # Assuming summarizer.llm_summarizer and its adapted functions are accessible
 from summarizer.llm_summarizer import (
     summarize_arxiv_papers as summarize_arxiv_papers_external,
-    synthesize_insights_from_summaries as synthesize_insights_external
+    synthesize_insights_from_summaries as synthesize_insights_external,
+    asummarize_arxiv_papers as asummarize_arxiv_papers_external,
+    asynthesize_insights_from_summaries as asynthesize_insights_external
 )
-from app.services.litellm_service import completion as litellm_completion_wrapper
+from summarizer.full_text_summarizer import summarize_full_text as summarize_full_text_external
+from app.services.litellm_service import completion as litellm_completion_wrapper, acompletion as litellm_acompletion_wrapper
+from app.core.rag_service import RAGService
+from app.extensions import db
+from app.models.paper import PaperMetadata, PaperSummary
+from app.logging_setup import propagate_context
+from sqlalchemy.exc import IntegrityError
+import datetime
+import threading
+
+# One full-text summary run per (paper, model) at a time in this process; concurrent requests wait and reuse its result
+_full_summary_locks = {}
+_full_summary_locks_guard = threading.Lock()
+
+def _full_summary_lock(paper_db_id: int, model: str) -> threading.Lock:
+    with _full_summary_locks_guard:
+        return _full_summary_locks.setdefault((paper_db_id, model), threading.Lock())
 
 class SummarizerService:
     @staticmethod
@@ -46,4 +64,99 @@ class SummarizerService:
             return synthesized_insight # This is a dict with 'content' and token usage
         except Exception as e:
             current_app.logger.error(f"Error generating consolidated summary for query '{query}': {e}")
-            raise
\ No newline at end of file
+            raise
+
+    @staticmethod
+    async def agenerate_individual_summaries(arxiv_results: list[dict]) -> list[dict]:
+        """Async variant of generate_individual_summaries; all abstracts are summarized concurrently."""
+        try:
+            return await asummarize_arxiv_papers_external(
+                arxiv_results=arxiv_results,
+                config=current_app.config,
+                allm_completion_func=litellm_acompletion_wrapper,
+            )
+        except Exception as e:
+            current_app.logger.error(f"Error generating individual summaries: {e}")
+            raise
+
+    @staticmethod
+    async def agenerate_consolidated_summary(paper_summaries: list[dict], query: str) -> dict:
+        """Async variant of generate_consolidated_summary."""
+        try:
+            return await asynthesize_insights_external(
+                paper_summaries=paper_summaries,
+                query=query,
+                config=current_app.config,
+                allm_completion_func=litellm_acompletion_wrapper,
+            )
+        except Exception as e:
+            current_app.logger.error(f"Error generating consolidated summary for query '{query}': {e}")
+            raise
+
+    @staticmethod
+    def full_text_summary_model() -> str:
+        return current_app.config.get('LITELLM_MODEL_FULL_SUMMARY') or current_app.config['LITELLM_MODEL_SUMMARIZE']
+
+    @staticmethod
+    def get_cached_full_text_summary(paper: PaperMetadata) -> PaperSummary | None:
+        """The cached summary for the configured model, if it was made from the paper's current index."""
+        cached = PaperSummary.query.filter_by(paper_metadata_id=paper.id, model=SummarizerService.full_text_summary_model()).first()
+        return cached if cached and cached.is_current(paper) else None
+
+    @staticmethod
+    def generate_full_text_summary(paper: PaperMetadata, refresh: bool = False) -> PaperSummary:
+        """
+        Map-reduce summary of an indexed paper's full text, cached per paper and model.
+        refresh=True regenerates it even when a current cached summary exists.
+        """
+        model = SummarizerService.full_text_summary_model()
+        with _full_summary_lock(paper.id, model):
+            cached = PaperSummary.query.filter_by(paper_metadata_id=paper.id, model=model).first()
+            if cached and cached.is_current(paper) and not refresh:
+                return cached # Possibly written by a request we waited for
+
+            chunks = RAGService.get_paper_chunks({
+                "arxiv_id": paper.arxiv_id,
+                "title": paper.title,
+                "qdrant_collection_name": paper.qdrant_collection_name,
+                "db_id": paper.id,
+            })
+            app = current_app._get_current_object()
+
+            def complete(**kwargs):
+                # Called from the summarizer's worker threads; the wrapper reads its concurrency limit from the config
+                with app.app_context():
+                    return litellm_completion_wrapper(**kwargs)
+
+            try:
+                result = summarize_full_text_external(
+                    chunks=chunks,
+                    paper_title=paper.title,
+                    config=current_app.config,
+                    llm_completion_func=propagate_context(complete), # Keeps request/job IDs and the trace parent
+                    max_workers=current_app.config.get('LLM_MAX_CONCURRENCY') or 8,
+                )
+            except Exception as e:
+                current_app.logger.error(f"Error generating full-text summary for paper {paper.arxiv_id}: {e}")
+                raise
+            current_app.logger.info(
+                f"Full-text summary for {paper.arxiv_id}: {result['chunk_count']} chunks, "
+                f"{result['llm_calls']} LLM calls in {result['rounds']} rounds"
+            )
+
+            summary = cached or PaperSummary(paper_metadata_id=paper.id, model=model)
+            summary.summary = result["summary"]
+            summary.source_indexed_at = paper.indexed_at
+            summary.chunk_count = result["chunk_count"]
+            summary.llm_calls = result["llm_calls"]
+            summary.input_tokens = result["input_tokens"]
+            summary.output_tokens = result["output_tokens"]
+            summary.created_at = datetime.datetime.utcnow()
+            db.session.add(summary)
+            try:
+                db.session.commit()
+            except IntegrityError:
+                # Another process cached one meanwhile; keep theirs
+                db.session.rollback()
+                return PaperSummary.query.filter_by(paper_metadata_id=paper.id, model=model).one()
+            return summary
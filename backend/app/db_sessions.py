@@ -0,0 +1,48 @@
+# app/db_sessions.py
+"""
+Sessions besides the request-scoped db.session.
+
+worker_session(): for background threads (paper processing). Each `with` block is one short
+transaction, committed at the end, and its connection goes back to the pool when the block ends.
+Download, extraction and embedding run between blocks, so they hold no pool connection. Flask-SQLAlchemy
+scopes db.session to the app context, and threads that share a context also share its session; that is
+not safe, so every background thread pushes its own context and uses worker sessions.
+
+read_session(): for read-heavy endpoints (chat sessions and messages, processing status). It opens a
+session on the read replica (DATABASE_REPLICA_URL) when one is configured, and otherwise yields the
+request's db.session. A replica lags the primary, so the newest writes can take a moment to show up.
+"""
+from contextlib import contextmanager
+from sqlalchemy.orm import Session
+from app.extensions import db
+
+REPLICA_BIND_KEY = 'replica'
+
+@contextmanager
+def worker_session():
+    """A new session (same bind routing as db.session) that commits on success and always closes."""
+    session = db.session.session_factory()
+    try:
+        yield session
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+def has_replica() -> bool:
+    return REPLICA_BIND_KEY in db.engines
+
+@contextmanager
+def read_session():
+    """Read-only queries: a replica session if configured, else db.session (left open for the request)."""
+    if not has_replica():
+        yield db.session
+        return
+    session = Session(bind=db.engines[REPLICA_BIND_KEY], autoflush=False)
+    try:
+        yield session
+    finally:
+        session.rollback() # Nothing to write; ends the read transaction
+        session.close()
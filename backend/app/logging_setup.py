@@ -0,0 +1,198 @@
+# app/logging_setup.py
+"""
+Non-blocking, structured application logging.
+
+Loggers only put records on an in-memory queue (QueueHandler); a QueueListener thread formats them
+and does the file and console I/O (including RotatingFileHandler's rollover), so request and
+background threads never wait on it. When the queue is full (disk stalled), records are dropped and counted
+instead of blocking the caller.
+
+Every record carries the request ID (from X-Request-ID, or generated) and the background job ID of
+the code that logged it, and is written as one JSON object per line (LOG_FORMAT=text keeps the
+classic format). DEBUG records are sampled per request/job (LOG_DEBUG_SAMPLE_RATE), so a sampled
+request keeps all of its debug lines and the others keep none.
+"""
+import atexit
+import contextvars
+import functools
+import json
+import logging
+import queue
+import random
+import sys
+import threading
+import uuid
+import zlib
+from contextlib import contextmanager
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+request_id_var = contextvars.ContextVar("request_id", default=None)
+job_id_var = contextvars.ContextVar("job_id", default=None)
+
+# Standard LogRecord attributes; anything else on a record came from `extra=` and is logged as a field
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "request_id", "job_id", "trace_id", "span_id"}
+
+def new_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+@contextmanager
+def log_context(request_id: str | None = None, job_id: str | None = None):
+    """Tags every record logged inside the block (on this thread/task) with the given IDs."""
+    tokens = []
+    if request_id is not None:
+        tokens.append((request_id_var, request_id_var.set(request_id)))
+    if job_id is not None:
+        tokens.append((job_id_var, job_id_var.set(job_id)))
+    try:
+        yield
+    finally:
+        for var, token in reversed(tokens):
+            var.reset(token)
+
+def with_job_id(prefix: str):
+    """Decorator: each call runs as a new job, "<prefix>-<id>"."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with log_context(job_id=f"{prefix}-{new_id()}"):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def propagate_context(func):
+    """
+    Wraps func to run in a copy of the caller's context vars (request/job IDs), for threads and
+    executors, which would otherwise start with an empty context.
+    """
+    context = contextvars.copy_context()
+    @functools.wraps(func) # Threads started with it keep the target's name ("Thread-3 (process_paper_background)")
+    def run(*args, **kwargs):
+        return context.copy().run(func, *args, **kwargs)
+    return run
+
+class ContextFilter(logging.Filter):
+    """Copies the IDs onto the record; runs in the logging thread, before the record is queued."""
+    def filter(self, record):
+        from app.tracing import current_trace_ids # app.tracing imports this module
+        record.request_id = request_id_var.get()
+        record.job_id = job_id_var.get()
+        record.trace_id, record.span_id = current_trace_ids()
+        return True
+
+class DebugSampler(logging.Filter):
+    """Keeps a fraction of DEBUG records, decided per request/job ID (per record when there is none)."""
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG or self.rate >= 1:
+            return True
+        key = getattr(record, "request_id", None) or getattr(record, "job_id", None)
+        if key is None:
+            return random.random() < self.rate
+        return zlib.crc32(key.encode("utf-8")) % 10000 < self.rate * 10000
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "request_id": getattr(record, "request_id", None),
+            "job_id": getattr(record, "job_id", None),
+            "trace_id": getattr(record, "trace_id", None),
+            "span_id": getattr(record, "span_id", None),
+            "thread": record.threadName,
+            "location": f"{record.pathname}:{record.lineno}",
+        }
+        entry.update({key: value for key, value in vars(record).items() if key not in _RECORD_ATTRS})
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+class DroppingQueueHandler(QueueHandler):
+    """Never blocks: a record that doesn't fit the queue is dropped and counted."""
+    dropped = 0
+
+    def prepare(self, record):
+        # Keep exc_info for the formatter on the listener thread instead of pre-rendering the message
+        record.message = record.getMessage()
+        record.msg, record.args = record.message, None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            DroppingQueueHandler.dropped += 1
+
+# One listener per log file for the whole process (create_app may run more than once, e.g. in tests)
+_listeners = {}
+_listeners_lock = threading.Lock()
+
+def _stop_listeners():
+    with _listeners_lock:
+        for listener in _listeners.values():
+            listener.stop() # Flushes what is still queued
+        _listeners.clear()
+
+atexit.register(_stop_listeners)
+
+def _listener_queue(config, log_file: str) -> queue.Queue:
+    with _listeners_lock:
+        listener = _listeners.get(log_file)
+        if listener is None:
+            # Max 10MB per file, keep last 5 backup files
+            file_handler = RotatingFileHandler(log_file, maxBytes=1024 * 1024 * 10, backupCount=5, encoding='utf-8')
+            if config.get('LOG_FORMAT', 'json') == 'json':
+                file_handler.setFormatter(JsonFormatter())
+            else:
+                # Example format: 2023-10-27 10:30:00,123 INFO in module:message (lineno)
+                file_handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]'))
+            # Replaces Flask's default stderr handler, in its format
+            console_handler = logging.StreamHandler(sys.stderr)
+            console_handler.setFormatter(logging.Formatter('[%(asctime)s] %(levelname)s in %(module)s: %(message)s'))
+            listener = QueueListener(queue.Queue(maxsize=config.get('LOG_QUEUE_SIZE', 10000)), file_handler, console_handler, respect_handler_level=True)
+            listener.start()
+            _listeners[log_file] = listener
+        return listener.queue
+
+def configure_logging(app, log_file: str) -> None:
+    """Routes app.logger through the queue to the rotating JSON log file and the console."""
+    level = logging.getLevelName(app.config.get('LOG_LEVEL', 'INFO').upper())
+    for handler in [h for h in app.logger.handlers if isinstance(h, DroppingQueueHandler)]:
+        app.logger.removeHandler(handler) # app.logger is shared by every app created in this process
+    queue_handler = DroppingQueueHandler(_listener_queue(app.config, log_file))
+    queue_handler.setLevel(level)
+    queue_handler.addFilter(ContextFilter())
+    queue_handler.addFilter(DebugSampler(app.config.get('LOG_DEBUG_SAMPLE_RATE', 0.1)))
+    app.logger.addHandler(queue_handler)
+    app.logger.setLevel(level)
+
+def register_request_ids(app) -> None:
+    """Binds a request ID to everything logged while handling a request, and returns it as X-Request-ID."""
+    from flask import g, request
+
+    @app.before_request
+    def _bind_request_id():
+        # A proxy's ID (if it sent one) lets log lines be matched with its access log
+        g.request_id = (request.headers.get('X-Request-ID') or '')[:64] or new_id()
+        g.request_id_token = request_id_var.set(g.request_id)
+
+    @app.after_request
+    def _return_request_id(response):
+        if 'request_id' in g:
+            response.headers['X-Request-ID'] = g.request_id
+        return response
+
+    @app.teardown_request
+    def _unbind_request_id(exc):
+        # Worker threads are reused; don't leak the ID into the next request
+        token = g.pop('request_id_token', None)
+        if token is not None:
+            try:
+                request_id_var.reset(token)
+            except ValueError: # Torn down in another context (e.g. after a streamed response)
+                request_id_var.set(None)
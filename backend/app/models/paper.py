@@ -1,6 +1,7 @@
 # app/models/paper.py
 from app.extensions import db
 import datetime
+import enum
 
 # Association table for many-to-many relationship between ChatSession and PaperMetadata
 chat_session_papers = db.Table('chat_session_papers',
@@ -8,8 +9,19 @@ chat_session_papers = db.Table('chat_session_papers',
     db.Column('paper_metadata_id', db.Integer, db.ForeignKey('paper_metadata.id'), primary_key=True)
 )
 
+class ProcessingState(str, enum.Enum):
+    """Where a paper is in background processing (download -> extract -> clean -> index)."""
+    PENDING = "pending"          # Not processed yet
+    IN_PROGRESS = "in_progress"  # A worker has claimed it (ProcessingService.claim); next_retry_at is when that claim expires (worker died)
+    INDEXED = "indexed"
+    FAILED = "failed"            # Retried at next_retry_at; next_retry_at is null once the attempts are used up
+
 class PaperMetadata(db.Model):
     __tablename__ = 'paper_metadata'
+    __table_args__ = (
+        # The scheduler's "what is due" query: state = ... AND next_retry_at <= now
+        db.Index('ix_paper_metadata_processing_state_next_retry_at', 'processing_state', 'next_retry_at'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     arxiv_id = db.Column(db.String(50), unique=True, nullable=False, index=True) # ArXiv ID like "2303.08774"
@@ -27,7 +39,17 @@ class PaperMetadata(db.Model):
     text_extracted_at = db.Column(db.DateTime, nullable=True)
     cleaned_text_at = db.Column(db.DateTime, nullable=True)
     indexed_at = db.Column(db.DateTime, nullable=True)
-    qdrant_collection_name = db.Column(db.String(200), nullable=True, unique=True) # e.g., paper_arxivID_v_version
+    abstract_indexed_at = db.Column(db.DateTime, nullable=True) # Abstract embedded in the shared abstract collection (preliminary chat)
+    qdrant_collection_name = db.Column(db.String(200), nullable=True, index=True) # e.g. paper_2303_08774, shared by all versions of the paper
+
+    # Processing state machine (see ProcessingService for the retry policy)
+    processing_state = db.Column(
+        db.Enum(ProcessingState, native_enum=False, length=20, values_callable=lambda states: [s.value for s in states]),
+        nullable=False, default=ProcessingState.PENDING, server_default=ProcessingState.PENDING.value,
+    )
+    processing_attempts = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    last_error = db.Column(db.String(500), nullable=True) # "<stage>: <error>" of the latest failed attempt
+    next_retry_at = db.Column(db.DateTime, nullable=True)
 
     # User who initiated the processing (optional, if needed)
     # processed_by_user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
@@ -36,5 +58,113 @@ class PaperMetadata(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
 
+    @property
+    def chat_mode(self) -> str | None:
+        """How chat would retrieve from this paper right now: "full_text", "abstract", or None (not chattable yet)."""
+        if self.indexed_at and self.qdrant_collection_name:
+            return "full_text"
+        if self.abstract_indexed_at:
+            return "abstract"
+        return None
+
+    @property
+    def processing_failed(self) -> bool:
+        return self.processing_state == ProcessingState.FAILED
+
+    def mark_processing_failed(self, stage: str, error, retry_at: datetime.datetime | None) -> None:
+        self.processing_state = ProcessingState.FAILED
+        self.last_error = f"{stage}: {error}"[:500]
+        self.next_retry_at = retry_at
+
+    def mark_indexed(self, collection_name: str, now: datetime.datetime) -> None:
+        self.qdrant_collection_name = collection_name
+        self.indexed_at = now
+        self.processing_state = ProcessingState.INDEXED
+        self.last_error = None
+        self.next_retry_at = None
+
+    def to_status_dict(self) -> dict:
+        """Processing status as returned by the status endpoints."""
+        return {
+            "paper_id": self.arxiv_id,
+            "db_id": self.id,
+            "title": self.title,
+            "downloaded_at": self.downloaded_at.isoformat() if self.downloaded_at else None,
+            "text_extracted_at": self.text_extracted_at.isoformat() if self.text_extracted_at else None,
+            "cleaned_text_at": self.cleaned_text_at.isoformat() if self.cleaned_text_at else None,
+            "indexed_at": self.indexed_at.isoformat() if self.indexed_at else None,
+            "qdrant_collection_name": self.qdrant_collection_name,
+            "is_ready_for_chat": bool(self.indexed_at),
+            "abstract_indexed_at": self.abstract_indexed_at.isoformat() if self.abstract_indexed_at else None,
+            "chat_mode": self.chat_mode, # "full_text", "abstract" (preliminary) or null
+            "processing_state": self.processing_state.value if self.processing_state else ProcessingState.PENDING.value,
+            "processing_failed": self.processing_failed,
+            "processing_attempts": self.processing_attempts or 0,
+            "last_error": self.last_error,
+            "next_retry_at": self.next_retry_at.isoformat() if self.next_retry_at else None,
+            "processing_status_notes": self.source
+        }
+
+    def apply_arxiv_result(self, res: dict) -> None:
+        """Copies the fields of a retriever.arxiv_client result dict onto this row."""
+        self.title = res['title']
+        self.authors = res['authors'] # Assuming this is JSON compatible (list of strings)
+        self.abstract = res.get('abstract')
+        self.published_date = res['published'] # Ensure this is a date object or parsable string
+        self.pdf_url = res['pdf_url']
+        self.entry_id = res['entry_id']
+
+    @classmethod
+    def upsert_from_arxiv(cls, res: dict) -> 'PaperMetadata':
+        """Returns the row for an arXiv result, created or updated from it, and flushed so it has an id."""
+        paper = cls.query.filter_by(arxiv_id=res['paper_id']).first()
+        if not paper:
+            paper = cls(arxiv_id=res['paper_id'], source=res.get('source', 'arXiv'))
+            db.session.add(paper)
+        else: # Update if exists, e.g. abstract or pdf_url might change (though unlikely for arxiv_id)
+            paper.updated_at = datetime.datetime.now(datetime.timezone.utc)
+        paper.apply_arxiv_result(res)
+        db.session.flush() # Assigns ID to 'paper' if new, before commit
+        return paper
+
+    def __repr__(self):
+        return f'<PaperMetadata {self.arxiv_id} - {self.title[:50]}>'
+
+class PaperSummary(db.Model):
+    """Cached map-reduce summary of a paper's full text, one per paper and model."""
+    __tablename__ = 'paper_summaries'
+    __table_args__ = (
+        db.UniqueConstraint('paper_metadata_id', 'model', name='uq_paper_summaries_paper_metadata_id_model'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    paper_metadata_id = db.Column(db.Integer, db.ForeignKey('paper_metadata.id'), nullable=False)
+    model = db.Column(db.String(200), nullable=False)
+    summary = db.Column(db.Text, nullable=False)
+    source_indexed_at = db.Column(db.DateTime, nullable=True) # The paper's indexed_at when summarized; re-indexing makes the cache stale
+    chunk_count = db.Column(db.Integer)
+    llm_calls = db.Column(db.Integer)
+    input_tokens = db.Column(db.Integer)
+    output_tokens = db.Column(db.Integer)
+    created_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+
+    paper = db.relationship('PaperMetadata', backref=db.backref('summaries', lazy='dynamic', cascade="all, delete-orphan"))
+
+    def is_current(self, paper: PaperMetadata) -> bool:
+        return self.source_indexed_at == paper.indexed_at
+
+    def to_dict(self) -> dict:
+        return {
+            "paper_id": self.paper.arxiv_id,
+            "db_id": self.paper_metadata_id,
+            "model": self.model,
+            "summary": self.summary,
+            "chunk_count": self.chunk_count,
+            "llm_calls": self.llm_calls,
+            "input_tokens": self.input_tokens,
+            "output_tokens": self.output_tokens,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+        }
+
     def __repr__(self):
-        return f'<PaperMetadata {self.arxiv_id} - {self.title[:50]}>'
\ No newline at end of file
+        return f'<PaperSummary {self.paper_metadata_id} ({self.model})>'
@@ -0,0 +1,198 @@
+# app/profiling.py
+"""
+On-demand sampling profiler for live requests.
+
+A profiled request gets a sampler thread that reads the request thread's stack
+(sys._current_frames) every PROFILE_INTERVAL_MS and counts identical stacks. When the request ends
+(after the response body has been produced, so JSON serialization and streaming are included), the
+sampler writes the counts as folded stacks ("frame;frame;frame count" lines). That is the input
+format of flamegraph.pl, speedscope and inferno. Files are named after the endpoint; concatenating
+an endpoint's files merges them into one flame graph. The directory keeps the newest
+PROFILE_MAX_FILES profiles.
+
+A request is profiled when:
+  - an admin sends it with an `X-Profile: 1` header (one-off profiling of a specific request), or
+  - an admin has switched on sampling (PUT /api/admin/profiling) and the request falls in the
+    sampled fraction. The switch is stored in PROFILE_DIR, so it applies to every worker process.
+
+When nothing is switched on, the per-request cost is a header lookup and a cached float compare.
+Only the request's own thread is sampled; coroutine routes served by the ASGI app share the event
+loop thread and are not profiled.
+"""
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from functools import lru_cache
+
+_SWITCH_FILE = "switch.json"
+_SWITCH_RECHECK_SECONDS = 1.0
+
+@lru_cache(maxsize=4096)
+def _frame_label(filename: str, name: str) -> str:
+    # Keep the part of the path that identifies the module (site-packages/... or the app's own tree)
+    parts = filename.replace("\\", "/").split("/")
+    for marker in ("site-packages", "dist-packages", "backend"):
+        if marker in parts:
+            parts = parts[parts.index(marker) + 1:]
+            break
+    else:
+        parts = parts[-2:]
+    return f"{'/'.join(parts)}:{name}".replace(";", ":").replace(" ", "_")
+
+def fold_stack(frame) -> str:
+    """Root-first, semicolon-separated frame labels (the folded-stacks format)."""
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame.f_code.co_filename, frame.f_code.co_name))
+        frame = frame.f_back
+    return ";".join(reversed(labels))
+
+def _endpoint_slug(endpoint: str) -> str:
+    return re.sub(r"[^A-Za-z0-9]+", "_", endpoint).strip("_")[:80] or "root"
+
+def prune_profiles(profile_dir: str, max_files: int) -> None:
+    """Deletes the oldest profiles beyond max_files."""
+    files = sorted(
+        (entry for entry in os.scandir(profile_dir) if entry.name.endswith(".folded")),
+        key=lambda entry: entry.stat().st_mtime,
+    )
+    for entry in files[:max(0, len(files) - max_files)]:
+        try:
+            os.remove(entry.path)
+        except OSError:
+            pass # Already pruned by another worker
+
+def write_profile(profile_dir: str, endpoint: str, request_id: str, counts: Counter, max_files: int) -> str | None:
+    if not counts:
+        return None
+    os.makedirs(profile_dir, exist_ok=True)
+    path = os.path.join(profile_dir, f"{time.strftime('%Y%m%dT%H%M%S')}_{_endpoint_slug(endpoint)}_{request_id}.folded")
+    with open(path, "w", encoding="utf-8") as f:
+        f.writelines(f"{stack} {count}\n" for stack, count in counts.most_common())
+    prune_profiles(profile_dir, max_files)
+    return path
+
+class StackSampler(threading.Thread):
+    """Samples one thread's stack until stopped, then writes the folded profile (on this thread, not the request's)."""
+    def __init__(self, target_thread_id: int, interval: float, on_done):
+        super().__init__(name="profile-sampler", daemon=True)
+        self.target_thread_id = target_thread_id
+        self.interval = interval
+        self.on_done = on_done # Called with the Counter of folded stacks
+        self.counts = Counter()
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.target_thread_id)
+            if frame is None: # Thread is gone
+                break
+            self.counts[fold_stack(frame)] += 1
+            del frame
+        try:
+            self.on_done(self.counts)
+        except Exception as e: # Profiling must never break the app
+            print(f"Warning: Failed to write profile: {e}")
+
+    def stop(self):
+        self._stopped.set()
+
+class ProfilingSwitch:
+    """The sampling switch, shared by worker processes through a small JSON file and re-read at most once a second."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._cache = {} # profile_dir -> (checked_at, sample_rate)
+
+    @staticmethod
+    def _path(profile_dir: str) -> str:
+        return os.path.join(profile_dir, _SWITCH_FILE)
+
+    def state(self, profile_dir: str) -> dict:
+        try:
+            with open(self._path(profile_dir), "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return {"sample_rate": 0.0, "until": None}
+        if not state.get("until") or state["until"] <= time.time():
+            return {"sample_rate": 0.0, "until": None} # Expired
+        return state
+
+    def sample_rate(self, profile_dir: str) -> float:
+        now = time.monotonic()
+        checked_at, rate = self._cache.get(profile_dir, (None, 0.0))
+        if checked_at is not None and now - checked_at < _SWITCH_RECHECK_SECONDS:
+            return rate
+        with self._lock:
+            rate = self.state(profile_dir)["sample_rate"]
+            self._cache[profile_dir] = (now, rate)
+        return rate
+
+    def set(self, profile_dir: str, sample_rate: float, duration_seconds: int) -> dict:
+        os.makedirs(profile_dir, exist_ok=True)
+        state = {"sample_rate": sample_rate, "until": time.time() + duration_seconds if sample_rate > 0 else None}
+        tmp_path = self._path(profile_dir) + f".tmp{os.getpid()}"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self._path(profile_dir))
+        self._cache.pop(profile_dir, None) # This worker sees the change at once; the others within a second
+        return self.state(profile_dir)
+
+profiling_switch = ProfilingSwitch()
+
+def is_admin(user_id) -> bool:
+    from flask import current_app
+    try:
+        return int(user_id) in current_app.config.get('ADMIN_USER_IDS', [])
+    except (TypeError, ValueError):
+        return False
+
+def _admin_marked_request() -> bool:
+    """True when the request has an X-Profile header and a valid admin access token."""
+    from flask import request
+    from flask_jwt_extended import verify_jwt_in_request, get_jwt_identity
+    if not request.headers.get('X-Profile'):
+        return False
+    try:
+        verify_jwt_in_request(optional=True)
+    except Exception: # Bad or expired token: the view's own JWT check reports it
+        return False
+    return is_admin(get_jwt_identity())
+
+def register_profiling(app) -> None:
+    from flask import g, request
+
+    profile_dir = app.config['PROFILE_DIR']
+    slots = threading.BoundedSemaphore(app.config.get('PROFILE_MAX_CONCURRENT', 4)) # Bounds the sampler threads
+
+    @app.before_request
+    def _start_profile():
+        rate = profiling_switch.sample_rate(profile_dir)
+        if not (request.headers.get('X-Profile') and _admin_marked_request()) and not (rate > 0 and random.random() < rate):
+            return
+        if not slots.acquire(blocking=False):
+            return # Enough requests are being profiled already
+        endpoint = f"{request.method} {request.url_rule.rule if request.url_rule else request.path}"
+        request_id = g.get('request_id') or "unknown"
+        max_files = app.config.get('PROFILE_MAX_FILES', 200)
+
+        def done(counts):
+            try:
+                path = write_profile(profile_dir, endpoint, request_id, counts, max_files)
+                if path:
+                    app.logger.info(f"Profile of {endpoint} written to {path} ({sum(counts.values())} samples)")
+            finally:
+                slots.release()
+
+        g.profiler = StackSampler(threading.get_ident(), app.config.get('PROFILE_INTERVAL_MS', 5) / 1000, done)
+        g.profiler.start()
+
+    @app.teardown_request
+    def _stop_profile(exc):
+        profiler = g.pop('profiler', None)
+        if profiler is not None:
+            profiler.stop()
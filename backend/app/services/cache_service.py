@@ -0,0 +1,77 @@
+# app/services/cache_service.py
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+class TTLCache:
+    """
+    Small thread-safe LRU cache whose entries also expire after `ttl` seconds.
+    Process-local: each worker process keeps its own copy.
+    """
+    _MISSING = object()
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict() # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key, self._MISSING)
+            if entry is self._MISSING or entry[0] < now:
+                if entry is not self._MISSING:
+                    del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+def get_cache(name: str, maxsize: int, ttl: float) -> TTLCache:
+    """Returns the named process-wide cache, creating it on first use."""
+    with _caches_lock:
+        cache = _caches.get(name)
+        if cache is None:
+            cache = _caches[name] = TTLCache(maxsize=maxsize, ttl=ttl)
+        return cache
+
+def text_digest(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+# --- Collection generations ---
+# Cached retrieval results embed the generation of every collection they read from.
+# Re-indexing a collection bumps its generation, so stale entries are simply never hit again.
+_collection_generations = {}
+_generations_lock = threading.Lock()
+
+def get_collection_generation(collection_name: str) -> int:
+    with _generations_lock:
+        return _collection_generations.get(collection_name, 0)
+
+def invalidate_collection(collection_name: str) -> None:
+    with _generations_lock:
+        _collection_generations[collection_name] = _collection_generations.get(collection_name, 0) + 1
\ No newline at end of file
@@ -0,0 +1,158 @@
+# app/services/embedding_batcher.py
+"""
+Cross-job embedding aggregator for ingestion.
+
+Every indexing job (background processing after a search, `flask ingest`) used to send its own
+embedding request, so short papers produced small requests and concurrent jobs competed for the
+provider's rate limit one request at a time. Jobs now hand their texts to a single per-process
+aggregator. A background thread packs texts from all jobs into full batches of up to
+EMBEDDING_BATCH_SIZE. It waits at most EMBEDDING_BATCH_LINGER_MS for a batch to fill, sends
+it, and routes each vector back to the job that asked for it.
+
+A job waits at most EMBEDDING_BATCH_TIMEOUT for its vectors. If the aggregator thread has died (or
+the process was forked after it started), jobs embed their texts directly instead of waiting.
+"""
+import collections
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from flask import current_app
+
+class _Request:
+    """One caller's texts; completed when every text has its vector (or the first error)."""
+    def __init__(self, size: int):
+        self.vectors = [None] * size
+        self.remaining = size
+        self.error = None
+        self.done = threading.Event()
+        self._lock = threading.Lock() # A long request can be split over batches sent concurrently
+
+    def fill(self, index: int, vector):
+        with self._lock:
+            self.vectors[index] = vector
+            self.remaining -= 1
+            if self.remaining == 0:
+                self.done.set()
+
+class EmbeddingAggregator:
+    POLL_SECONDS = 1.0 # How often a waiting job checks that the aggregator thread is still alive
+
+    def __init__(self, app, embed_func, batch_size: int = 100, linger_ms: float = 50, max_concurrent_batches: int = 2,
+                 timeout: float = 300):
+        self.app = app
+        self.embed_func = embed_func # list[str] -> np.ndarray, called under an app context
+        self.batch_size = batch_size
+        self.linger = linger_ms / 1000.0
+        self.timeout = timeout
+        self._pid = os.getpid()
+        self._pending = collections.deque() # (request, index, text)
+        self._cond = threading.Condition()
+        self._senders = ThreadPoolExecutor(max_workers=max_concurrent_batches, thread_name_prefix="embed-batch")
+        self._slots = threading.Semaphore(max_concurrent_batches) # Don't pack the next batch before a sender is free
+        self._thread = threading.Thread(target=self._run, name="embedding-aggregator", daemon=True)
+        self._thread.start()
+        self.texts_embedded = 0
+        self.provider_calls = 0
+
+    def is_alive(self) -> bool:
+        """False once the aggregator thread has died, or in a process forked after it started."""
+        return os.getpid() == self._pid and self._thread.is_alive()
+
+    def embed(self, texts: list[str]):
+        """
+        Blocking drop-in for embedding_service.get_embedding: returns an (n, dim) array in input order.
+        Embeds directly when the aggregator thread is gone; raises TimeoutError after `timeout` seconds.
+        """
+        if not texts:
+            return []
+        if not self.is_alive():
+            return self._embed_directly(texts)
+        request = _Request(len(texts))
+        with self._cond:
+            self._pending.extend((request, i, text) for i, text in enumerate(texts))
+            self._cond.notify()
+        deadline = time.monotonic() + self.timeout
+        while not request.done.wait(self.POLL_SECONDS):
+            if not self.is_alive():
+                self._withdraw(request)
+                self.app.logger.warning("Embedding aggregator thread is not running; embedding directly.")
+                return self._embed_directly(texts)
+            if time.monotonic() >= deadline:
+                self._withdraw(request)
+                raise TimeoutError(f"No embeddings from the aggregator for {len(texts)} texts within {self.timeout:g}s")
+        if request.error is not None:
+            raise request.error
+        return np.array(request.vectors)
+
+    def _embed_directly(self, texts: list[str]):
+        with self.app.app_context():
+            return self.embed_func(texts)
+
+    def _withdraw(self, request: _Request) -> None:
+        """Drops the request's texts that are still queued, so an abandoned request isn't sent."""
+        with self._cond:
+            self._pending = collections.deque(item for item in self._pending if item[0] is not request)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                # Linger so other jobs can top the batch up, unless it is already full
+                deadline = time.monotonic() + self.linger
+                while len(self._pending) < self.batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch = [self._pending.popleft() for _ in range(min(self.batch_size, len(self._pending)))]
+            self._slots.acquire()
+            self._senders.submit(self._send, batch)
+
+    def _send(self, batch):
+        try:
+            with self.app.app_context():
+                vectors = self.embed_func([text for _, _, text in batch])
+            if len(vectors) != len(batch):
+                raise RuntimeError(f"Embedding provider returned {len(vectors)} vectors for {len(batch)} texts")
+            with self._cond:
+                self.provider_calls += 1
+                self.texts_embedded += len(batch)
+            for (request, index, _), vector in zip(batch, vectors):
+                request.fill(index, vector)
+        except Exception as e:
+            for request, _, _ in batch:
+                if request.error is None:
+                    request.error = e
+                request.done.set()
+        finally:
+            self._slots.release()
+
+_aggregator_lock = threading.Lock()
+
+def get_embedding_aggregator() -> EmbeddingAggregator:
+    """The app's aggregator (kept in app.extensions), started on first use and restarted if its thread is gone."""
+    from app.services.embedding_service import get_embedding
+    app = current_app._get_current_object()
+    with _aggregator_lock:
+        aggregator = app.extensions.get('embedding_aggregator')
+        if aggregator is None or not aggregator.is_alive():
+            aggregator = app.extensions['embedding_aggregator'] = EmbeddingAggregator(
+                app,
+                get_embedding,
+                batch_size=app.config.get('EMBEDDING_BATCH_SIZE', 100),
+                linger_ms=app.config.get('EMBEDDING_BATCH_LINGER_MS', 50),
+                max_concurrent_batches=app.config.get('EMBEDDING_BATCH_CONCURRENCY', 2),
+                timeout=app.config.get('EMBEDDING_BATCH_TIMEOUT', 300),
+            )
+        return aggregator
+
+def get_batched_embedding(texts: list[str]):
+    """Embedding function for indexing jobs: goes through the shared aggregator when it is enabled."""
+    if not current_app.config.get('EMBEDDING_AGGREGATOR_ENABLED', True):
+        from app.services.embedding_service import get_embedding
+        return get_embedding(texts)
+    return get_embedding_aggregator().embed(texts)
@@ -1,7 +1,9 @@
 # app/services/embedding_service.py
 from flask import current_app
 # Option 1: Using LiteLLM for embeddings
-from app.services.litellm_service import embedding as litellm_embedding
+from app.services.litellm_service import embedding as litellm_embedding, aembedding as litellm_aembedding
+from app.services.cache_service import get_cache, text_digest
+from app.tracing import traced
 
 # Option 2: Using a library like sentence-transformers (example)
 # from sentence_transformers import SentenceTransformer
@@ -16,6 +18,10 @@ from app.services.litellm_service import embedding as litellm_embedding
 #         current_app.logger.info("SentenceTransformer model loaded.")
 #     return SBERT_MODEL
 
+def get_embedding_model_name() -> str:
+    """Returns the LiteLLM embedding model configured for this app."""
+    return current_app.config.get('EMBEDDING_MODEL_NAME_LITELLM', 'gemini/text-embedding-004') # Example, configure as needed
+
 def get_embedding(texts: list[str], model_type: str = "litellm"): # or "sbert"
     """
     Generates embeddings for a list of texts.
@@ -25,7 +31,7 @@ def get_embedding(texts: list[str], model_type: str = "litellm"): # or "sbert"
         return []
 
     if model_type == "litellm":
-        model_name = current_app.config.get('EMBEDDING_MODEL_NAME_LITELLM', 'gemini/text-embedding-004') # Example, configure as needed
+        model_name = get_embedding_model_name()
         try:
             current_app.logger.info(f"Generating embeddings for {len(texts)} texts using LiteLLM model: {model_name}")
             response = litellm_embedding(model=model_name, input=texts)
@@ -47,6 +53,47 @@ def get_embedding(texts: list[str], model_type: str = "litellm"): # or "sbert"
     else:
         raise ValueError(f"Unsupported embedding model type: {model_type}")
 
+def _query_embedding_cache():
+    return get_cache(
+        'query_embeddings',
+        maxsize=current_app.config.get('QUERY_EMBEDDING_CACHE_SIZE', 1024),
+        ttl=current_app.config.get('QUERY_EMBEDDING_CACHE_TTL', 3600),
+    )
+
+@traced("embedding.query")
+def get_query_embedding(query: str):
+    """
+    Embeds a single chat query, reusing a cached vector when the same text was embedded recently
+    with the same model. Returns a 1-D NumPy array.
+    """
+    cache = _query_embedding_cache()
+    key = (get_embedding_model_name(), text_digest(query))
+    vector = cache.get(key)
+    if vector is None:
+        vector = get_embedding([query])[0]
+        vector.setflags(write=False) # Shared between requests, so make accidental in-place edits fail loudly
+        cache.set(key, vector)
+    else:
+        current_app.logger.info("Query embedding served from cache.")
+    return vector
+
+@traced("embedding.query")
+async def aget_query_embedding(query: str):
+    """Async variant of get_query_embedding (shares the same cache)."""
+    cache = _query_embedding_cache()
+    model_name = get_embedding_model_name()
+    key = (model_name, text_digest(query))
+    vector = cache.get(key)
+    if vector is None:
+        import numpy as np
+        response = await litellm_aembedding(model=model_name, input=[query])
+        vector = np.array(response.data[0]['embedding'])
+        vector.setflags(write=False)
+        cache.set(key, vector)
+    else:
+        current_app.logger.info("Query embedding served from cache.")
+    return vector
+
 # Your rag/embedding.py should be adapted to use this service function.
 # For example, in rag/chunk_and_index.py, replace direct embedding calls:
 # from app.services.embedding_service import get_embedding
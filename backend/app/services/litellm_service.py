@@ -1,7 +1,13 @@
 # app/services/litellm_service.py
-import litellm
-from flask import current_app
+# litellm is imported inside the wrappers: it takes seconds to import and most processes
+# (flask db ..., other CLI commands) never call an LLM. app.warmup preloads it for web workers.
+from flask import current_app, has_app_context
+import asyncio
 import os
+import threading
+import time
+import weakref
+from app.tracing import span
 
 def configure_litellm():
     """
@@ -27,6 +33,39 @@ def configure_litellm():
     # You can also set a global model alias or routing strategy here if complex
     current_app.logger.info("LiteLLM configured (primarily relies on environment variables for API keys).")
 
+# Process-wide cap on in-flight LLM calls (LLM_MAX_CONCURRENCY), so fan-out callers (search summaries,
+# map-reduce full-text summaries) stay under the provider's rate limits. Sync calls share one semaphore;
+# async calls share one per event loop, since asyncio primitives are bound to their loop.
+_llm_slots = None
+_llm_slots_lock = threading.Lock()
+_async_llm_slots = weakref.WeakKeyDictionary() # event loop -> asyncio.Semaphore
+
+def _llm_concurrency() -> int:
+    """Configured limit; 0 disables it. Calls made outside an app context use the default."""
+    return int(current_app.config.get('LLM_MAX_CONCURRENCY', 8)) if has_app_context() else 8
+
+def _llm_limiter():
+    global _llm_slots
+    with _llm_slots_lock:
+        if _llm_slots is None:
+            _llm_slots = threading.BoundedSemaphore(_llm_concurrency()) if _llm_concurrency() > 0 else False
+        return _llm_slots
+
+def _async_llm_limiter():
+    loop = asyncio.get_running_loop()
+    if loop not in _async_llm_slots:
+        _async_llm_slots[loop] = asyncio.Semaphore(_llm_concurrency()) if _llm_concurrency() > 0 else False
+    return _async_llm_slots[loop]
+
+def _record_usage(current_span, response) -> None:
+    """Token counts of a completion/embedding response on its span."""
+    usage = getattr(response, "usage", None) or (response.get("usage") if isinstance(response, dict) else None)
+    if usage is None:
+        return
+    get = usage.get if isinstance(usage, dict) else lambda key: getattr(usage, key, None)
+    current_span.set_attribute("llm.input_tokens", get("prompt_tokens"))
+    current_span.set_attribute("llm.output_tokens", get("completion_tokens"))
+
 def completion(*args, **kwargs):
     """
     A wrapper around litellm.completion to potentially add more centralized logging,
@@ -37,8 +76,18 @@ def completion(*args, **kwargs):
 
     # Example: Add custom logging
     # current_app.logger.debug(f"LiteLLM completion called with model: {kwargs.get('model')}")
+    import litellm
+    limiter = _llm_limiter()
     try:
-        response = litellm.completion(*args, **kwargs)
+        with span("llm.completion", "client", model=kwargs.get('model')) as current:
+            if limiter:
+                queued_at = time.perf_counter()
+                with limiter: # Waits for a free slot
+                    current.set_attribute("llm.queue_wait_ms", round((time.perf_counter() - queued_at) * 1000, 1))
+                    response = litellm.completion(*args, **kwargs)
+            else:
+                response = litellm.completion(*args, **kwargs)
+            _record_usage(current, response)
         # current_app.logger.debug(f"LiteLLM response: {response}")
         return response
     except Exception as e:
@@ -57,9 +106,39 @@ def embedding(*args, **kwargs):
     """
     A wrapper around litellm.embedding.
     """
+    import litellm
     try:
-        response = litellm.embedding(*args, **kwargs)
+        with span("llm.embedding", "client", model=kwargs.get('model'), inputs=len(kwargs.get('input') or [])) as current:
+            response = litellm.embedding(*args, **kwargs)
+            _record_usage(current, response)
         return response
     except Exception as e:
         # current_app.logger.error(f"LiteLLM embedding error: {e}")
-        raise
\ No newline at end of file
+        raise
+
+async def acompletion(*args, **kwargs):
+    """
+    Async wrapper around litellm.acompletion, used by the ASGI serving path.
+    """
+    import litellm
+    limiter = _async_llm_limiter()
+    with span("llm.completion", "client", model=kwargs.get('model')) as current:
+        if limiter:
+            queued_at = time.perf_counter()
+            async with limiter:
+                current.set_attribute("llm.queue_wait_ms", round((time.perf_counter() - queued_at) * 1000, 1))
+                response = await litellm.acompletion(*args, **kwargs)
+        else:
+            response = await litellm.acompletion(*args, **kwargs)
+        _record_usage(current, response)
+    return response
+
+async def aembedding(*args, **kwargs):
+    """
+    Async wrapper around litellm.aembedding.
+    """
+    import litellm
+    with span("llm.embedding", "client", model=kwargs.get('model'), inputs=len(kwargs.get('input') or [])) as current:
+        response = await litellm.aembedding(*args, **kwargs)
+        _record_usage(current, response)
+    return response
\ No newline at end of file
@@ -1,12 +1,19 @@
 # app/services/qdrant_client_setup.py
-from qdrant_client import QdrantClient
+import threading
 from flask import current_app
 
 qdrant_client = None
 
+def _transport_options() -> dict:
+    """gRPC instead of REST when QDRANT_PREFER_GRPC is set (binary protobuf payloads: cheaper large upserts)."""
+    if not current_app.config.get('QDRANT_PREFER_GRPC'):
+        return {}
+    return {"prefer_grpc": True, "grpc_port": current_app.config.get('QDRANT_GRPC_PORT', 6334)}
+
 def get_qdrant_client():
     global qdrant_client
     if qdrant_client is None:
+        from qdrant_client import QdrantClient # Imported on first use; it is slow to import
         qdrant_url = current_app.config.get('QDRANT_URL')
         qdrant_api_key = current_app.config.get('QDRANT_API_KEY') # This might be None
 
@@ -16,11 +23,11 @@ def get_qdrant_client():
         try:
             current_app.logger.info(f"Initializing Qdrant client with URL: {qdrant_url}")
             if qdrant_api_key:
-                qdrant_client = QdrantClient(url=qdrant_url, api_key=qdrant_api_key)
+                qdrant_client = QdrantClient(url=qdrant_url, api_key=qdrant_api_key, **_transport_options())
                 current_app.logger.info("Qdrant client initialized with API key.")
             else:
                 # For local Qdrant or instances without an API key
-                qdrant_client = QdrantClient(url=qdrant_url)
+                qdrant_client = QdrantClient(url=qdrant_url, **_transport_options())
                 current_app.logger.info("Qdrant client initialized without API key (local/unsecured).")
             
             # Test connection (optional, but good for startup)
@@ -38,27 +45,103 @@ def get_qdrant_client():
             raise  # Re-raise the exception to halt startup if Qdrant is critical
     return qdrant_client
 
-# Your existing vector_store.py content would go here or be adapted.
-# For example, create_collection might use get_qdrant_client()
-from qdrant_client.models import VectorParams, Distance
+async_qdrant_client = None
+
+def get_async_qdrant_client():
+    """AsyncQdrantClient for the ASGI serving path; created on first use with the same settings as the sync client."""
+    global async_qdrant_client
+    if async_qdrant_client is None:
+        from qdrant_client import AsyncQdrantClient
+        qdrant_url = current_app.config.get('QDRANT_URL')
+        if not qdrant_url:
+            raise ValueError("QDRANT_URL is not set in the application configuration.")
+        async_qdrant_client = AsyncQdrantClient(url=qdrant_url, api_key=current_app.config.get('QDRANT_API_KEY'), **_transport_options())
+        current_app.logger.info(f"Async Qdrant client initialized with URL: {qdrant_url}")
+    return async_qdrant_client
+
+# --- Collection registry ---
+# Names of the collections known to exist, loaded with one get_collections() call (at warmup or on first use)
+# and kept up to date by create/delete below. Indexing into a known collection then costs no metadata
+# round trip. The lock serializes creation within the process (concurrent jobs indexing into the shared
+# abstract collection); a collection created by another process is detected from the create call's conflict,
+# one deleted elsewhere from a not-found error on upsert or search (forget_missing_collection).
+_known_collections = None
+_collections_lock = threading.Lock()
+
+def load_collection_registry(client=None) -> set:
+    """(Re)loads the registry from the server."""
+    global _known_collections
+    client = client or get_qdrant_client()
+    names = {collection.name for collection in client.get_collections().collections}
+    with _collections_lock:
+        _known_collections = names
+    current_app.logger.info(f"Qdrant collection registry loaded ({len(names)} collections).")
+    return names
+
+def _registry(client) -> set:
+    if _known_collections is None:
+        load_collection_registry(client)
+    return _known_collections
+
+def _is_already_exists(error: Exception) -> bool:
+    # REST answers 409 (older servers 400), gRPC ALREADY_EXISTS, local mode a ValueError: all say "already exists"
+    return getattr(error, "status_code", None) == 409 or "already exists" in str(error).lower()
 
-def create_qdrant_collection(collection_name: str, vector_size: int, distance: Distance = Distance.COSINE):
+def _is_not_found(error: Exception) -> bool:
+    # REST answers 404, gRPC NOT_FOUND, local mode a ValueError ("Collection ... not found")
+    message = str(error).lower()
+    return getattr(error, "status_code", None) == 404 or "not found" in message or "not_found" in message
+
+def forget_missing_collection(collection_name: str, error: Exception) -> bool:
+    """
+    Called after an operation on a collection failed. If the error says the collection doesn't exist
+    (deleted by another process or by hand), drops it from the registry so the next
+    create_qdrant_collection recreates it. Returns whether the collection was missing.
+    """
+    if not _is_not_found(error):
+        return False
+    with _collections_lock:
+        if _known_collections is not None:
+            _known_collections.discard(collection_name)
+    current_app.logger.warning(f"Collection '{collection_name}' no longer exists; removed it from the registry.")
+    return True
+
+def create_qdrant_collection(collection_name: str, vector_size: int, distance=None): # distance defaults to Distance.COSINE
+    from qdrant_client.models import VectorParams, Distance
+    distance = distance or Distance.COSINE
     client = get_qdrant_client()
     try:
-        # Check if collection already exists
-        try:
-            client.get_collection(collection_name=collection_name)
-            current_app.logger.info(f"Collection '{collection_name}' already exists.")
-            return True # Or handle as needed
-        except Exception: # Specific exception for collection not found is better
-            current_app.logger.info(f"Collection '{collection_name}' does not exist. Creating...")
-
-        client.create_collection(
-            collection_name=collection_name,
-            vectors_config=VectorParams(size=vector_size, distance=distance)
-        )
-        current_app.logger.info(f"Collection '{collection_name}' created successfully with vector size {vector_size}.")
+        if collection_name in _registry(client):
+            return True # Known to exist: no round trip
+
+        with _collections_lock:
+            if collection_name in _known_collections: # Created by another thread while we waited
+                return True
+            try:
+                client.create_collection(
+                    collection_name=collection_name,
+                    vectors_config=VectorParams(size=vector_size, distance=distance)
+                )
+                current_app.logger.info(f"Collection '{collection_name}' created successfully with vector size {vector_size}.")
+            except Exception as e:
+                if not _is_already_exists(e):
+                    raise
+                current_app.logger.info(f"Collection '{collection_name}' already exists (created by another process).")
+            _known_collections.add(collection_name)
         return True
     except Exception as e:
         current_app.logger.error(f"Failed to create or check collection '{collection_name}': {e}")
-        return False
\ No newline at end of file
+        return False
+
+def delete_qdrant_collection(collection_name: str) -> bool:
+    client = get_qdrant_client()
+    try:
+        with _collections_lock:
+            client.delete_collection(collection_name=collection_name)
+            if _known_collections is not None:
+                _known_collections.discard(collection_name)
+        current_app.logger.info(f"Collection '{collection_name}' deleted.")
+        return True
+    except Exception as e:
+        current_app.logger.error(f"Failed to delete collection '{collection_name}': {e}")
+        return False
@@ -0,0 +1,81 @@
+# app/services/status_notifier.py
+"""
+In-process change notifications for paper processing status.
+
+A SQLAlchemy session hook records which PaperMetadata rows a transaction touched, and wakes
+waiting status requests (long-poll and SSE) once the transaction commits. Every stage update
+therefore notifies its watchers without the processing code having to know about them:
+background processing, abstract indexing and `flask ingest` all commit through the session.
+Bulk UPDATE statements bypass the hook; code that changes paper status that way (claiming papers,
+re-queueing versions) reports the ids with mark_papers_changed.
+
+The notifications only cross threads, not processes. With several server processes, a paper
+processed in another worker is noticed on the waiter's next periodic recheck
+(STATUS_RECHECK_SECONDS) instead of immediately.
+"""
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+class StatusNotifier:
+    def __init__(self):
+        self._cond = threading.Condition()
+        self.version = 0      # Bumped on every notify
+        self._changed_at = {} # paper db id -> version of its last change
+
+    def notify(self, paper_ids):
+        paper_ids = set(paper_ids)
+        if not paper_ids:
+            return
+        with self._cond:
+            self.version += 1
+            for paper_id in paper_ids:
+                self._changed_at[paper_id] = self.version
+            self._cond.notify_all()
+
+    def changed_since(self, paper_ids, version: int) -> bool:
+        return any(self._changed_at.get(paper_id, 0) > version for paper_id in paper_ids)
+
+    def wait(self, paper_ids, version: int, timeout: float) -> bool:
+        """Blocks until one of the papers changes after `version` (True) or the timeout expires (False)."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while not self.changed_since(paper_ids, version):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            return True
+
+status_notifier = StatusNotifier()
+
+def mark_papers_changed(session, paper_ids) -> None:
+    """Notifies the papers' watchers when the session commits (nothing happens if it rolls back)."""
+    session.info.setdefault("changed_paper_ids", set()).update(paper_ids)
+
+_listeners_registered = False
+
+def register_session_listeners():
+    """Hooks the notifier into every SQLAlchemy session (once per process)."""
+    global _listeners_registered
+    if _listeners_registered:
+        return
+    _listeners_registered = True
+
+    from app.models.paper import PaperMetadata
+
+    @event.listens_for(Session, "after_flush")
+    def _collect_changed_papers(session, flush_context):
+        # new/dirty still describe what this flush wrote; new rows already have their ids
+        changed = session.info.setdefault("changed_paper_ids", set())
+        changed.update(obj.id for obj in list(session.new) + list(session.dirty) if isinstance(obj, PaperMetadata))
+
+    @event.listens_for(Session, "after_commit")
+    def _notify_changed_papers(session):
+        status_notifier.notify(session.info.pop("changed_paper_ids", ()))
+
+    @event.listens_for(Session, "after_rollback")
+    def _forget_changed_papers(session):
+        session.info.pop("changed_paper_ids", None)
@@ -0,0 +1,347 @@
+# app/tracing.py
+"""
+Lightweight request tracing with OpenTelemetry-style spans.
+
+A span times one operation (an HTTP request, a RAGService call, a Qdrant search, an LLM completion,
+a processing stage) and points to its parent, so one trace shows where a request's latency went.
+The current span lives in a context var: it follows asyncio tasks, and threads started through
+app.logging_setup.propagate_context (background processing, thread pools), so their spans join the
+trace of the request that started them.
+
+Sampling is decided once per trace (TRACING_SAMPLE_RATE, or the sampled flag of an incoming W3C
+`traceparent` header). Finished spans are queued and exported in batches by a background thread,
+either as JSON lines to a local file (`flask trace-show` prints one trace as a tree) or as OTLP/JSON
+to a collector. With TRACING_ENABLED off, `span()` costs one flag check.
+"""
+import atexit
+import contextvars
+import functools
+import inspect
+import json
+import os
+import queue
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+from app.logging_setup import job_id_var, request_id_var
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+_TRACEPARENT = re.compile(r"^00-(?P<trace_id>[0-9a-f]{32})-(?P<span_id>[0-9a-f]{16})-(?P<flags>[0-9a-f]{2})$")
+
+class Span:
+    __slots__ = ("name", "kind", "trace_id", "span_id", "parent_id", "start_ns", "end_ns", "attributes", "status", "status_message")
+
+    def __init__(self, name: str, kind: str, trace_id: str, parent_id: str | None, attributes: dict):
+        self.name = name
+        self.kind = kind # "server" for incoming requests, "client" for calls to other services, else "internal"
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.attributes = attributes
+        self.status = "ok"
+        self.status_message = None
+
+    recording = True
+
+    def set_attribute(self, key: str, value) -> None:
+        self.attributes[key] = value
+
+    def set_error(self, error) -> None:
+        self.status = "error"
+        self.status_message = str(error)[:500]
+
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def to_dict(self) -> dict:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "kind": self.kind,
+            "start_ns": self.start_ns,
+            "end_ns": self.end_ns,
+            "duration_ms": round((self.end_ns - self.start_ns) / 1e6, 3),
+            "status": self.status,
+            "status_message": self.status_message,
+            "attributes": self.attributes,
+        }
+
+class _NonRecordingSpan:
+    """Stands in for spans of traces that weren't sampled, so their children aren't recorded either."""
+    recording = False
+    trace_id = None
+    span_id = None
+
+    def set_attribute(self, key, value):
+        pass
+
+    def set_error(self, error):
+        pass
+
+_NOT_SAMPLED = _NonRecordingSpan()
+
+class FileSpanExporter:
+    """JSON lines, one span per line; rotated to <path>.1 once it exceeds max_bytes."""
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    def export(self, spans: list[Span]) -> None:
+        if self.max_bytes and os.path.exists(self.path) and os.path.getsize(self.path) > self.max_bytes:
+            os.replace(self.path, self.path + ".1")
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.writelines(json.dumps(span.to_dict(), default=str) + "\n" for span in spans)
+
+class OtlpHttpSpanExporter:
+    """OTLP/HTTP with the JSON encoding, e.g. to an OpenTelemetry Collector on :4318."""
+    _KINDS = {"internal": 1, "server": 2, "client": 3}
+
+    def __init__(self, endpoint: str, service_name: str, timeout: float = 5.0):
+        self.endpoint = endpoint
+        self.service_name = service_name
+        self.timeout = timeout
+
+    @staticmethod
+    def _value(value) -> dict:
+        if isinstance(value, bool):
+            return {"boolValue": value}
+        if isinstance(value, int):
+            return {"intValue": str(value)}
+        if isinstance(value, float):
+            return {"doubleValue": value}
+        return {"stringValue": str(value)}
+
+    def export(self, spans: list[Span]) -> None:
+        import requests
+        body = {"resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": self.service_name}}]},
+            "scopeSpans": [{"scope": {"name": "app.tracing"}, "spans": [{
+                "traceId": span.trace_id,
+                "spanId": span.span_id,
+                **({"parentSpanId": span.parent_id} if span.parent_id else {}),
+                "name": span.name,
+                "kind": self._KINDS.get(span.kind, 1),
+                "startTimeUnixNano": str(span.start_ns),
+                "endTimeUnixNano": str(span.end_ns),
+                "attributes": [{"key": key, "value": self._value(value)} for key, value in span.attributes.items() if value is not None],
+                "status": {"code": 2, "message": span.status_message or ""} if span.status == "error" else {"code": 1},
+            } for span in spans]}],
+        }]}
+        requests.post(self.endpoint, json=body, timeout=self.timeout).raise_for_status()
+
+class _BatchExporter:
+    """Hands finished spans to a background thread that exports them in batches; drops spans when its queue is full."""
+    def __init__(self, exporter, queue_size: int, batch_size: int, interval: float):
+        self.exporter = exporter
+        self.batch_size = batch_size
+        self.interval = interval
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = threading.Thread(target=self._run, name="span-exporter", daemon=True)
+        self._thread.start()
+
+    def submit(self, span: Span) -> None:
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            self.dropped += 1
+
+    def _export(self, batch) -> None:
+        try:
+            self.exporter.export(batch)
+        except Exception as e: # Tracing must never break the app
+            print(f"Warning: Failed to export {len(batch)} spans: {e}")
+
+    def _run(self):
+        batch, deadline = [], time.monotonic() + self.interval
+        while True:
+            try:
+                span = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                if span is None: # Shutdown
+                    break
+                batch.append(span)
+            except queue.Empty:
+                pass
+            if len(batch) >= self.batch_size or (batch and time.monotonic() >= deadline):
+                self._export(batch)
+                batch = []
+            if time.monotonic() >= deadline:
+                deadline = time.monotonic() + self.interval
+        if batch:
+            self._export(batch)
+
+    def shutdown(self, timeout: float = 5.0) -> None:
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            return
+        self._thread.join(timeout)
+
+class _TracerState:
+    enabled = False
+    sample_rate = 1.0
+    exporter = None # _BatchExporter
+
+_tracer = _TracerState()
+
+def configure_tracing(app) -> None:
+    """Enables tracing from the app config (TRACING_*); the exporter thread is shared by every app in the process."""
+    config = app.config
+    _tracer.enabled = config.get('TRACING_ENABLED', False)
+    _tracer.sample_rate = config.get('TRACING_SAMPLE_RATE', 1.0)
+    if not _tracer.enabled or _tracer.exporter is not None:
+        return
+    if config.get('TRACING_EXPORTER', 'file') == 'otlp':
+        exporter = OtlpHttpSpanExporter(config.get('TRACING_OTLP_ENDPOINT'), config.get('TRACING_SERVICE_NAME', 'ai-research-assistant'))
+    else:
+        exporter = FileSpanExporter(config['TRACING_FILE_PATH'], config.get('TRACING_FILE_MAX_BYTES', 50 * 1024 * 1024))
+    _tracer.exporter = _BatchExporter(exporter, queue_size=config.get('TRACING_QUEUE_SIZE', 10000), batch_size=512, interval=config.get('TRACING_EXPORT_INTERVAL', 2.0))
+    atexit.register(_tracer.exporter.shutdown)
+
+def current_span():
+    """The active span (None outside any trace)."""
+    return _current_span.get()
+
+def current_trace_ids() -> tuple[str | None, str | None]:
+    """(trace_id, span_id) of the active recording span, for log records."""
+    span = _current_span.get()
+    return (span.trace_id, span.span_id) if span is not None and span.recording else (None, None)
+
+def start_span(name: str, kind: str = "internal", traceparent: str | None = None, **attributes):
+    """
+    Starts a span as a child of the current one (or of an incoming `traceparent`) and makes it current.
+    Returns (span, token); pass both to end_span. Prefer the `span` context manager.
+    """
+    parent = _current_span.get()
+    if not _tracer.enabled or parent is _NOT_SAMPLED:
+        return parent, None
+    parent_id = None
+    if parent is not None:
+        trace_id, parent_id = parent.trace_id, parent.span_id
+    else:
+        match = _TRACEPARENT.match(traceparent or "")
+        if match:
+            if not int(match.group("flags"), 16) & 1: # The caller didn't sample this trace
+                return _NOT_SAMPLED, _current_span.set(_NOT_SAMPLED)
+            trace_id, parent_id = match.group("trace_id"), match.group("span_id")
+        elif random.random() >= _tracer.sample_rate:
+            return _NOT_SAMPLED, _current_span.set(_NOT_SAMPLED)
+        else:
+            trace_id = os.urandom(16).hex()
+    attributes.update({
+        key: value for key, value in (("request_id", request_id_var.get()), ("job_id", job_id_var.get())) if value
+    })
+    span = Span(name, kind, trace_id, parent_id, attributes)
+    return span, _current_span.set(span)
+
+def end_span(span, token, error: BaseException | None = None) -> None:
+    if token is not None:
+        try:
+            _current_span.reset(token)
+        except ValueError: # Ended in another context (e.g. a streamed response's teardown)
+            _current_span.set(None)
+    if span is None or not span.recording:
+        return
+    if error is not None:
+        span.set_error(error)
+    span.end_ns = time.time_ns()
+    if _tracer.exporter is not None:
+        _tracer.exporter.submit(span)
+
+@contextmanager
+def span(name: str, kind: str = "internal", traceparent: str | None = None, **attributes):
+    """Times the block as a child span of the current one; yields the span (set_attribute/set_error)."""
+    if not _tracer.enabled:
+        yield _NOT_SAMPLED
+        return
+    current, token = start_span(name, kind, traceparent, **attributes)
+    try:
+        yield current if current is not None else _NOT_SAMPLED
+    except BaseException as e:
+        end_span(current, token, e)
+        raise
+    end_span(current, token)
+
+def traced(name: str | None = None, kind: str = "internal"):
+    """Decorator: each call of the (sync or async) function is a span, named after the function by default."""
+    def decorator(func):
+        span_name = name or func.__qualname__
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with span(span_name, kind):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(span_name, kind):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def register_request_spans(app) -> None:
+    """One server span per request, continuing the caller's trace when it sends a `traceparent` header."""
+    from flask import g, request
+
+    @app.before_request
+    def _start_request_span():
+        if not _tracer.enabled:
+            return
+        route = request.url_rule.rule if request.url_rule else request.path
+        g.trace_span = start_span(
+            f"{request.method} {route}", "server", request.headers.get('traceparent'),
+            **{"http.method": request.method, "http.route": route},
+        )
+
+    @app.after_request
+    def _record_status(response):
+        current, _ = g.get('trace_span', (None, None))
+        if current is not None and current.recording:
+            current.set_attribute("http.status_code", response.status_code)
+            if response.status_code >= 500:
+                current.set_error(f"HTTP {response.status_code}")
+            response.headers['traceparent'] = current.traceparent()
+        return response
+
+    @app.teardown_request
+    def _end_request_span(exc):
+        if 'trace_span' in g:
+            end_span(*g.pop('trace_span'), exc)
+
+def load_trace(path: str, trace_or_request_id: str) -> list[dict]:
+    """Spans from a file export that belong to a trace, found by trace ID or by the request ID of any of its spans."""
+    spans = []
+    for file_path in (path + ".1", path):
+        if os.path.exists(file_path):
+            with open(file_path, "r", encoding="utf-8") as f:
+                spans.extend(json.loads(line) for line in f if line.strip())
+    trace_ids = {span["trace_id"] for span in spans if span["trace_id"] == trace_or_request_id or span["attributes"].get("request_id") == trace_or_request_id}
+    return sorted((span for span in spans if span["trace_id"] in trace_ids), key=lambda span: span["start_ns"])
+
+def format_trace(spans: list[dict]) -> str:
+    """The spans as an indented tree: offset from the trace start, duration, name and attributes."""
+    children = {}
+    span_ids = {span["span_id"] for span in spans}
+    for span in spans:
+        children.setdefault(span["parent_id"] if span["parent_id"] in span_ids else None, []).append(span)
+    start = min((span["start_ns"] for span in spans), default=0)
+    lines = []
+
+    def walk(parent_id, depth):
+        for span in children.get(parent_id, []):
+            attributes = " ".join(f"{key}={value}" for key, value in span["attributes"].items() if key not in ("request_id", "job_id"))
+            error = f" ERROR: {span['status_message']}" if span["status"] == "error" else ""
+            lines.append(f"{(span['start_ns'] - start) / 1e6:9.1f} ms {span['duration_ms']:9.1f} ms  {'  ' * depth}{span['name']} {attributes}{error}".rstrip())
+            walk(span["span_id"], depth + 1)
+    walk(None, 0)
+    return "\n".join(lines)
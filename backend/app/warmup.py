@@ -0,0 +1,46 @@
+# app/warmup.py
+import importlib
+import time
+
+# Heavy dependencies that the request path imports lazily (see app/services and the processor/rag modules)
+HEAVY_MODULES = (
+    'litellm',
+    'qdrant_client',
+    'qdrant_client.models',
+    'langchain.text_splitter',
+    'fitz',
+    'ftfy',
+    'arxiv',
+    'numpy',
+)
+
+def warmup(app):
+    """
+    Preloads the lazily imported dependencies and opens the Qdrant client, so the first
+    real request on a worker does not pay for them. Call it before the worker accepts
+    traffic (e.g. gunicorn's post_worker_init hook, or `flask warmup` as a readiness check).
+    Failures are logged, not raised: a missing optional service should not stop the worker.
+    """
+    started = time.perf_counter()
+    with app.app_context():
+        for module_name in HEAVY_MODULES:
+            module_started = time.perf_counter()
+            try:
+                importlib.import_module(module_name)
+                app.logger.info(f"Warmup: imported {module_name} in {(time.perf_counter() - module_started) * 1000:.0f} ms")
+            except ImportError as e:
+                app.logger.warning(f"Warmup: could not import {module_name}: {e}")
+
+        from rag.structure_chunker import count_tokens
+        count_tokens("warmup") # Loads the tokenizer (tiktoken encoding, if installed)
+
+        try:
+            from app.services.qdrant_client_setup import load_collection_registry
+            load_collection_registry() # Opens the connection and caches the collection names
+            app.logger.info("Warmup: Qdrant client connected.")
+        except Exception as e:
+            app.logger.warning(f"Warmup: Qdrant client not ready: {e}")
+
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    app.logger.info(f"Warmup finished in {elapsed_ms:.0f} ms")
+    return elapsed_ms
@@ -0,0 +1,8 @@
+# asgi.py
+# ASGI entry point: `uvicorn asgi:app --host 0.0.0.0 --port 5000`
+# Search and chat are served as coroutines; every other route falls through to the Flask app.
+import os
+from app.asgi import create_asgi_app
+
+config_name = os.getenv('FLASK_CONFIG') or 'dev'
+app = create_asgi_app(config_name)
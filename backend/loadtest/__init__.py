@@ -0,0 +1,6 @@
+# loadtest/__init__.py
+"""
+Load-testing harness: the app against stub arXiv, LLM and Qdrant backends with configurable
+latency, driven by virtual users (register/login, search, status polling, multi-turn chat).
+Run `python -m loadtest --help` from backend/.
+"""
@@ -0,0 +1,145 @@
+# loadtest/__main__.py
+"""
+Load test: `python -m loadtest --users 5,10,20,40 --stage-seconds 60` (run from backend/).
+
+Starts the app with stub backends in a subprocess (loadtest.server), then runs one stage per user
+count, adding virtual users at each step. Prints throughput, error rate and latency percentiles
+per endpoint, plus the server's thread/socket/DB-pool use, for every stage, and names the first
+stage that broke the error-rate or p95 limit. --base-url aims the users at a server that is already
+running (e.g. loadtest.server under gunicorn, or against Postgres) instead.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+import requests
+
+from loadtest.report import breaking_stage, endpoint_stats, format_stage, read_samples, resource_stats
+from loadtest.scenarios import Recorder, VirtualUser
+from loadtest.server import add_stub_arguments
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def _start_server(args, workdir: str):
+    """Starts loadtest.server and waits until it answers; returns (process, base_url, metrics_file)."""
+    metrics_file = os.path.join(workdir, "metrics.jsonl")
+    command = [
+        sys.executable, "-m", "loadtest.server", "--port", str(args.port), "--workdir", workdir,
+        "--metrics-file", metrics_file, "--config", args.config,
+        "--llm-latency", str(args.llm_latency), "--embedding-latency", str(args.embedding_latency),
+        "--arxiv-latency", str(args.arxiv_latency), "--pdf-latency", str(args.pdf_latency),
+        "--qdrant-latency", str(args.qdrant_latency), "--jitter", str(args.jitter),
+        "--embedding-dim", str(args.embedding_dim), "--paper-pool", str(args.paper_pool),
+        "--pdf-pages", str(args.pdf_pages), "--arxiv-delay", str(args.arxiv_delay),
+    ]
+    if args.asgi:
+        command.append("--asgi")
+    if args.database_url:
+        command += ["--database-url", args.database_url]
+    log = open(os.path.join(workdir, "server.log"), "ab")
+    process = subprocess.Popen(command, cwd=BACKEND_DIR, stdout=log, stderr=subprocess.STDOUT)
+    base_url = f"http://127.0.0.1:{args.port}"
+
+    deadline = time.monotonic() + args.startup_timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Load-test server exited with code {process.returncode}; see {log.name}")
+        try:
+            requests.get(base_url + "/api/auth/protected", timeout=2) # Any answer (401) means it is serving
+            return process, base_url, metrics_file
+        except requests.RequestException:
+            time.sleep(0.5)
+    process.terminate()
+    raise RuntimeError(f"Load-test server did not answer within {args.startup_timeout}s; see {log.name}")
+
+def run_stages(args, base_url: str, metrics_file: str | None) -> list:
+    recorder = Recorder()
+    stop = threading.Event()
+    users, stages = [], []
+    for stage_number, user_count in enumerate(args.users):
+        recorder.stage = stage_number # Requests count towards the stage in which they finish
+        started_at = time.time()
+        for _ in range(max(0, user_count - len(users))):
+            user = VirtualUser(base_url, recorder, stop, think_time=args.think_time, chat_turns=tuple(args.chat_turns),
+                               status_polls=args.status_polls, timeout=args.request_timeout)
+            users.append(user)
+            user.start()
+            time.sleep(args.ramp_seconds / max(1, user_count)) # Spread the logins over the ramp
+        time.sleep(max(0.0, started_at + args.stage_seconds - time.time()))
+        ended_at = time.time()
+
+        duration = ended_at - started_at
+        stage = {
+            "users": user_count,
+            "duration": duration,
+            "endpoints": endpoint_stats(recorder.for_stage(stage_number), duration),
+            "resources": resource_stats(read_samples(metrics_file), started_at, ended_at),
+        }
+        stages.append(stage)
+        print(format_stage(stage), flush=True)
+
+    stop.set()
+    for user in users:
+        user.join(timeout=args.request_timeout)
+    return stages, dict(Counter(recorder.papers.values()))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test the search and chat endpoints against stub backends.")
+    parser.add_argument("--users", type=lambda value: [int(n) for n in value.split(",")], default=[5, 10, 20, 40],
+                        help="Concurrent virtual users per stage, comma-separated (default 5,10,20,40)")
+    parser.add_argument("--stage-seconds", type=float, default=60)
+    parser.add_argument("--ramp-seconds", type=float, default=5, help="Time over which a stage's new users log in")
+    parser.add_argument("--think-time", type=float, default=2.0, help="Mean pause between a user's actions (seconds)")
+    parser.add_argument("--chat-turns", type=int, nargs=2, default=[2, 4], metavar=("MIN", "MAX"))
+    parser.add_argument("--status-polls", type=int, default=5, help="Status polls after each search")
+    parser.add_argument("--request-timeout", type=float, default=120)
+    parser.add_argument("--max-error-rate", type=float, default=0.01, help="A stage above this error rate counts as broken")
+    parser.add_argument("--max-p95", type=float, default=10000, help="A stage with an endpoint p95 above this (ms) counts as broken")
+    parser.add_argument("--json", help="Also write the full report to this file")
+    parser.add_argument("--base-url", help="Test an already running server instead of starting one")
+    parser.add_argument("--metrics-file", help="With --base-url: that server's resource samples file")
+    server = parser.add_argument_group("load-test server (ignored with --base-url)")
+    server.add_argument("--port", type=int, default=5055)
+    server.add_argument("--asgi", action="store_true", help="Serve with uvicorn instead of the threaded WSGI server")
+    server.add_argument("--config", default="prod")
+    server.add_argument("--database-url", help="Default: a fresh SQLite file")
+    server.add_argument("--workdir", help="Default: a new temporary directory")
+    server.add_argument("--startup-timeout", type=float, default=120)
+    add_stub_arguments(parser)
+    args = parser.parse_args(argv)
+
+    process = None
+    if args.base_url:
+        base_url, metrics_file = args.base_url, args.metrics_file
+    else:
+        workdir = args.workdir or tempfile.mkdtemp(prefix="loadtest-")
+        os.makedirs(workdir, exist_ok=True)
+        process, base_url, metrics_file = _start_server(args, workdir)
+        print(f"Server at {base_url} (work dir {workdir})", flush=True)
+    try:
+        stages, paper_states = run_stages(args, base_url, metrics_file)
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=30)
+
+    print("\nPapers by last polled processing state: " + (", ".join(f"{state}={count}" for state, count in sorted(paper_states.items())) or "none polled"))
+    broken = breaking_stage(stages, args.max_error_rate, args.max_p95)
+    if broken:
+        print(f"\nLimits first exceeded at {broken['users']} users: error rate {broken['error_rate'] * 100:.1f}%"
+              + (f", p95 over {args.max_p95:.0f} ms on {', '.join(broken['slow_endpoints'])}" if broken["slow_endpoints"] else ""))
+    else:
+        print(f"\nAll stages within limits (error rate <= {args.max_error_rate * 100:.1f}%, p95 <= {args.max_p95:.0f} ms).")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"stages": stages, "breaking_stage": broken, "paper_states": paper_states, "settings": vars(args)}, f, indent=2)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
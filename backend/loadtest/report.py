@@ -0,0 +1,98 @@
+# loadtest/report.py
+"""Aggregates the recorded requests and resource samples of each stage into the load-test report."""
+import json
+import math
+from collections import defaultdict
+
+def percentile(sorted_values: list, fraction: float) -> float | None:
+    """Nearest-rank percentile of an ascending list."""
+    if not sorted_values:
+        return None
+    return sorted_values[max(0, math.ceil(fraction * len(sorted_values)) - 1)]
+
+def endpoint_stats(records: list, duration: float) -> dict:
+    """Per endpoint (and 'ALL'): requests, throughput, error rate and latency percentiles in milliseconds."""
+    by_endpoint = defaultdict(list)
+    for _, endpoint, _, seconds, status, ok in records:
+        by_endpoint[endpoint].append((seconds, status, ok))
+        by_endpoint["ALL"].append((seconds, status, ok))
+
+    stats = {}
+    for endpoint, rows in by_endpoint.items():
+        latencies = sorted(seconds * 1000 for seconds, _, _ in rows)
+        errors = [status for _, status, ok in rows if not ok]
+        stats[endpoint] = {
+            "requests": len(rows),
+            "rps": round(len(rows) / duration, 2) if duration > 0 else None,
+            "error_rate": round(len(errors) / len(rows), 4),
+            "errors_by_status": {str(status): errors.count(status) for status in sorted(set(errors))}, # 0 = timeout/connection error
+            "p50_ms": round(percentile(latencies, 0.50), 1),
+            "p90_ms": round(percentile(latencies, 0.90), 1),
+            "p95_ms": round(percentile(latencies, 0.95), 1),
+            "p99_ms": round(percentile(latencies, 0.99), 1),
+            "max_ms": round(latencies[-1], 1),
+        }
+    return stats
+
+def read_samples(path: str | None) -> list:
+    """The server's resource samples (see loadtest.server); empty when it wrote none."""
+    if not path:
+        return []
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return [json.loads(line) for line in f if line.strip()]
+    except OSError:
+        return []
+
+def resource_stats(samples: list, started_at: float, ended_at: float) -> dict:
+    """Peak and mean resource use of the server while the stage ran."""
+    window = [sample for sample in samples if started_at <= sample["time"] <= ended_at]
+    if not window:
+        return {}
+    stats = {}
+    for key in ("threads", "sockets", "open_fds", "db_checked_out", "db_overflow"):
+        values = [sample[key] for sample in window if key in sample]
+        if values:
+            stats[f"{key}_max"] = max(values)
+            stats[f"{key}_mean"] = round(sum(values) / len(values), 1)
+    if "db_pool_size" in window[-1]:
+        stats["db_pool_size"] = window[-1]["db_pool_size"]
+    stats["db_pool"] = window[-1].get("db_pool")
+    groups = defaultdict(int)
+    for sample in window:
+        for group, count in sample.get("thread_groups", {}).items():
+            groups[group] = max(groups[group], count)
+    stats["thread_groups_max"] = dict(sorted(groups.items(), key=lambda item: -item[1]))
+    return stats
+
+def breaking_stage(stages: list, max_error_rate: float, max_p95_ms: float) -> dict | None:
+    """The first stage where the error rate or any endpoint's p95 latency went over its limit."""
+    for stage in stages:
+        overall = stage["endpoints"].get("ALL")
+        if overall is None:
+            continue
+        slow = [endpoint for endpoint, stats in stage["endpoints"].items() if endpoint != "ALL" and stats["p95_ms"] > max_p95_ms]
+        if overall["error_rate"] > max_error_rate or slow:
+            return {"users": stage["users"], "error_rate": overall["error_rate"], "slow_endpoints": slow}
+    return None
+
+def format_stage(stage: dict) -> str:
+    lines = [f"\n=== {stage['users']} users, {stage['duration']:.0f}s ==="]
+    header = f"{'endpoint':<40} {'reqs':>6} {'rps':>7} {'err%':>6} {'p50':>8} {'p90':>8} {'p95':>8} {'p99':>8} {'max':>8}"
+    lines += [header, "-" * len(header)]
+    for endpoint, stats in sorted(stage["endpoints"].items(), key=lambda item: (item[0] == "ALL", item[0])):
+        lines.append(
+            f"{endpoint:<40} {stats['requests']:>6} {stats['rps']:>7} {stats['error_rate'] * 100:>5.1f}% "
+            f"{stats['p50_ms']:>8} {stats['p90_ms']:>8} {stats['p95_ms']:>8} {stats['p99_ms']:>8} {stats['max_ms']:>8}"
+        )
+    resources = stage.get("resources")
+    if resources:
+        lines.append(
+            f"server: threads max {resources.get('threads_max')} (mean {resources.get('threads_mean')}), "
+            f"sockets max {resources.get('sockets_max', 'n/a')}, fds max {resources.get('open_fds_max', 'n/a')}, "
+            f"DB pool ({resources.get('db_pool')}) checked out max {resources.get('db_checked_out_max', 'n/a')}"
+            f"/{resources.get('db_pool_size', 'n/a')}, overflow max {resources.get('db_overflow_max', 'n/a')}"
+        )
+        top_groups = list(resources.get("thread_groups_max", {}).items())[:6]
+        lines.append("threads by kind (max): " + ", ".join(f"{group}={count}" for group, count in top_groups))
+    return "\n".join(lines)
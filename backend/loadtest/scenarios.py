@@ -0,0 +1,154 @@
+# loadtest/scenarios.py
+"""
+Virtual users. Each one registers and logs in, then repeats what a researcher does in the UI:
+search, poll the processing status of the results, hold a multi-turn chat about some of them,
+and now and then reopen the chat history. Think times between steps are exponential around
+think_time, so requests do not arrive in lockstep.
+"""
+import random
+import threading
+import time
+import uuid
+
+import requests
+
+QUERIES = (
+    "retrieval augmented generation", "sparse attention transformers", "graph neural networks for molecules",
+    "efficient fine-tuning of language models", "speculative decoding", "long-context evaluation benchmarks",
+    "mixture of experts routing", "contrastive learning for embeddings", "reinforcement learning from human feedback",
+    "quantization of large language models", "vision language models", "diffusion models for text",
+)
+
+QUESTIONS = (
+    "What problem does this paper address?", "Summarize the main method.", "How is the approach evaluated?",
+    "What are the limitations?", "How does it compare to the baselines?", "Which datasets are used?",
+    "What would you try next?", "Explain the key equation in simple terms.",
+)
+
+class Recorder:
+    """
+    Thread-safe log of every request: (stage, endpoint, started_at, seconds, status, ok), plus the
+    last processing state seen for each paper (background failures never show up as HTTP errors).
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.records = []
+        self.papers = {} # db_id -> processing_state
+        self.stage = 0
+
+    def add(self, endpoint: str, started_at: float, seconds: float, status: int, ok: bool) -> None:
+        with self._lock:
+            self.records.append((self.stage, endpoint, started_at, seconds, status, ok))
+
+    def add_statuses(self, statuses: list) -> None:
+        with self._lock:
+            for status in statuses:
+                self.papers[status["db_id"]] = "failed" if status.get("processing_failed") else status.get("processing_state")
+
+    def for_stage(self, stage: int) -> list:
+        with self._lock:
+            return [record for record in self.records if record[0] == stage]
+
+class VirtualUser(threading.Thread):
+    def __init__(self, base_url: str, recorder: Recorder, stop: threading.Event, think_time: float = 2.0,
+                 chat_turns: tuple = (2, 4), status_polls: int = 5, timeout: float = 120.0, seed=None):
+        super().__init__(name="virtual-user", daemon=True)
+        self.base_url = base_url.rstrip("/")
+        self.recorder = recorder
+        self.stop = stop
+        self.think_time = think_time
+        self.chat_turns = chat_turns
+        self.status_polls = status_polls
+        self.timeout = timeout
+        self.rng = random.Random(seed)
+        self.session = requests.Session() # Keep-alive, like a browser
+        self.chat_session_ids = []
+
+    def _request(self, method: str, endpoint: str, path: str, ok_statuses=(200,), **kwargs):
+        """Sends one request and records it under endpoint (the route, without IDs). Returns the response or None."""
+        started_at = time.time()
+        started = time.perf_counter()
+        try:
+            response = self.session.request(method, self.base_url + path, timeout=self.timeout, **kwargs)
+        except requests.RequestException:
+            self.recorder.add(endpoint, started_at, time.perf_counter() - started, 0, False) # Timeout or refused connection
+            return None
+        self.recorder.add(endpoint, started_at, time.perf_counter() - started, response.status_code, response.status_code in ok_statuses)
+        return response
+
+    def _think(self) -> bool:
+        """Pauses like a user reading; False once the run is over."""
+        return not self.stop.wait(self.rng.expovariate(1 / self.think_time) if self.think_time > 0 else 0)
+
+    def login(self) -> bool:
+        name = f"load-{uuid.uuid4().hex[:12]}"
+        password = "load-test-password"
+        self._request("POST", "POST /api/auth/register", "/api/auth/register", ok_statuses=(201,),
+                      json={"username": name, "email": f"{name}@example.com", "password": password})
+        response = self._request("POST", "POST /api/auth/login", "/api/auth/login",
+                                 json={"username_or_email": name, "password": password})
+        if response is None or response.status_code != 200:
+            return False
+        self.session.headers["Authorization"] = f"Bearer {response.json()['access_token']}"
+        return True
+
+    def search(self) -> list:
+        response = self._request("POST", "POST /api/papers/search", "/api/papers/search", json={"query": self.rng.choice(QUERIES)})
+        if response is None or response.status_code != 200:
+            return []
+        return [paper for paper in response.json().get("papers", []) if paper.get("db_id")]
+
+    def poll_status(self, paper_ids: list) -> list:
+        """Polls the bulk status (with ETags) a few times; returns the statuses last seen."""
+        etag, statuses = None, []
+        for _ in range(self.status_polls):
+            headers = {"If-None-Match": etag} if etag else {}
+            response = self._request("GET", "GET /api/papers/status", "/api/papers/status", ok_statuses=(200, 304),
+                                     params={"ids": ",".join(map(str, paper_ids))}, headers=headers)
+            if response is not None and response.status_code == 200:
+                etag = response.headers.get("ETag")
+                statuses = response.json().get("papers", [])
+                self.recorder.add_statuses(statuses)
+            if statuses and all(status.get("chat_mode") == "full_text" or status.get("processing_failed") for status in statuses):
+                break
+            if not self._think():
+                break
+        return statuses
+
+    def chat(self, paper_ids: list) -> None:
+        chat_session_id = None
+        for _ in range(self.rng.randint(*self.chat_turns)):
+            body = {"query": self.rng.choice(QUESTIONS), "selected_paper_ids": paper_ids}
+            if chat_session_id:
+                body["chat_session_id"] = chat_session_id
+            response = self._request("POST", "POST /api/rag/chat", "/api/rag/chat", json=body)
+            if response is None or response.status_code != 200:
+                return
+            chat_session_id = response.json().get("chat_session_id")
+            if not self._think():
+                return
+        if chat_session_id:
+            self.chat_session_ids.append(chat_session_id)
+
+    def browse_history(self) -> None:
+        self._request("GET", "GET /api/rag/sessions", "/api/rag/sessions")
+        if self.chat_session_ids:
+            session_id = self.rng.choice(self.chat_session_ids)
+            self._request("GET", "GET /api/rag/sessions/<id>/messages", f"/api/rag/sessions/{session_id}/messages")
+
+    def run(self):
+        if not self.login():
+            return
+        while not self.stop.is_set():
+            papers = self.search()
+            if not self._think():
+                break
+            if not papers: # Failed search: the pause above keeps a failing server from being hammered
+                continue
+            statuses = self.poll_status([paper["db_id"] for paper in papers])
+            chattable = [status["db_id"] for status in statuses if status.get("chat_mode")]
+            if chattable and not self.stop.is_set():
+                self.chat(self.rng.sample(chattable, min(len(chattable), self.rng.randint(1, 3))))
+            if self.rng.random() < 0.3 and not self.stop.is_set():
+                self.browse_history()
+            self._think()
@@ -0,0 +1,176 @@
+# loadtest/server.py
+"""
+Runs the app against the stub backends: `python -m loadtest.server --port 5055 [--asgi]`.
+Started by the load-test runner (python -m loadtest), or on its own to aim another load generator at it.
+
+The stubs run in this process; the app talks to the LLM and arXiv stubs over HTTP like it would to the
+real services, and to an in-memory Qdrant that sleeps for the Qdrant latency on every call.
+Every --metrics-interval seconds the process appends a resource sample (threads, sockets, DB pool) as a JSON
+line to --metrics-file, which the runner folds into its report.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+def add_stub_arguments(parser) -> None:
+    """Latency and data-set options of the stubs (shared with the runner, which passes them through)."""
+    group = parser.add_argument_group("stub backends (latencies in milliseconds)")
+    group.add_argument("--llm-latency", type=float, default=800, help="Chat/summary completion latency")
+    group.add_argument("--embedding-latency", type=float, default=60)
+    group.add_argument("--arxiv-latency", type=float, default=400)
+    group.add_argument("--pdf-latency", type=float, default=300)
+    group.add_argument("--qdrant-latency", type=float, default=5)
+    group.add_argument("--jitter", type=float, default=0.25, help="Latency jitter as a fraction of each mean")
+    group.add_argument("--embedding-dim", type=int, default=64)
+    group.add_argument("--paper-pool", type=int, default=200, help="Distinct papers the stub arXiv returns")
+    group.add_argument("--pdf-pages", type=int, default=4)
+    group.add_argument("--arxiv-delay", type=float, default=0.0,
+                       help="ARXIV_DELAY_SECONDS for the app (arXiv's own limit is 3 s; 0 measures the app, not the rate limit)")
+
+def _latency(mean_ms: float, jitter: float):
+    from loadtest.stubs import Latency
+    return Latency(mean_ms, mean_ms * jitter)
+
+def _configure_environment(args, stub_urls: dict, workdir: str) -> None:
+    """Points the app at the stubs. Config reads the environment on import, so this runs before `app` is imported."""
+    data_dir = os.path.join(workdir, "data")
+    os.makedirs(data_dir, exist_ok=True)
+    os.environ.update({
+        "QDRANT_URL": "http://stub-qdrant:6333", # Never dialled: the client is replaced below
+        "OPENAI_API_BASE": stub_urls["llm"] + "/v1",
+        "OPENAI_API_KEY": "loadtest",
+        "LITELLM_MODEL_SUMMARIZE": "openai/stub-chat",
+        "LITELLM_MODEL_FULL_SUMMARY": "openai/stub-chat",
+        "LITELLM_MODEL_CHAT": "openai/stub-chat",
+        "ARXIV_DELAY_SECONDS": str(args.arxiv_delay),
+        "PAPER_SAVE_DIR": os.path.join(data_dir, "papers"),
+        "INDEX_MANIFEST_DIR": os.path.join(data_dir, "manifests"),
+        "BM25_INDEX_DIR": os.path.join(data_dir, "bm25"),
+        "CHUNK_STORE_PATH": os.path.join(data_dir, "chunk_store.sqlite3"),
+        "ARXIV_CACHE_PATH": os.path.join(data_dir, "arxiv_cache.sqlite3"),
+        "INGEST_CHECKPOINT_PATH": os.path.join(data_dir, "ingest_checkpoint.jsonl"),
+        "TRACING_FILE_PATH": os.path.join(workdir, "traces.jsonl"),
+        "PROFILE_DIR": os.path.join(workdir, "profiles"),
+        "LITELLM_LOCAL_MODEL_COST_MAP": "True", # No network fetch of the price list at import
+    })
+    os.environ["DATABASE_URL"] = args.database_url or "sqlite:///" + os.path.join(workdir, "app.db")
+    os.environ.setdefault("JWT_SECRET_KEY", "loadtest-secret")
+
+def _patch_arxiv(arxiv_url: str) -> None:
+    import arxiv
+    import retriever.arxiv_client as arxiv_client
+    arxiv.Client.query_url_format = arxiv_url + "/api/query?{}" # Sync path (arxiv package)
+    arxiv_client.ARXIV_API_URL = arxiv_url + "/api/query"        # Async path (httpx)
+
+def _install_qdrant(latency) -> None:
+    from loadtest.stubs import LatencyQdrant, AsyncLatencyQdrant
+    from app.services import qdrant_client_setup
+    qdrant_client_setup.qdrant_client = LatencyQdrant(latency)
+    qdrant_client_setup.async_qdrant_client = AsyncLatencyQdrant(qdrant_client_setup.qdrant_client)
+
+def _thread_group(name: str) -> str:
+    # "Thread-12 (process_request_thread)" -> "process_request_thread"; "ThreadPoolExecutor-3_0" -> "ThreadPoolExecutor"
+    if "(" in name and name.endswith(")"):
+        return name[name.index("(") + 1:-1]
+    return name.split("-")[0].rstrip("_0123456789") or name
+
+def _is_socket(fd: str) -> bool:
+    try:
+        return os.readlink(f"/proc/self/fd/{fd}").startswith("socket:")
+    except OSError: # Closed since the directory was listed
+        return False
+
+def sample_resources(engine) -> dict:
+    """Threads (by kind), open sockets and file descriptors, and the DB pool's use at this moment."""
+    sample = {"time": time.time(), "threads": threading.active_count()}
+    sample["thread_groups"] = dict(Counter(_thread_group(thread.name) for thread in threading.enumerate()))
+    if os.path.isdir("/proc/self/fd"): # Linux; elsewhere only threads and the pool are sampled
+        fds = os.listdir("/proc/self/fd")
+        sample["open_fds"] = len(fds)
+        sample["sockets"] = sum(1 for fd in fds if _is_socket(fd))
+    pool = engine.pool
+    for key, method in (("db_pool_size", "size"), ("db_checked_out", "checkedout"), ("db_overflow", "overflow"), ("db_checked_in", "checkedin")):
+        if hasattr(pool, method):
+            sample[key] = getattr(pool, method)()
+    sample["db_pool"] = type(pool).__name__
+    return sample
+
+def _start_metrics(app, path: str, interval: float) -> None:
+    from app.extensions import db
+    with app.app_context():
+        engine = db.engine
+
+    def run():
+        with open(path, "a", encoding="utf-8") as f:
+            while True:
+                try:
+                    f.write(json.dumps(sample_resources(engine)) + "\n")
+                    f.flush()
+                except Exception as e: # Sampling must not take the server down
+                    print(f"Warning: Resource sampling failed: {e}")
+                time.sleep(interval)
+
+    threading.Thread(target=run, name="loadtest-metrics", daemon=True).start()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the app against stub LLM, arXiv and Qdrant backends.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5055)
+    parser.add_argument("--asgi", action="store_true", help="Serve with uvicorn (async search/chat routes) instead of the threaded WSGI server")
+    parser.add_argument("--config", default="prod", help="App config name (dev, prod)")
+    parser.add_argument("--database-url", help="e.g. postgresql://... (default: a fresh SQLite file in the work dir)")
+    parser.add_argument("--workdir", help="Data, logs and metrics go here (default: a new temporary directory)")
+    parser.add_argument("--metrics-file", help="Resource samples, one JSON line each (default: <workdir>/metrics.jsonl)")
+    parser.add_argument("--metrics-interval", type=float, default=1.0)
+    add_stub_arguments(parser)
+    args = parser.parse_args(argv)
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="loadtest-")
+    os.makedirs(workdir, exist_ok=True)
+    from loadtest.stubs import start_stub_servers
+    stub_urls = start_stub_servers(
+        llm_latency=_latency(args.llm_latency, args.jitter),
+        embedding_latency=_latency(args.embedding_latency, args.jitter),
+        arxiv_latency=_latency(args.arxiv_latency, args.jitter),
+        pdf_latency=_latency(args.pdf_latency, args.jitter),
+        embedding_dim=args.embedding_dim, paper_pool=args.paper_pool, pdf_pages=args.pdf_pages,
+    )
+    _configure_environment(args, stub_urls, workdir)
+
+    from app import create_app
+    from app.extensions import db
+    if args.asgi:
+        from app.asgi import create_asgi_app
+        asgi_app = create_asgi_app(args.config)
+        app = asgi_app.flask_app
+    else:
+        app = create_app(args.config)
+    app.config['EMBEDDING_MODEL_NAME_LITELLM'] = "openai/stub-embedding"
+    with app.app_context():
+        db.create_all()
+
+    _patch_arxiv(stub_urls["arxiv"])
+    _install_qdrant(_latency(args.qdrant_latency, args.jitter))
+    _start_metrics(app, args.metrics_file or os.path.join(workdir, "metrics.jsonl"), args.metrics_interval)
+
+    url = f"http://{args.host}:{args.port}"
+    print(f"Stub LLM at {stub_urls['llm']}, stub arXiv at {stub_urls['arxiv']}, work dir {workdir}", flush=True)
+    if args.asgi:
+        import uvicorn
+        print(f"READY {url}", flush=True) # Uvicorn binds right after this; the runner retries until it answers
+        uvicorn.run(asgi_app, host=args.host, port=args.port, log_level="warning") # The lifespan hook warms up
+    else:
+        from werkzeug.serving import make_server
+        from app.warmup import warmup
+        warmup(app)
+        server = make_server(args.host, args.port, app, threaded=True)
+        print(f"READY {url}", flush=True)
+        server.serve_forever()
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,283 @@
+# loadtest/stubs.py
+"""
+Stand-ins for the external services, each with configurable latency:
+  - an OpenAI-compatible LLM server (/chat/completions, /embeddings) that LiteLLM talks to over HTTP,
+  - an arXiv Atom API server, which also serves the PDFs its results link to,
+  - an in-memory Qdrant client wrapped so that every call pays the configured latency.
+All answers are deterministic (derived from a hash of the input), so runs are repeatable.
+"""
+import asyncio
+import hashlib
+import json
+import math
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+from xml.sax.saxutils import escape
+
+class Latency:
+    """A delay of mean_ms ± jitter_ms (uniform), never negative."""
+    def __init__(self, mean_ms: float = 0.0, jitter_ms: float = 0.0):
+        self.mean_ms = mean_ms
+        self.jitter_ms = jitter_ms
+
+    def seconds(self) -> float:
+        return max(0.0, self.mean_ms + random.uniform(-self.jitter_ms, self.jitter_ms)) / 1000
+
+    def sleep(self) -> None:
+        delay = self.seconds()
+        if delay:
+            time.sleep(delay)
+
+    async def asleep(self) -> None:
+        delay = self.seconds()
+        if delay:
+            await asyncio.sleep(delay)
+
+def _digest(text: str) -> bytes:
+    return hashlib.sha256(text.encode("utf-8")).digest()
+
+_WORDS = (
+    "model attention retrieval transformer graph latency benchmark dataset training inference "
+    "sparse dense embedding layer gradient token context evaluation baseline ablation scaling "
+    "robustness alignment corpus encoder decoder loss optimizer memory throughput accuracy"
+).split()
+
+def fake_text(seed: str, words: int) -> str:
+    """Deterministic pseudo-English of the given length."""
+    rng = random.Random(seed)
+    sentences, sentence = [], []
+    for _ in range(words):
+        sentence.append(rng.choice(_WORDS))
+        if len(sentence) >= rng.randint(8, 16):
+            sentences.append(" ".join(sentence).capitalize() + ".")
+            sentence = []
+    if sentence:
+        sentences.append(" ".join(sentence).capitalize() + ".")
+    return " ".join(sentences)
+
+def fake_embedding(text: str, dim: int) -> list[float]:
+    """A unit vector seeded by the text, so equal texts embed equally."""
+    rng = random.Random(_digest(text))
+    vector = [rng.gauss(0, 1) for _ in range(dim)]
+    norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+    return [x / norm for x in vector]
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1" # Keep-alive, like the real services
+    latency = Latency()
+
+    def log_message(self, format, *args):
+        pass # Thousands of requests per run; the load-test report is what matters
+
+    def _send(self, status: int, body: bytes, content_type: str) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, status: int, payload: dict) -> None:
+        self._send(status, json.dumps(payload).encode("utf-8"), "application/json")
+
+    def _read_json(self) -> dict:
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+class StubLLMHandler(_StubHandler):
+    """OpenAI-compatible chat completions and embeddings (LiteLLM's `openai/<model>` provider)."""
+    embedding_latency = Latency()
+    embedding_dim = 64
+    completion_words = 120
+
+    def do_POST(self):
+        body = self._read_json()
+        path = urlparse(self.path).path.rstrip("/")
+        if path.endswith("/chat/completions"):
+            self.latency.sleep()
+            prompt = "\n".join(str(message.get("content", "")) for message in body.get("messages", []))
+            words = min(self.completion_words, body.get("max_tokens") or self.completion_words)
+            text = fake_text(prompt, words)
+            prompt_tokens, completion_tokens = len(prompt.split()), len(text.split())
+            self._send_json(200, {
+                "id": "chatcmpl-" + _digest(prompt).hex()[:24],
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": body.get("model", "stub-chat"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens},
+            })
+        elif path.endswith("/embeddings"):
+            self.embedding_latency.sleep()
+            texts = body.get("input") or []
+            texts = [texts] if isinstance(texts, str) else texts
+            tokens = sum(len(str(text).split()) for text in texts)
+            self._send_json(200, {
+                "object": "list",
+                "model": body.get("model", "stub-embedding"),
+                "data": [{"object": "embedding", "index": i, "embedding": fake_embedding(str(text), self.embedding_dim)} for i, text in enumerate(texts)],
+                "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+            })
+        else:
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+
+_ATOM_HEADER = (
+    '<?xml version="1.0" encoding="UTF-8"?>\n'
+    '<feed xmlns="http://www.w3.org/2005/Atom" xmlns:opensearch="http://a9.com/-/spec/opensearch/1.1/" '
+    'xmlns:arxiv="http://arxiv.org/schemas/atom">\n'
+    '<id>https://arxiv.org/api/stub</id><title>Stub arXiv query</title><updated>{updated}</updated>\n'
+    '<opensearch:totalResults>{total}</opensearch:totalResults>'
+    '<opensearch:startIndex>{start}</opensearch:startIndex>'
+    '<opensearch:itemsPerPage>{per_page}</opensearch:itemsPerPage>\n'
+)
+
+class StubArxivHandler(_StubHandler):
+    """
+    The arXiv Atom API (/api/query: search_query or id_list) and the PDFs (/pdf/<id>).
+    Queries map onto a fixed pool of paper_pool papers, so different users' searches overlap
+    the way real traffic does and papers get reused instead of every search ingesting new ones.
+    """
+    pdf_latency = Latency()
+    paper_pool = 200
+    pdf_pages = 4
+    base_url = "" # Set by start_stub_servers; the PDF links point back at this server
+    _pdfs = {}
+    _pdfs_lock = threading.Lock()
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path.rstrip("/").endswith("/api/query"):
+            self.latency.sleep()
+            self._send(200, self._feed(parse_qs(url.query)).encode("utf-8"), "application/atom+xml")
+        elif url.path.startswith("/pdf/"):
+            self.pdf_latency.sleep()
+            self._send(200, self._pdf(url.path[len("/pdf/"):]), "application/pdf")
+        else:
+            self._send_json(404, {"error": f"Unknown path {self.path}"})
+
+    def _paper_id(self, number: int) -> str:
+        return f"2401.{number:05d}v1"
+
+    def _feed(self, params: dict) -> str:
+        start = int(params.get("start", ["0"])[0])
+        max_results = int(params.get("max_results", ["10"])[0])
+        if params.get("id_list", [""])[0]:
+            ids = [paper_id.strip() for paper_id in params["id_list"][0].split(",") if paper_id.strip()]
+            ids = [paper_id if "v" in paper_id else paper_id + "v1" for paper_id in ids]
+        else:
+            query = params.get("search_query", [""])[0]
+            rng = random.Random(_digest(query))
+            ids = [self._paper_id(number) for number in rng.sample(range(self.paper_pool), min(self.paper_pool, max(max_results, 1)))]
+        page = ids[start:start + max_results]
+        updated = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+        parts = [_ATOM_HEADER.format(updated=updated, total=len(ids), start=start, per_page=len(page))]
+        parts.extend(self._entry(paper_id) for paper_id in page)
+        parts.append("</feed>\n")
+        return "".join(parts)
+
+    def _entry(self, paper_id: str) -> str:
+        title = fake_text(paper_id + ":title", 8).rstrip(".")
+        authors = "".join(f"<author><name>Author {n} {paper_id[-4:]}</name></author>" for n in range(1, 4))
+        return (
+            f"<entry><id>http://arxiv.org/abs/{paper_id}</id>"
+            f"<updated>2024-01-15T00:00:00Z</updated><published>2024-01-15T00:00:00Z</published>"
+            f"<title>{escape(title)}</title><summary>{escape(fake_text(paper_id + ':abstract', 150))}</summary>{authors}"
+            f'<arxiv:primary_category term="cs.CL" scheme="http://arxiv.org/schemas/atom"/>'
+            f'<category term="cs.CL" scheme="http://arxiv.org/schemas/atom"/>'
+            f'<link href="http://arxiv.org/abs/{paper_id}" rel="alternate" type="text/html"/>'
+            f'<link title="pdf" href="{self.base_url}/pdf/{paper_id}" rel="related" type="application/pdf"/>'
+            f"</entry>\n"
+        )
+
+    def _pdf(self, paper_id: str) -> bytes:
+        with self._pdfs_lock:
+            pdf = self._pdfs.get(paper_id)
+            if pdf is None:
+                pdf = self._pdfs[paper_id] = make_pdf(paper_id, self.pdf_pages)
+            return pdf
+
+def make_pdf(paper_id: str, pages: int) -> bytes:
+    """A small text PDF with numbered sections, so extraction, cleaning and chunking do real work."""
+    import fitz # PyMuPDF, already an app dependency
+    doc = fitz.open()
+    for page_number in range(pages):
+        page = doc.new_page()
+        text = f"{page_number + 1} Section {page_number + 1}\n\n" + fake_text(f"{paper_id}:page{page_number}", 450)
+        page.insert_textbox(fitz.Rect(50, 50, 550, 800), text, fontsize=9)
+    pdf = doc.tobytes()
+    doc.close()
+    return pdf
+
+class _StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def process_request(self, request, client_address):
+        # Named threads, so the server's thread counts tell stub threads from the app's request threads
+        threading.Thread(target=self.process_request_thread, args=(request, client_address), name="stub-request", daemon=True).start()
+
+def start_stub_server(handler_cls, host: str = "127.0.0.1", port: int = 0):
+    """Serves handler_cls on a daemon thread; returns (server, base_url)."""
+    server = _StubServer((host, port), handler_cls)
+    threading.Thread(target=server.serve_forever, name=f"stub-{handler_cls.__name__}", daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+class LatencyQdrant:
+    """
+    An in-memory QdrantClient where every call first sleeps for the configured latency.
+    Newer qdrant-client releases dropped `search`; it is mapped onto query_points here so the
+    sync retrieval path runs against any installed version.
+    """
+    def __init__(self, latency: Latency):
+        from qdrant_client import QdrantClient
+        self._client = QdrantClient(location=":memory:")
+        self._lock = threading.Lock() # The local-mode client is not thread-safe; Qdrant's server is, but latency is what we model
+        self.latency = latency
+
+    def search(self, collection_name, query_vector, limit=10, query_filter=None, with_payload=True, with_vectors=False, **kwargs):
+        return self.query_points(
+            collection_name=collection_name, query=query_vector, limit=limit, query_filter=query_filter,
+            with_payload=with_payload, with_vectors=with_vectors,
+        ).points
+
+    def __getattr__(self, name):
+        attribute = getattr(self._client, name)
+        if not callable(attribute):
+            return attribute
+
+        def call(*args, **kwargs):
+            self.latency.sleep()
+            with self._lock:
+                return attribute(*args, **kwargs)
+        return call
+
+class AsyncLatencyQdrant:
+    """The AsyncQdrantClient face of a LatencyQdrant (same points), for the ASGI serving path."""
+    def __init__(self, sync_client: LatencyQdrant):
+        self._sync = sync_client
+
+    def __getattr__(self, name):
+        attribute = getattr(self._sync._client, name)
+        if not callable(attribute):
+            return attribute
+
+        async def call(*args, **kwargs):
+            await self._sync.latency.asleep()
+            with self._sync._lock: # Local mode is CPU-only and fast; holding the lock on the loop thread is fine here
+                return attribute(*args, **kwargs)
+        return call
+
+def start_stub_servers(llm_latency: Latency, embedding_latency: Latency, arxiv_latency: Latency, pdf_latency: Latency,
+                       embedding_dim: int = 64, paper_pool: int = 200, pdf_pages: int = 4) -> dict:
+    """Starts the LLM and arXiv stubs; returns their base URLs."""
+    llm_handler = type("LLMHandler", (StubLLMHandler,), {
+        "latency": llm_latency, "embedding_latency": embedding_latency, "embedding_dim": embedding_dim,
+    })
+    arxiv_handler = type("ArxivHandler", (StubArxivHandler,), {
+        "latency": arxiv_latency, "pdf_latency": pdf_latency, "paper_pool": paper_pool, "pdf_pages": pdf_pages,
+    })
+    _, llm_url = start_stub_server(llm_handler)
+    _, arxiv_url = start_stub_server(arxiv_handler)
+    arxiv_handler.base_url = arxiv_url
+    return {"llm": llm_url, "arxiv": arxiv_url}
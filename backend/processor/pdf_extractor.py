@@ -1,23 +1,28 @@
-import fitz  # PyMuPDF
 from pathlib import Path
-from typing import Union
+from typing import List, Union
 
-def extract_text_from_pdf(pdf_path: Union[str, Path]) -> str:
+def extract_pages_from_pdf(pdf_path: Union[str, Path]) -> List[str]:
     """
     Extracts raw text from a PDF using PyMuPDF (fitz).
-    Returns all pages concatenated into a single string.
+    Returns one string per page, in page order, so callers can keep page boundaries.
     """
     pdf_path = Path(pdf_path)
     if not pdf_path.exists():
         raise FileNotFoundError(f"PDF not found: {pdf_path}")
 
+    import fitz  # PyMuPDF, imported on first use to keep app startup fast
     try:
         doc = fitz.open(pdf_path)
-        text = ""
-        for page in doc:
-            text += page.get_text("text")
+        pages = [page.get_text("text") for page in doc]
         doc.close()
     except Exception as e:
         raise RuntimeError(f"Error extracting PDF text: {e}")
 
-    return text.strip()
\ No newline at end of file
+    return pages
+
+def extract_text_from_pdf(pdf_path: Union[str, Path]) -> str:
+    """
+    Extracts raw text from a PDF using PyMuPDF (fitz).
+    Returns all pages concatenated into a single string.
+    """
+    return "".join(extract_pages_from_pdf(pdf_path)).strip()
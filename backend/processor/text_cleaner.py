@@ -1,5 +1,4 @@
 import re
-import ftfy
 from typing import List
 
 class TextCleaner:
@@ -17,6 +16,8 @@ class TextCleaner:
         - Normalizes section titles and retains newlines
         - Removes redundant content
         """
+        import ftfy  # Imported on first use to keep app startup fast
+
         # Fix unicode issues
         text = ftfy.fix_text(text)
 
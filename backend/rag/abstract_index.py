@@ -0,0 +1,58 @@
+# rag/abstract_index.py
+"""
+Preliminary, abstract-level index. At search time every result's title + abstract is embedded
+(one batched call) into a single shared collection, so a paper can be chatted with right away,
+before its PDF has been downloaded, chunked and indexed.
+"""
+import uuid
+
+def abstract_point_id(paper_id: str) -> str:
+    """One point per paper, stable across re-runs."""
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"arxiv-abstract:{paper_id}"))
+
+def abstract_text(paper: dict) -> str:
+    return f"{paper.get('title', '')}\n\n{paper.get('abstract') or ''}".strip()
+
+def index_abstracts(
+    papers: list[dict],     # Each with 'paper_id', 'title', 'abstract'
+    collection_name: str,
+    qdrant_client_instance,
+    create_collection_func,
+    embedding_func,         # Called once for all abstracts
+    chunk_store=None,       # rag.chunk_store.ChunkStore; when given, the text is stored there instead of in the payload
+) -> list[str]:
+    """Embeds and upserts the abstracts; returns the paper_ids that were indexed."""
+    from qdrant_client.models import PointStruct
+
+    papers = [paper for paper in papers if paper.get("abstract")]
+    if not papers:
+        return []
+
+    vectors = embedding_func([abstract_text(paper) for paper in papers])
+    if vectors is None or len(vectors) != len(papers):
+        print(f"Error: Failed to generate abstract embeddings for {len(papers)} papers.")
+        return []
+
+    if not create_collection_func(collection_name, len(vectors[0])):
+        print(f"Error: Failed to create or ensure Qdrant collection: {collection_name}")
+        return []
+
+    points = [
+        PointStruct(
+            id=abstract_point_id(paper["paper_id"]),
+            vector=list(map(float, vector)),
+            payload={
+                "paper_id": paper["paper_id"],
+                "paper_title": paper.get("title", ""),
+                "chunk_id": abstract_point_id(paper["paper_id"]),
+                "section": "Abstract",
+                **({} if chunk_store else {"text": abstract_text(paper)}),
+            },
+        )
+        for paper, vector in zip(papers, vectors)
+    ]
+    if chunk_store:
+        for paper in papers:
+            chunk_store.put_many(paper["paper_id"], [(abstract_point_id(paper["paper_id"]), abstract_text(paper))])
+    qdrant_client_instance.upsert(collection_name=collection_name, points=points)
+    return [paper["paper_id"] for paper in papers]
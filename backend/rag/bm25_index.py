@@ -0,0 +1,196 @@
+# rag/bm25_index.py
+"""
+Local, per-collection BM25 index used alongside Qdrant's dense search.
+
+On disk each collection gets two files in the index directory:
+  <collection>.json            vocabulary (term -> [offset, length]), point IDs, document lengths, BM25 params
+  <collection>.<gen>.npy       postings as a uint32 (n, 2) array of (doc_index, term_frequency), sorted by term
+
+The postings file is memory-mapped at query time, so a lookup only touches the pages of the query terms.
+"""
+import json
+import math
+import os
+import re
+import threading
+import uuid
+from collections import Counter, OrderedDict
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+_TOKEN = re.compile(r'[a-z0-9]+(?:[.\-_/][a-z0-9]+)*')
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the this to was were which with we our".split()
+)
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercases and splits text into terms. Compound tokens such as "2303.08774", "gpt-4" or "bert_base"
+    are kept whole (for exact-identifier matches) and also emitted as their parts.
+    """
+    terms = []
+    for token in _TOKEN.findall(text.lower()):
+        if token in _STOPWORDS:
+            continue
+        terms.append(token)
+        parts = re.split(r'[.\-_/]', token)
+        if len(parts) > 1:
+            terms.extend(part for part in parts if part and part not in _STOPWORDS)
+    return terms
+
+def _meta_path(index_dir: str, collection_name: str) -> str:
+    return os.path.join(index_dir, f"{collection_name}.json")
+
+def build_bm25_index(index_dir: str, collection_name: str, documents: List[Tuple[str, str]], k1: float = 1.2, b: float = 0.75) -> None:
+    """
+    Builds (or replaces) the BM25 index for a collection.
+    documents: list of (point_id, text). Point IDs are what `BM25Index.search` returns.
+    """
+    os.makedirs(index_dir, exist_ok=True)
+
+    doc_ids = [point_id for point_id, _ in documents]
+    doc_lengths = []
+    postings_by_term: Dict[str, List[Tuple[int, int]]] = {}
+    for doc_index, (_, text) in enumerate(documents):
+        counts = Counter(tokenize(text))
+        doc_lengths.append(sum(counts.values()))
+        for term, tf in counts.items():
+            postings_by_term.setdefault(term, []).append((doc_index, tf))
+
+    vocab = {}
+    flat = []
+    for term in sorted(postings_by_term):
+        term_postings = postings_by_term[term]
+        vocab[term] = [len(flat), len(term_postings)]
+        flat.extend(term_postings)
+    postings = np.array(flat, dtype=np.uint32).reshape(-1, 2)
+
+    # Write postings under a fresh generation name first, then swap the metadata that points at it.
+    # Readers holding the previous mmap keep working until they reload.
+    postings_file = f"{collection_name}.{uuid.uuid4().hex[:8]}.npy"
+    np.save(os.path.join(index_dir, postings_file), postings)
+
+    meta_path = _meta_path(index_dir, collection_name)
+    previous_postings_file = None
+    if os.path.exists(meta_path):
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                previous_postings_file = json.load(f).get("postings_file")
+        except (OSError, ValueError):
+            pass
+
+    meta = {
+        "postings_file": postings_file,
+        "doc_ids": doc_ids,
+        "doc_lengths": doc_lengths,
+        "avg_doc_length": (sum(doc_lengths) / len(doc_lengths)) if doc_lengths else 0.0,
+        "k1": k1,
+        "b": b,
+        "vocab": vocab,
+    }
+    tmp_path = f"{meta_path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(meta, f, separators=(",", ":"))
+    os.replace(tmp_path, meta_path)
+
+    if previous_postings_file and previous_postings_file != postings_file:
+        try:
+            os.remove(os.path.join(index_dir, previous_postings_file))
+        except OSError:
+            pass
+
+def delete_bm25_index(index_dir: str, collection_name: str) -> None:
+    meta_path = _meta_path(index_dir, collection_name)
+    if not os.path.exists(meta_path):
+        return
+    try:
+        with open(meta_path, "r", encoding="utf-8") as f:
+            postings_file = json.load(f).get("postings_file")
+        if postings_file:
+            os.remove(os.path.join(index_dir, postings_file))
+    except (OSError, ValueError):
+        pass
+    os.remove(meta_path)
+
+class BM25Index:
+    def __init__(self, meta: dict, postings: np.ndarray):
+        self.doc_ids = meta["doc_ids"]
+        self.doc_lengths = np.asarray(meta["doc_lengths"], dtype=np.float32)
+        self.avg_doc_length = meta["avg_doc_length"] or 1.0
+        self.k1 = meta["k1"]
+        self.b = meta["b"]
+        self.vocab = meta["vocab"]
+        self.postings = postings
+        # Per-document length normalisation is query independent, so compute it once
+        self._length_norm = self.k1 * (1 - self.b + self.b * self.doc_lengths / self.avg_doc_length)
+
+    @classmethod
+    def load(cls, index_dir: str, collection_name: str) -> "BM25Index":
+        with open(_meta_path(index_dir, collection_name), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        postings = np.load(os.path.join(index_dir, meta["postings_file"]), mmap_mode="r")
+        return cls(meta, postings)
+
+    def search(self, query: str, limit: int) -> List[Tuple[str, float]]:
+        """Returns up to `limit` (point_id, bm25_score) pairs with a positive score, best first."""
+        n_docs = len(self.doc_ids)
+        if n_docs == 0:
+            return []
+        scores = np.zeros(n_docs, dtype=np.float32)
+        for term in set(tokenize(query)):
+            entry = self.vocab.get(term)
+            if entry is None:
+                continue
+            offset, df = entry
+            term_postings = self.postings[offset:offset + df]
+            docs = term_postings[:, 0]
+            tf = term_postings[:, 1].astype(np.float32)
+            idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+            scores[docs] += idf * tf * (self.k1 + 1) / (tf + self._length_norm[docs])
+
+        candidates = np.flatnonzero(scores > 0)
+        if candidates.size == 0:
+            return []
+        if candidates.size > limit:
+            candidates = candidates[np.argpartition(-scores[candidates], limit - 1)[:limit]]
+        ranked = candidates[np.argsort(-scores[candidates], kind="stable")]
+        return [(self.doc_ids[i], float(scores[i])) for i in ranked]
+
+# LRU of loaded indexes: each one keeps its vocabulary dict in memory (only the postings are mmapped)
+_loaded_indexes: OrderedDict[str, Tuple[float, BM25Index]] = OrderedDict()
+_loaded_indexes_lock = threading.Lock()
+
+def get_bm25_index(index_dir: str, collection_name: str, max_cached: int = 128) -> BM25Index | None:
+    """
+    Returns the (cached) index for a collection, reloading it when the metadata file has changed.
+    At most `max_cached` indexes stay loaded; the least recently used one is dropped first.
+    Returns None if the collection has no lexical index (e.g. it was indexed before BM25 existed).
+    """
+    meta_path = _meta_path(index_dir, collection_name)
+    try:
+        mtime = os.path.getmtime(meta_path)
+    except OSError:
+        return None
+    with _loaded_indexes_lock:
+        cached = _loaded_indexes.get(meta_path)
+        if cached and cached[0] == mtime:
+            _loaded_indexes.move_to_end(meta_path)
+            return cached[1]
+    index = BM25Index.load(index_dir, collection_name)
+    if max_cached <= 0:
+        return index
+    with _loaded_indexes_lock:
+        _loaded_indexes[meta_path] = (mtime, index)
+        _loaded_indexes.move_to_end(meta_path)
+        while len(_loaded_indexes) > max_cached:
+            _loaded_indexes.popitem(last=False)
+    return index
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """Fuses several ranked ID lists: score(id) = sum over lists of 1 / (k + rank). Best first."""
+    fused: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, item_id in enumerate(ranking, start=1):
+            fused[item_id] = fused.get(item_id, 0.0) + 1.0 / (k + rank)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
\ No newline at end of file
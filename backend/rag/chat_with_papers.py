@@ -4,22 +4,17 @@ from .format_context import format_llm_context # This can remain as is
 # import litellm # Remove if using llm_completion_func
 import os
 
-def chat_with_papers(
-    # selected_papers_metadata: list, # This will be handled by the calling service which prepares context
-    llm_context: str, # Directly pass the formatted context string
+def build_chat_request(
+    llm_context: str,
     query: str,
-    config, # Pass Flask app.config or relevant parts
-    llm_completion_func, # Pass the completion function
+    config,
     chat_history: list = None,
-    history_window: int = 10, # Consider making this configurable
-    # model_name will come from config
-    max_tokens: int = 4096, # Default, can be overridden by config
+    history_window: int = 10,
+    max_tokens: int = 4096,
     temperature: float = 0.0,
     top_p: float = 0.5,
 ) -> dict:
-    # context_dict = retrieve_context(selected_papers_metadata, query, top_k=5) # Moved to service layer
-    # llm_context = format_llm_context(context_dict) # Context is now passed directly
-
+    """Builds the completion kwargs (model, messages, sampling params) for a chat turn."""
     prompts_dir = config.get('PROMPTS_DIR', 'prompts/')
     model_name = config.get('LITELLM_MODEL_CHAT', 'gemini/gemini-2.0-flash')
     # max_tokens_chat = config.get('MAX_TOKENS_CHAT', max_tokens) # Allow override from config
@@ -57,7 +52,7 @@ def chat_with_papers(
     user_prompt = user_prompt_template.format(context=llm_context, user_query=query)
     messages.append({"role": "user", "content": user_prompt})
 
-    response = llm_completion_func(
+    return dict(
         model=model_name,
         messages=messages,
         max_tokens=max_tokens, # Use max_tokens_chat if defined
@@ -65,6 +60,8 @@ def chat_with_papers(
         top_p=top_p,
     )
 
+def parse_chat_response(response) -> dict:
+    """Turns a completion response into {'response': str, 'token_usage': dict}."""
     # ... (rest of your response parsing logic for content and token_usage remains the same)
     if hasattr(response, "choices"):
         content = response.choices[0].message.content
@@ -98,4 +95,39 @@ def chat_with_papers(
         "response": content,
         # "sources": context_dict, # This is now passed into the function as llm_context, sources are better handled by caller
         "token_usage": token_usage
-    }
\ No newline at end of file
+    }
+
+def chat_with_papers(
+    # selected_papers_metadata: list, # This will be handled by the calling service which prepares context
+    llm_context: str, # Directly pass the formatted context string
+    query: str,
+    config, # Pass Flask app.config or relevant parts
+    llm_completion_func, # Pass the completion function
+    chat_history: list = None,
+    history_window: int = 10, # Consider making this configurable
+    # model_name will come from config
+    max_tokens: int = 4096, # Default, can be overridden by config
+    temperature: float = 0.0,
+    top_p: float = 0.5,
+) -> dict:
+    # context_dict = retrieve_context(selected_papers_metadata, query, top_k=5) # Moved to service layer
+    # llm_context = format_llm_context(context_dict) # Context is now passed directly
+    request = build_chat_request(llm_context, query, config, chat_history, history_window, max_tokens, temperature, top_p)
+    response = llm_completion_func(**request)
+    return parse_chat_response(response)
+
+async def achat_with_papers(
+    llm_context: str,
+    query: str,
+    config,
+    allm_completion_func, # Async completion function, e.g. app.services.litellm_service.acompletion
+    chat_history: list = None,
+    history_window: int = 10,
+    max_tokens: int = 4096,
+    temperature: float = 0.0,
+    top_p: float = 0.5,
+) -> dict:
+    """Async variant of chat_with_papers."""
+    request = build_chat_request(llm_context, query, config, chat_history, history_window, max_tokens, temperature, top_p)
+    response = await allm_completion_func(**request)
+    return parse_chat_response(response)
\ No newline at end of file
@@ -1,67 +1,365 @@
 # rag/chunk_and_index.py
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from qdrant_client.models import PointStruct # VectorParams, Distance are used by create_collection_func
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+try:
+    import fcntl
+except ImportError: # Windows: only the in-process lock applies
+    fcntl = None
+from .bm25_index import build_bm25_index
+# langchain and qdrant_client are imported inside chunk_and_index_paper; both are slow to import
+
+MANIFEST_VERSION = 3 # 3: one collection per paper, shared by its arXiv versions
+# Per-chunk payload fields that can change without the chunk text changing
+CHUNK_METADATA_FIELDS = ("chunk_index", "section", "page_start", "page_end")
+
+# New-style ("2303.08774v2") and old-style ("hep-th/9901001v1") arXiv IDs with a version suffix
+_VERSIONED_ARXIV_ID = re.compile(r"^(?P<base>\d{4}\.\d{4,5}|[a-z\-]+(?:\.[A-Za-z]{2})?/\d{7})v\d+$")
+
+def base_paper_id(paper_id: str) -> str:
+    """The arXiv ID without its version ("2303.08774v2" -> "2303.08774"); other IDs are returned unchanged."""
+    match = _VERSIONED_ARXIV_ID.match(paper_id)
+    return match.group("base") if match else paper_id
+
+def _safe_name(paper_id: str) -> str:
+    return f"paper_{paper_id.replace('.', '_').replace(':', '_').replace('/', '_')}" # Make it more filesystem/URL safe
+
+def collection_name_for(paper_id: str) -> str:
+    """The Qdrant collection shared by every version of the paper."""
+    return _safe_name(base_paper_id(paper_id))
+
+def version_index_name(paper_id: str) -> str:
+    """
+    Per-version name: the BM25 index of this exact version, and the collection name used before versions
+    shared a collection (so a collection with this name holds only this version).
+    """
+    return _safe_name(paper_id)
+
+def chunk_point_id(chunk_text: str) -> str:
+    """
+    Derives a stable Qdrant point ID from the chunk content.
+    Qdrant only accepts unsigned ints or UUIDs, so the SHA-256 digest is folded into a UUID.
+    Identical text always maps to the same point, which is what makes incremental re-indexing possible.
+    """
+    digest = hashlib.sha256(chunk_text.encode("utf-8")).hexdigest()
+    return str(uuid.UUID(digest[:32]))
+
+def upsert_in_batches(
+    qdrant_client_instance,
+    collection_name: str,
+    points: list,
+    batch_size: int = 256,
+    parallel: int = 4,
+    max_retries: int = 3,
+    retry_backoff: float = 1.0, # Seconds before the first retry, doubled per retry
+) -> None:
+    """
+    Upserts `points` in batches of `batch_size`, `parallel` requests at a time.
+    Batches are sent with wait=False (acknowledged once queued, not once applied); a batch that fails
+    is retried on its own, so one bad request no longer discards the whole paper. When every batch
+    has been acknowledged, the last one is sent again with wait=True: the collection applies updates
+    in order, so that returns only after all earlier batches are searchable. Point IDs are content
+    hashes, so the repeat is a no-op write.
+    Raises the last error if a batch still fails after `max_retries` retries.
+    """
+    if not points:
+        return
+    batches = [points[i:i + batch_size] for i in range(0, len(points), batch_size)]
+
+    def send(batch, wait):
+        for attempt in range(max_retries + 1):
+            try:
+                qdrant_client_instance.upsert(collection_name=collection_name, points=batch, wait=wait)
+                return
+            except Exception as e:
+                if attempt == max_retries:
+                    raise
+                print(f"Warning: Upsert of {len(batch)} points to {collection_name} failed ({e}); retry {attempt + 1}/{max_retries}.")
+                time.sleep(retry_backoff * 2 ** attempt)
+
+    if len(batches) > 1:
+        with ThreadPoolExecutor(max_workers=max(1, min(parallel, len(batches) - 1))) as pool:
+            # list() re-raises the first batch that gave up
+            list(pool.map(lambda batch: send(batch, False), batches[:-1]))
+    send(batches[-1], True) # Consistency barrier
+
+def _manifest_path(manifest_dir: str, collection_name: str) -> str:
+    return os.path.join(manifest_dir, f"{collection_name}.json")
+
+def load_manifest(manifest_dir: str, collection_name: str) -> dict | None:
+    """Returns the stored manifest for a collection, or None if there is none (or it is unreadable)."""
+    if not manifest_dir:
+        return None
+    path = _manifest_path(manifest_dir, collection_name)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Warning: Could not read index manifest {path}: {e}. Falling back to a full re-index.")
+        return None
+    if manifest.get("version") != MANIFEST_VERSION:
+        return None
+    return manifest
+
+def _manifest_from_collection(qdrant_client_instance, collection_name: str) -> tuple[dict, list]:
+    """
+    Rebuilds a manifest from the points' payloads (manifest lost, or incremental indexing disabled).
+    Returns (manifest, IDs of points without version membership, e.g. from an older index format).
+    """
+    manifest = {"vector_size": None, "versions": {}}
+    unowned = []
+    if not qdrant_client_instance.collection_exists(collection_name=collection_name):
+        return manifest, unowned
+    manifest["vector_size"] = qdrant_client_instance.get_collection(collection_name=collection_name).config.params.vectors.size
+    offset = None
+    while True:
+        records, offset = qdrant_client_instance.scroll(
+            collection_name=collection_name, limit=1000, offset=offset,
+            with_payload=["paper_ids", "locations"], with_vectors=False,
+        )
+        for record in records:
+            locations = (record.payload or {}).get("locations") or {}
+            if not locations:
+                unowned.append(str(record.id))
+            for version, metadata in locations.items():
+                manifest["versions"].setdefault(version, {})[str(record.id)] = metadata
+        if offset is None:
+            return manifest, unowned
+
+def save_manifest(manifest_dir: str, collection_name: str, manifest: dict) -> None:
+    """Writes the manifest atomically so a crash mid-write never leaves a truncated file behind."""
+    os.makedirs(manifest_dir, exist_ok=True)
+    path = _manifest_path(manifest_dir, collection_name)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, path)
+
+# One indexing run per collection at a time: sibling versions share the collection and its manifest
+_collection_locks = {}
+_collection_locks_guard = threading.Lock()
+
+@contextmanager
+def collection_lock(manifest_dir: str | None, collection_name: str):
+    """
+    Serializes load manifest -> upsert/relabel -> save manifest for one collection. A thread lock covers
+    this process; a lock file next to the manifest covers other processes (flask ingest, other workers).
+    """
+    with _collection_locks_guard:
+        lock = _collection_locks.setdefault(collection_name, threading.Lock())
+    with lock:
+        if not manifest_dir or fcntl is None:
+            yield
+            return
+        os.makedirs(manifest_dir, exist_ok=True)
+        with open(f"{_manifest_path(manifest_dir, collection_name)}.lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def discard_manifest(manifest_dir: str | None, collection_name: str) -> None:
+    """Forgets what a collection holds, so its next indexing run starts from the collection itself."""
+    if not manifest_dir:
+        return
+    try:
+        os.remove(_manifest_path(manifest_dir, collection_name))
+    except FileNotFoundError:
+        pass
 
 def chunk_and_index_paper(
     paper_id: str,
     paper_title: str,
-    paper_text: str,
+    paper_text: str | None,
     qdrant_client_instance, # Pass the initialized Qdrant client
     create_collection_func, # Pass app.services.qdrant_client_setup.create_qdrant_collection
     embedding_func,         # Pass app.services.embedding_service.get_embedding
     chunk_size: int = 2000, # Consider making these configurable via app.config
-    chunk_overlap: int = 300
+    chunk_overlap: int = 300,
+    manifest_dir: str | None = None, # Where per-paper index manifests live; None disables incremental indexing
+    embedding_model: str | None = None, # Recorded in the manifest; a different model forces a full re-embed
+    chunks: list[dict] | None = None, # Pre-built chunks from rag.structure_chunker; paper_text is ignored when given
+    bm25_dir: str | None = None, # Where to write the local lexical index; None skips it
+    upsert_batch_size: int = 256, # Points per upsert request
+    upsert_parallel: int = 4,     # Upsert requests in flight
+    upsert_retries: int = 3,      # Retries per failed batch
+    chunk_store=None,             # rag.chunk_store.ChunkStore; when given, chunk text is stored there instead of in the Qdrant payload
+    invalidate_versions_func=None, # Called with the other versions whose points an embedding model change removed
+    collection_error_func=None,   # Called with (collection_name, error) when a write fails; returns True if the collection is gone
+    delete_collection_func=None,  # Pass app.services.qdrant_client_setup.delete_qdrant_collection; recreates it when a new model changes the vector size
 ):
-    # Collection name might need to be more globally unique or versioned if re-indexing is possible
-    # For ArXiv, paper_id usually includes version, e.g., "2303.08774v1"
-    collection_name = f"paper_{paper_id.replace('.', '_').replace(':', '_').replace('/', '_')}" # Make it more filesystem/URL safe
+    from qdrant_client.models import PointStruct, PointIdsList, SetPayload, SetPayloadOperation # VectorParams, Distance are used by create_collection_func
 
-    splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
-    chunks = splitter.split_text(paper_text)
+    # All arXiv versions of a paper share one collection; a point belongs to the versions listed in its
+    # "paper_ids" payload. Identical chunks (most of them, between revisions) are embedded and stored once.
+    base_id = base_paper_id(paper_id)
+    collection_name = collection_name_for(paper_id)
+
+    if chunks is None:
+        from langchain.text_splitter import RecursiveCharacterTextSplitter
+        splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+        chunks = [{"text": chunk_text} for chunk_text in splitter.split_text(paper_text or "")]
 
     if not chunks:
         # current_app.logger.warning(f"No chunks generated for paper {paper_id}. Text might be too short or empty.")
         print(f"Warning: No chunks generated for paper {paper_id}. Text might be too short or empty.")
         return None # Or handle appropriately
 
-    # Assuming embedding_func returns a NumPy array as per your original code
-    vectors = embedding_func(chunks) # This now calls the service
-    if vectors is None or len(vectors) == 0:
-        # current_app.logger.error(f"Failed to generate embeddings for paper {paper_id}.")
-        print(f"Error: Failed to generate embeddings for paper {paper_id}.")
-        return None # Or raise an error
-    
-    vector_size = vectors.shape[1]
-
-    # Create collection if it doesn't exist using the passed function
-    # The create_collection_func should handle the logic of checking existence.
-    # It should also take vector_size as an argument.
-    if not create_collection_func(collection_name, vector_size):
-         # current_app.logger.error(f"Failed to create or ensure Qdrant collection: {collection_name}")
-         print(f"Error: Failed to create or ensure Qdrant collection: {collection_name}")
-         return None # Or raise error
-
-    points = [
-        PointStruct(
-            id=i, # Chunk index within the paper
-            vector=vector.tolist(),
-            payload={
-                "paper_id": paper_id,       # Original ArXiv ID
-                "paper_title": paper_title,
-                "chunk_id": i,
-                "text": chunk_text
+    # Point IDs are content hashes, so repeated text inside one paper collapses onto a single point.
+    current_chunks = {} # point_id -> (metadata, chunk_text), first occurrence wins
+    for i, chunk in enumerate(chunks):
+        metadata = {"chunk_index": i}
+        metadata.update({field: chunk[field] for field in CHUNK_METADATA_FIELDS if field in chunk})
+        current_chunks.setdefault(chunk_point_id(chunk["text"]), (metadata, chunk["text"]))
+
+    # Concurrent runs for sibling versions would each save a manifest built from their own view
+    with collection_lock(manifest_dir, collection_name):
+        stale_ids = [] # Points in the collection that no version accounts for
+        invalidated_versions = [] # Other versions whose points go with the old model; they must be re-indexed
+        manifest = load_manifest(manifest_dir, collection_name)
+        model_changed = bool(manifest and embedding_model and manifest.get("embedding_model") not in (None, embedding_model))
+        if model_changed:
+            invalidated_versions = sorted(v for v in manifest["versions"] if v != paper_id)
+            print(
+                f"Embedding model changed for {collection_name} ({manifest.get('embedding_model')} -> {embedding_model}). "
+                f"Re-embedding all chunks; other versions ({', '.join(invalidated_versions) or 'none'}) must be re-indexed."
+            )
+            stale_ids = sorted({pid for version_chunks in manifest["versions"].values() for pid in version_chunks})
+            manifest = {"vector_size": None, "versions": {}}
+        elif manifest is None:
+            # No (usable) manifest: recover what is stored from the payloads rather than re-embedding
+            manifest, stale_ids = _manifest_from_collection(qdrant_client_instance, collection_name)
+        versions = manifest["versions"] # versioned paper_id -> {point_id: metadata}
+
+        previous = versions.get(paper_id, {})
+        known_ids = {pid for version_chunks in versions.values() for pid in version_chunks}
+        versions[paper_id] = {pid: metadata for pid, (metadata, _) in current_chunks.items()}
+        in_other_versions = {pid for version, version_chunks in versions.items() if version != paper_id for pid in version_chunks}
+
+        new_ids = [pid for pid in current_chunks if pid not in known_ids]
+        reused_ids = [pid for pid in current_chunks if pid in known_ids and pid not in previous] # Embedded for a sibling version
+        moved_ids = [pid for pid in current_chunks if pid in previous and previous[pid] != current_chunks[pid][0]]
+        dropped_ids = [pid for pid in previous if pid not in current_chunks] # No longer in this version
+        # Stale points that are still current chunks keep their (content-hash) ID and are overwritten by the upsert
+        orphaned_ids = [pid for pid in dropped_ids if pid not in in_other_versions] + [pid for pid in stale_ids if pid not in current_chunks]
+        # Points that stay but whose version membership or location changed only need their payload rewritten
+        relabeled_ids = reused_ids + moved_ids + [pid for pid in dropped_ids if pid in in_other_versions]
+
+        if new_ids:
+            new_texts = [current_chunks[pid][1] for pid in new_ids]
+            # Assuming embedding_func returns a NumPy array as per your original code
+            vectors = embedding_func(new_texts) # This now calls the service
+            if vectors is None or len(vectors) == 0:
+                # current_app.logger.error(f"Failed to generate embeddings for paper {paper_id}.")
+                print(f"Error: Failed to generate embeddings for paper {paper_id}.")
+                return None # Or raise an error
+            vector_size = vectors.shape[1]
+        else:
+            vectors = []
+            vector_size = manifest["vector_size"]
+
+        if model_changed and qdrant_client_instance.collection_exists(collection_name=collection_name):
+            # create_collection_func trusts an existing collection, so a vector size change must be caught here
+            current_size = qdrant_client_instance.get_collection(collection_name=collection_name).config.params.vectors.size
+            if current_size != vector_size:
+                if not delete_collection_func:
+                    print(f"Error: {collection_name} holds {current_size}-dimensional vectors, the new embedding model produces {vector_size}. Delete the collection to re-index.")
+                    return None
+                print(f"Vector size changed for {collection_name} ({current_size} -> {vector_size}). Recreating the collection.")
+                if not delete_collection_func(collection_name):
+                    print(f"Error: Failed to delete {collection_name} for recreation.")
+                    return None
+
+        # Create collection if it doesn't exist using the passed function
+        # The create_collection_func should handle the logic of checking existence.
+        # It should also take vector_size as an argument.
+        if not create_collection_func(collection_name, vector_size):
+             # current_app.logger.error(f"Failed to create or ensure Qdrant collection: {collection_name}")
+             print(f"Error: Failed to create or ensure Qdrant collection: {collection_name}")
+             return None # Or raise error
+
+        def membership(pid):
+            member_versions = sorted(version for version, version_chunks in versions.items() if pid in version_chunks)
+            return {
+                "paper_ids": member_versions, # Retrieval filters on this
+                "locations": {version: versions[version][pid] for version in member_versions}, # chunk_index/section/pages per version
             }
-        )
-        for i, (vector, chunk_text) in enumerate(zip(vectors, chunks))
-    ]
 
-    try:
-        qdrant_client_instance.upsert(collection_name=collection_name, points=points)
-        # current_app.logger.info(f"Successfully indexed {len(chunks)} chunks for paper {paper_id} into {collection_name}.")
-        print(f"Successfully indexed {len(chunks)} chunks for paper {paper_id} into {collection_name}.")
-    except Exception as e:
-        # current_app.logger.error(f"Failed to upsert points to Qdrant for {collection_name}: {e}")
-        print(f"Error: Failed to upsert points to Qdrant for {collection_name}: {e}")
-        return None # Or raise error
-        
-    return collection_name
\ No newline at end of file
+        points = [
+            PointStruct(
+                id=pid,
+                vector=vector.tolist(),
+                payload={
+                    "paper_id": base_id,        # ArXiv ID without version (the chunk store key)
+                    "paper_title": paper_title,
+                    "chunk_id": pid,            # Content-hash ID, stable across re-indexing
+                    **membership(pid),
+                    **({} if chunk_store else {"text": current_chunks[pid][1]}),
+                }
+            )
+            for pid, vector in zip(new_ids, vectors)
+        ]
+
+        try:
+            if chunk_store:
+                # Text first, so a point is never searchable without it. Every current chunk is written
+                # (cheap, local), which also moves the text of points indexed before the store existed.
+                chunk_store.put_many(base_id, [(pid, text) for pid, (_, text) in current_chunks.items()])
+            upsert_in_batches(
+                qdrant_client_instance, collection_name, points,
+                batch_size=upsert_batch_size, parallel=upsert_parallel, max_retries=upsert_retries,
+            )
+            operations = [SetPayloadOperation(set_payload=SetPayload(payload=membership(pid), points=[pid])) for pid in relabeled_ids]
+            for start in range(0, len(operations), upsert_batch_size):
+                qdrant_client_instance.batch_update_points(collection_name=collection_name, update_operations=operations[start:start + upsert_batch_size])
+            if orphaned_ids:
+                qdrant_client_instance.delete(
+                    collection_name=collection_name,
+                    points_selector=PointIdsList(points=orphaned_ids),
+                )
+                if chunk_store:
+                    chunk_store.delete_many(base_id, orphaned_ids)
+            if invalidated_versions and invalidate_versions_func:
+                invalidate_versions_func(invalidated_versions)
+            # current_app.logger.info(f"Successfully indexed {len(chunks)} chunks for paper {paper_id} into {collection_name}.")
+            print(
+                f"Indexed paper {paper_id} into {collection_name}: {len(new_ids)} new, {len(reused_ids)} reused from other versions, "
+                f"{len(current_chunks) - len(new_ids) - len(reused_ids)} unchanged, {len(orphaned_ids)} orphaned removed."
+            )
+        except Exception as e:
+            # current_app.logger.error(f"Failed to upsert points to Qdrant for {collection_name}: {e}")
+            print(f"Error: Failed to upsert points to Qdrant for {collection_name}: {e}")
+            if collection_error_func and collection_error_func(collection_name, e):
+                discard_manifest(manifest_dir, collection_name) # Its points are gone: the next run indexes in full
+            return None # Or raise error
+
+        if bm25_dir:
+            # Lexical indexes stay per version, so lexical hits never come from a sibling version
+            bm25_name = version_index_name(paper_id)
+            unchanged = previous == versions[paper_id]
+            if not unchanged or not os.path.exists(os.path.join(bm25_dir, f"{bm25_name}.json")):
+                try:
+                    build_bm25_index(bm25_dir, bm25_name, [(pid, text) for pid, (_, text) in current_chunks.items()])
+                except Exception as e:
+                    # Lexical search is an enhancement; dense retrieval still works without it
+                    print(f"Warning: Failed to build BM25 index for {bm25_name}: {e}")
+
+        if manifest_dir:
+            save_manifest(manifest_dir, collection_name, {
+                "version": MANIFEST_VERSION,
+                "paper_id": base_id,
+                "embedding_model": embedding_model,
+                "vector_size": int(vector_size),
+                "versions": versions,
+            })
+
+        return collection_name
\ No newline at end of file
@@ -0,0 +1,93 @@
+# rag/chunk_store.py
+"""
+Local, compressed store of chunk text keyed by (paper_id, chunk_id).
+
+Qdrant points only carry IDs and location metadata (section, pages); the text lives here and is
+looked up in one batch after a search. This keeps the vector DB's payload storage and search
+responses small. Stored in SQLite so it survives restarts and is shared by every process on the
+host (web workers, `flask ingest`).
+"""
+import os
+import sqlite3
+import zlib
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Tuple
+
+def _zstd():
+    """zstandard is optional; without it texts are compressed with zlib."""
+    try:
+        import zstandard
+        return zstandard
+    except ImportError:
+        return None
+
+def compress_text(text: str) -> Tuple[str, bytes]:
+    """Returns (codec, blob)."""
+    data = text.encode("utf-8")
+    zstandard = _zstd()
+    if zstandard is not None:
+        return "zstd", zstandard.ZstdCompressor(level=9).compress(data)
+    return "zlib", zlib.compress(data, 9)
+
+def decompress_text(codec: str, blob: bytes) -> str:
+    if codec == "zstd":
+        zstandard = _zstd()
+        if zstandard is None:
+            raise RuntimeError("Chunk store holds zstd-compressed text but the zstandard package is not installed")
+        return zstandard.ZstdDecompressor().decompress(blob).decode("utf-8")
+    return zlib.decompress(blob).decode("utf-8")
+
+class ChunkStore:
+    # SQLite's default limit on host parameters per statement is 999 on older builds
+    _MAX_KEYS_PER_QUERY = 400
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL") # Readers don't block the writer (multiple workers)
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS chunks ("
+                " paper_id TEXT NOT NULL, chunk_id TEXT NOT NULL, codec TEXT NOT NULL, text BLOB NOT NULL,"
+                " PRIMARY KEY (paper_id, chunk_id)) WITHOUT ROWID"
+            )
+
+    @contextmanager
+    def _connect(self):
+        # One short-lived connection per call keeps this safe to use from any thread
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn: # Commits on success, rolls back on error
+                yield conn
+        finally:
+            conn.close()
+
+    def put_many(self, paper_id: str, items: Iterable[Tuple[str, str]]) -> int:
+        """Stores (chunk_id, text) pairs for a paper; existing entries are replaced."""
+        rows = [(paper_id, str(chunk_id), *compress_text(text)) for chunk_id, text in items]
+        with self._connect() as conn:
+            conn.executemany("INSERT OR REPLACE INTO chunks (paper_id, chunk_id, codec, text) VALUES (?, ?, ?, ?)", rows)
+        return len(rows)
+
+    def get_many(self, keys: List[Tuple[str, str]]) -> Dict[Tuple[str, str], str]:
+        """Texts for (paper_id, chunk_id) keys; keys that aren't stored are left out."""
+        texts = {}
+        keys = list(dict.fromkeys((paper_id, str(chunk_id)) for paper_id, chunk_id in keys))
+        with self._connect() as conn:
+            for start in range(0, len(keys), self._MAX_KEYS_PER_QUERY):
+                batch = keys[start:start + self._MAX_KEYS_PER_QUERY]
+                rows = conn.execute(
+                    "SELECT paper_id, chunk_id, codec, text FROM chunks WHERE (paper_id, chunk_id) IN "
+                    f"(VALUES {', '.join(['(?, ?)'] * len(batch))})",
+                    [value for key in batch for value in key],
+                ).fetchall()
+                for paper_id, chunk_id, codec, blob in rows:
+                    texts[(paper_id, chunk_id)] = decompress_text(codec, blob)
+        return texts
+
+    def get(self, paper_id: str, chunk_id: str) -> Optional[str]:
+        return self.get_many([(paper_id, chunk_id)]).get((paper_id, str(chunk_id)))
+
+    def delete_many(self, paper_id: str, chunk_ids: Iterable[str]) -> None:
+        with self._connect() as conn:
+            conn.executemany("DELETE FROM chunks WHERE paper_id = ? AND chunk_id = ?", [(paper_id, str(chunk_id)) for chunk_id in chunk_ids])
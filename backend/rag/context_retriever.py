@@ -1,21 +1,140 @@
 # rag/context_retriever.py
+import asyncio
 from typing import List, Dict
+from .bm25_index import get_bm25_index, reciprocal_rank_fusion
+from .chunk_and_index import version_index_name
+try:
+    from app.tracing import span # Spans join the request's trace when tracing is enabled in the app
+except ImportError: # Used outside the app
+    from contextlib import nullcontext
+    def span(name, kind="internal", **attributes):
+        return nullcontext()
 # No direct qdrant import needed here if client is passed
 # No direct embedding import if func is passed
 
+def label_chunk(payload: Dict) -> str:
+    """Prefixes chunk text with its section and page range (when indexed with them) so the LLM can cite them."""
+    section, page_start, page_end = payload.get("section"), payload.get("page_start"), payload.get("page_end")
+    if not section and page_start is None:
+        return payload["text"]
+    location = []
+    if section:
+        location.append(section)
+    if page_start is not None:
+        location.append(f"p. {page_start}" if page_start == page_end else f"pp. {page_start}-{page_end}")
+    return f"[{', '.join(location)}] {payload['text']}"
+
+def _point_filter(paper_meta: Dict):
+    """
+    Restricts a search to the paper's own points when its collection is shared: the abstract collection
+    (paper_meta carries 'point_ids'), or a collection shared by the paper's arXiv versions (points list
+    their versions in 'paper_ids'). None searches the whole collection.
+    """
+    from qdrant_client.models import Filter, HasIdCondition, FieldCondition, MatchValue
+    point_ids = paper_meta.get("point_ids")
+    if point_ids:
+        return Filter(must=[HasIdCondition(has_id=list(point_ids))])
+    if paper_meta.get("qdrant_collection_name") != version_index_name(paper_meta["arxiv_id"]):
+        return Filter(must=[FieldCondition(key="paper_ids", match=MatchValue(value=paper_meta["arxiv_id"]))])
+    return None # A per-version collection (indexed before versions shared collections)
+
+def _lexical_index(bm25_dir: str | None, paper_meta: Dict, bm25_cache_size: int):
+    # Lexical indexes are per version; there is none for a paper's points in the shared abstract collection
+    if not bm25_dir or paper_meta.get("point_ids"):
+        return None
+    return get_bm25_index(bm25_dir, version_index_name(paper_meta["arxiv_id"]), max_cached=bm25_cache_size)
+
+def _dense_hits(search_result) -> List:
+    # search_result is a list of ScoredPoint objects
+    # Add a score threshold if needed:
+    # relevant_hits = [hit for hit in search_result if hit.score > YOUR_SCORE_THRESHOLD]
+    return [hit for hit in search_result if hit.payload]
+
+def _fuse(dense_hits: List, lexical_hits: List, top_k: int, rrf_k: int):
+    """
+    Reciprocal rank fusion of dense and lexical hits.
+    Returns (fused [(point_id, score)], points_by_id for the dense hits, point IDs whose payload still has to be fetched).
+    """
+    fused = reciprocal_rank_fusion(
+        [[str(hit.id) for hit in dense_hits], [point_id for point_id, _ in lexical_hits]],
+        k=rrf_k,
+    )[:top_k]
+    points_by_id = {str(hit.id): hit for hit in dense_hits}
+    missing_ids = [point_id for point_id, _ in fused if point_id not in points_by_id]
+    return fused, points_by_id, missing_ids
+
+def _paper_entry(paper_meta: Dict, scored_hits: List, with_vectors: bool) -> Dict:
+    # Chunk text is kept once per chunk; format_llm_context joins it for the prompt
+    chunks = []
+    for hit, score in scored_hits:
+        # Points shared by several versions keep each version's section/pages under "locations"
+        location = (hit.payload.get("locations") or {}).get(paper_meta["arxiv_id"]) or hit.payload
+        chunk_id = hit.payload.get("chunk_id", hit.id) # Use payload chunk_id if available, else point id
+        chunks.append({
+            "chunk_id": chunk_id,
+            "score": score, # Cosine similarity, or the fused RRF score when lexical search is enabled
+            "section": location.get("section"),
+            "page_start": location.get("page_start"),
+            "page_end": location.get("page_end"),
+            "text": hit.payload.get("text"), # None when the text lives in the chunk store (filled in by _fill_chunk_texts)
+            "_store_key": (hit.payload.get("paper_id", paper_meta["arxiv_id"]), str(chunk_id)),
+            **({"vector": hit.vector} if with_vectors and hit.vector is not None else {})
+        })
+    return {
+        "title": paper_meta["title"],
+        "db_id": paper_meta.get("db_id"), # Lets the client fetch full chunk text by DB ID
+        "_chunks": chunks,
+    }
+
+def _fill_chunk_texts(context_dict: Dict, chunk_store) -> None:
+    """
+    Looks up the text of every retrieved chunk whose payload doesn't carry it, in one batch across all papers.
+    Chunks whose text can't be found are dropped.
+    """
+    keys = [chunk["_store_key"] for entry in context_dict.values() for chunk in entry["_chunks"] if chunk["text"] is None]
+    with span("chunk_store.get_many", keys=len(keys)):
+        texts = chunk_store.get_many(keys) if keys and chunk_store else {}
+    for paper_id, entry in context_dict.items():
+        chunks = []
+        for chunk in entry["_chunks"]:
+            store_key = chunk.pop("_store_key") # Stored under the unversioned ID of the payload
+            if chunk["text"] is None:
+                chunk["text"] = texts.get(store_key)
+            if chunk["text"] is None:
+                print(f"Warning: No text stored for chunk {chunk['chunk_id']} of paper {paper_id}. Skipping it.")
+                continue
+            chunks.append(chunk)
+        entry["_chunks"] = chunks
+
+def _error_entry(paper_meta: Dict) -> Dict:
+    return { # Provide empty context on error for this paper
+        "title": paper_meta["title"],
+        "db_id": paper_meta.get("db_id"),
+        "error": "Error retrieving context for this paper.",
+        "_chunks": []
+    }
+
 def retrieve_context(
     selected_papers_metadata: List[Dict], # Expects list of PaperMetadata like dicts with 'arxiv_id' and 'title', 'qdrant_collection_name'
     query: str,
     qdrant_client_instance, # Pass the initialized Qdrant client
     embedding_func,         # Pass app.services.embedding_service.get_embedding
-    top_k: int = 5
+    top_k: int = 3,
+    bm25_dir: str | None = None, # Local BM25 indexes written at indexing time; None means dense-only retrieval
+    bm25_cache_size: int = 128,  # BM25 indexes kept loaded in this process (LRU)
+    rrf_k: int = 60,             # Reciprocal rank fusion constant
+    candidate_multiplier: int = 3, # Each retriever proposes top_k * candidate_multiplier hits before fusion
+    query_vector=None,           # Precomputed query embedding; computed with embedding_func when None
+    with_vectors: bool = False,  # Include each chunk's vector (as "vector") for post-retrieval diversification
+    chunk_store=None,            # rag.chunk_store.ChunkStore holding the text of chunks indexed without it
+    collection_error_func=None,  # Called with (collection_name, error) when a paper's search fails
 ) -> Dict:
     context_dict = {}
-    query_vector = embedding_func([query])[0] # Get embedding for the query
+    if query_vector is None:
+        query_vector = embedding_func([query])[0] # Get embedding for the query
 
     for paper_meta in selected_papers_metadata:
         paper_id = paper_meta["arxiv_id"] # Use the DB arxiv_id
-        paper_title = paper_meta["title"]
         # collection_name = f"paper_{paper_id.replace('.', '_').replace(':', '_').replace('/', '_')}"
         collection_name = paper_meta.get("qdrant_collection_name")
 
@@ -25,41 +144,143 @@ def retrieve_context(
             continue
         
         try:
+            lexical_index = _lexical_index(bm25_dir, paper_meta, bm25_cache_size)
+            candidate_limit = top_k * candidate_multiplier if lexical_index else top_k
+
             # Qdrant's search method was renamed to query_points previously, now it's search
-            search_result = qdrant_client_instance.search(
-                collection_name=collection_name,
-                query_vector=query_vector.tolist(), # Ensure it's a list
-                limit=top_k,
-                with_payload=True # To get the text and other metadata
-            )
-            # search_result is a list of ScoredPoint objects
-            # combined_text = "\n".join([hit.payload["text"] for hit in search_result]) # search_result is already a list of points
-            
-            # Filter out low-scoring results if necessary, though `limit` handles top_k
-            # Some vector DBs might return results even with very low scores.
-            # Add a score threshold if needed:
-            # relevant_hits = [hit for hit in search_result if hit.score > YOUR_SCORE_THRESHOLD]
-
-            combined_text = "\n\n---\n\n".join([hit.payload["text"] for hit in search_result if hit.payload and "text" in hit.payload])
-
-            context_dict[paper_id] = {
-                "title": paper_title,
-                "text": combined_text,
-                "_chunks": [
-                    {
-                        "chunk_id": hit.payload.get("chunk_id", hit.id), # Use payload chunk_id if available, else point id
-                        "score": hit.score,
-                        "text": hit.payload["text"]
-                    }
-                    for hit in search_result if hit.payload and "text" in hit.payload
-                ]
-            }
+            with span("qdrant.search", "client", collection=collection_name, paper_id=paper_id, limit=candidate_limit):
+                search_result = qdrant_client_instance.search(
+                    collection_name=collection_name,
+                    query_vector=query_vector.tolist(), # Ensure it's a list
+                    query_filter=_point_filter(paper_meta),
+                    limit=candidate_limit,
+                    with_payload=True, # Chunk ID and location metadata (and the text, for points indexed without a chunk store)
+                    with_vectors=with_vectors
+                )
+            dense_hits = _dense_hits(search_result)
+
+            if lexical_index:
+                # Exact terms (dataset names, equation names, arXiv IDs) are often missed by dense search alone
+                with span("bm25.search", paper_id=paper_id, limit=candidate_limit):
+                    lexical_hits = lexical_index.search(query, limit=candidate_limit)
+                fused, points_by_id, missing_ids = _fuse(dense_hits, lexical_hits, top_k, rrf_k)
+                if missing_ids:
+                    with span("qdrant.retrieve", "client", collection=collection_name, ids=len(missing_ids)):
+                        records = qdrant_client_instance.retrieve(collection_name=collection_name, ids=missing_ids, with_payload=True, with_vectors=with_vectors)
+                    for record in records:
+                        if record.payload:
+                            points_by_id[str(record.id)] = record
+                scored_hits = [(points_by_id[point_id], score) for point_id, score in fused if point_id in points_by_id]
+            else:
+                scored_hits = [(hit, hit.score) for hit in dense_hits]
+
+            context_dict[paper_id] = _paper_entry(paper_meta, scored_hits, with_vectors)
         except Exception as e:
             # current_app.logger.error(f"Error retrieving context from Qdrant for {collection_name} with query '{query}': {e}")
             print(f"Error retrieving context from Qdrant for {collection_name}: {e}")
-            context_dict[paper_id] = { # Provide empty context on error for this paper
-                "title": paper_title,
-                "text": "Error retrieving context for this paper.",
-                "_chunks": []
-            }
-    return context_dict
\ No newline at end of file
+            if collection_error_func:
+                collection_error_func(collection_name, e)
+            context_dict[paper_id] = _error_entry(paper_meta)
+    _fill_chunk_texts(context_dict, chunk_store)
+    return context_dict
+
+async def aretrieve_context(
+    selected_papers_metadata: List[Dict],
+    query: str,
+    async_qdrant_client_instance, # qdrant_client.AsyncQdrantClient
+    query_vector,                 # Precomputed query embedding (embed asynchronously before calling)
+    top_k: int = 3,
+    bm25_dir: str | None = None,
+    bm25_cache_size: int = 128,
+    rrf_k: int = 60,
+    candidate_multiplier: int = 3,
+    with_vectors: bool = False,
+    chunk_store=None,
+    collection_error_func=None,
+) -> Dict:
+    """Async variant of retrieve_context; the per-paper searches run concurrently."""
+
+    async def retrieve_one(paper_meta):
+        collection_name = paper_meta.get("qdrant_collection_name")
+        try:
+            lexical_index = _lexical_index(bm25_dir, paper_meta, bm25_cache_size)
+            candidate_limit = top_k * candidate_multiplier if lexical_index else top_k
+            # query_points is the search API that AsyncQdrantClient supports across client versions
+            with span("qdrant.search", "client", collection=collection_name, paper_id=paper_meta["arxiv_id"], limit=candidate_limit):
+                search_result = await async_qdrant_client_instance.query_points(
+                    collection_name=collection_name,
+                    query=query_vector.tolist(),
+                    query_filter=_point_filter(paper_meta),
+                    limit=candidate_limit,
+                    with_payload=True,
+                    with_vectors=with_vectors
+                )
+            dense_hits = _dense_hits(search_result.points)
+            if lexical_index:
+                with span("bm25.search", paper_id=paper_meta["arxiv_id"], limit=candidate_limit):
+                    lexical_hits = lexical_index.search(query, limit=candidate_limit)
+                fused, points_by_id, missing_ids = _fuse(dense_hits, lexical_hits, top_k, rrf_k)
+                if missing_ids:
+                    with span("qdrant.retrieve", "client", collection=collection_name, ids=len(missing_ids)):
+                        records = await async_qdrant_client_instance.retrieve(collection_name=collection_name, ids=missing_ids, with_payload=True, with_vectors=with_vectors)
+                    for record in records:
+                        if record.payload:
+                            points_by_id[str(record.id)] = record
+                scored_hits = [(points_by_id[point_id], score) for point_id, score in fused if point_id in points_by_id]
+            else:
+                scored_hits = [(hit, hit.score) for hit in dense_hits]
+            return _paper_entry(paper_meta, scored_hits, with_vectors)
+        except Exception as e:
+            print(f"Error retrieving context from Qdrant for {collection_name}: {e}")
+            if collection_error_func:
+                collection_error_func(collection_name, e)
+            return _error_entry(paper_meta)
+
+    papers = []
+    for paper_meta in selected_papers_metadata:
+        if not paper_meta.get("qdrant_collection_name"):
+            print(f"Warning: Qdrant collection name not found for paper {paper_meta['arxiv_id']}. Skipping context retrieval for this paper.")
+            continue
+        papers.append(paper_meta)
+    entries = await asyncio.gather(*(retrieve_one(paper_meta) for paper_meta in papers))
+    context_dict = {paper_meta["arxiv_id"]: entry for paper_meta, entry in zip(papers, entries)}
+    await asyncio.to_thread(_fill_chunk_texts, context_dict, chunk_store) # SQLite lookup
+    return context_dict
+
+def load_paper_chunks(
+    paper_meta: Dict,       # PaperMetadata like dict with 'arxiv_id', 'title', 'qdrant_collection_name'
+    qdrant_client_instance,
+    chunk_store=None,       # rag.chunk_store.ChunkStore holding the text of chunks indexed without it
+    scroll_limit: int = 256,
+) -> List[Dict]:
+    """
+    All indexed chunks of one paper version in document order (by chunk_index), with their text.
+    Used by whole-paper operations such as full-text summarization, where a similarity search doesn't fit.
+    """
+    collection_name = paper_meta.get("qdrant_collection_name")
+    if not collection_name:
+        print(f"Warning: Qdrant collection name not found for paper {paper_meta['arxiv_id']}. No chunks to load.")
+        return []
+
+    records, offset = [], None
+    while True:
+        batch, offset = qdrant_client_instance.scroll(
+            collection_name=collection_name,
+            scroll_filter=_point_filter(paper_meta),
+            limit=scroll_limit,
+            offset=offset,
+            with_payload=True,
+            with_vectors=False,
+        )
+        records.extend(batch)
+        if offset is None:
+            break
+
+    def chunk_index(record):
+        location = (record.payload.get("locations") or {}).get(paper_meta["arxiv_id"]) or record.payload
+        return location.get("chunk_index", 0)
+
+    records = sorted((record for record in records if record.payload), key=chunk_index)
+    context_dict = {paper_meta["arxiv_id"]: _paper_entry(paper_meta, [(record, None) for record in records], False)}
+    _fill_chunk_texts(context_dict, chunk_store)
+    return [{key: value for key, value in chunk.items() if key != "score"} for chunk in context_dict[paper_meta["arxiv_id"]]["_chunks"]]
@@ -0,0 +1,107 @@
+# rag/context_selection.py
+"""
+Post-retrieval selection: pools the hits from every selected paper, drops near-duplicate chunks
+(overlapping windows, repeated boilerplate) and fills a global chunk budget with MMR
+(maximal marginal relevance) so the prompt carries relevant but non-redundant context.
+"""
+import zlib
+from typing import Dict, List, Optional
+
+import numpy as np
+
+def _shingles(text: str, size: int) -> frozenset:
+    """Hashed word n-grams; crc32 keeps the sets small and cheap to intersect."""
+    words = text.lower().split()
+    if len(words) <= size:
+        return frozenset([zlib.crc32(" ".join(words).encode("utf-8"))])
+    return frozenset(zlib.crc32(" ".join(words[i:i + size]).encode("utf-8")) for i in range(len(words) - size + 1))
+
+def _jaccard(a: frozenset, b: frozenset) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+def select_context(
+    context_dict: Dict,             # Output of retrieve_context (ideally with_vectors=True)
+    query_vector=None,              # Query embedding; without it MMR falls back to the retrieval scores
+    chunk_budget: int = 6,          # Max chunks across all papers
+    max_per_paper: Optional[int] = None,
+    mmr_lambda: float = 0.7,        # 1.0 = pure relevance, 0.0 = pure diversity
+    duplicate_threshold: float = 0.8, # Shingle Jaccard similarity at which two chunks count as duplicates
+    shingle_size: int = 5,
+) -> Dict:
+    """
+    Returns a new context dict in the same shape as retrieve_context's, containing only the selected
+    chunks (best first within each paper). Chunk vectors are stripped from the result.
+    Papers whose retrieval failed (no chunks at all) are passed through unchanged.
+    """
+    candidates = []
+    for paper_id, paper_data in context_dict.items():
+        for chunk in paper_data.get("_chunks", []):
+            candidates.append({"paper_id": paper_id, "chunk": chunk, "shingles": _shingles(chunk["text"], shingle_size)})
+
+    vectors = None
+    if query_vector is not None and candidates and all(c["chunk"].get("vector") is not None for c in candidates):
+        vectors = np.asarray([c["chunk"]["vector"] for c in candidates], dtype=np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True) + 1e-12
+        query = np.asarray(query_vector, dtype=np.float32)
+        query /= np.linalg.norm(query) + 1e-12
+        relevance = vectors @ query
+    else:
+        relevance = np.asarray([c["chunk"].get("score") or 0.0 for c in candidates], dtype=np.float32)
+    # Min-max to [0, 1], the range of the redundancy term: fused (RRF) scores are ~0.01-0.03, and on
+    # that scale MMR would be decided by diversity alone
+    if relevance.size:
+        spread = float(relevance.max() - relevance.min())
+        relevance = (relevance - relevance.min()) / spread if spread > 0 else np.ones_like(relevance)
+
+    # 1. Near-duplicate removal, keeping the most relevant copy
+    kept = []
+    for index in np.argsort(-relevance, kind="stable"):
+        shingles = candidates[index]["shingles"]
+        if any(_jaccard(shingles, candidates[other]["shingles"]) >= duplicate_threshold for other in kept):
+            continue
+        kept.append(int(index))
+
+    # 2. MMR over the pooled survivors
+    selected: List[int] = []
+    per_paper: Dict[str, int] = {}
+    remaining = list(kept)
+    while remaining and len(selected) < chunk_budget:
+        best_index, best_score = None, None
+        for index in remaining:
+            paper_id = candidates[index]["paper_id"]
+            if max_per_paper is not None and per_paper.get(paper_id, 0) >= max_per_paper:
+                continue
+            if selected:
+                if vectors is not None:
+                    redundancy = float(np.max(vectors[selected] @ vectors[index]))
+                else:
+                    redundancy = max(_jaccard(candidates[index]["shingles"], candidates[other]["shingles"]) for other in selected)
+            else:
+                redundancy = 0.0
+            score = mmr_lambda * float(relevance[index]) - (1 - mmr_lambda) * redundancy
+            if best_score is None or score > best_score:
+                best_index, best_score = index, score
+        if best_index is None:
+            break
+        selected.append(best_index)
+        remaining.remove(best_index)
+        paper_id = candidates[best_index]["paper_id"]
+        per_paper[paper_id] = per_paper.get(paper_id, 0) + 1
+
+    selected_by_paper: Dict[str, List[Dict]] = {}
+    for index in selected:
+        chunk = {key: value for key, value in candidates[index]["chunk"].items() if key != "vector"}
+        selected_by_paper.setdefault(candidates[index]["paper_id"], []).append(chunk)
+
+    selected_context = {}
+    for paper_id, paper_data in context_dict.items():
+        if not paper_data.get("_chunks"):
+            selected_context[paper_id] = paper_data # e.g. carries "error" when retrieval failed
+            continue
+        chunks = selected_by_paper.get(paper_id)
+        if not chunks:
+            continue # Nothing from this paper survived the budget
+        selected_context[paper_id] = {**paper_data, "_chunks": chunks}
+    return selected_context
\ No newline at end of file
@@ -1,9 +1,36 @@
+from .context_retriever import label_chunk
+
 def format_llm_context(context_dict):
     context_parts = []
     for paper_id, paper_data in context_dict.items():
+        chunks = paper_data.get("_chunks") or []
+        content = "\n\n---\n\n".join(label_chunk(chunk) for chunk in chunks) or paper_data.get("error", "")
         context_parts.append(
             f"=== Paper: {paper_id} ===\n"
             f"Title: {paper_data['title']}\n"
-            f"Content:\n{paper_data['text']}\n"
+            f"Content:\n{content}\n"
         )
-    return "\n".join(context_parts)
\ No newline at end of file
+    return "\n".join(context_parts)
+
+def build_source_refs(context_dict, snippet_chars=200):
+    """
+    Turns a context dict into the compact source list returned to the client:
+    one reference per chunk, with a short snippet instead of the full chunk text.
+    Full text is served on demand by the chunk endpoint.
+    """
+    sources = []
+    for paper_id, paper_data in context_dict.items():
+        for chunk in paper_data.get("_chunks") or []:
+            text = chunk.get("text", "")
+            snippet = text if len(text) <= snippet_chars else text[:snippet_chars].rsplit(" ", 1)[0] + "..."
+            sources.append({
+                "paper_id": paper_id,
+                "db_id": paper_data.get("db_id"),
+                "chunk_id": chunk.get("chunk_id"),
+                "score": round(float(chunk["score"]), 4) if chunk.get("score") is not None else None,
+                "section": chunk.get("section"),
+                "page_start": chunk.get("page_start"),
+                "page_end": chunk.get("page_end"),
+                "snippet": snippet,
+            })
+    return sources
\ No newline at end of file
@@ -0,0 +1,177 @@
+# rag/structure_chunker.py
+import re
+from functools import lru_cache
+from typing import Callable, List, Dict, Optional
+
+# Section numbers: "3", "4.2.", or appendix letters in "A." / "A.1" form only. A bare capital letter is
+# how ordinary wrapped lines start ("A Deep Network For Graph Classification"), so it is not a number.
+_SECTION_NUMBER = r'(?:\d{1,2}(?:\.\d{1,2}){0,3}\.?|[A-Z](?:\.\d{1,2}){1,3}\.?|[A-Z]\.)'
+# Headings such as "3 Method", "4.2. Training Details" or "A.1 Proofs". Kept deliberately short and
+# without a trailing full stop so wrapped sentences that happen to start with a number are not matched.
+_NUMBERED_HEADING = re.compile(rf'^{_SECTION_NUMBER}\s+([A-Z][^.!?]{{1,80}})$')
+_NAMED_HEADINGS = {
+    "abstract", "introduction", "background", "related work", "method", "methods", "methodology",
+    "approach", "experiments", "experimental setup", "results", "evaluation", "discussion",
+    "conclusion", "conclusions", "limitations", "future work", "acknowledgements", "acknowledgments",
+    "references", "bibliography", "appendix", "appendices",
+}
+_PAGE_NUMBER = re.compile(r'^\d{1,4}$')
+_ARXIV_STAMP = re.compile(r'^arXiv:\d+\.\d+(v\d+)?\s')
+_SENTENCE_SPLIT = re.compile(r'(?<=[.!?])\s+(?=[A-Z0-9(\[])')
+_APPROX_TOKEN = re.compile(r'\w+|[^\w\s]')
+
+DEFAULT_SECTION = "Front Matter"
+
+@lru_cache(maxsize=1)
+def _get_token_encoder():
+    """tiktoken is optional; without it token counts are approximated by word/punctuation pieces."""
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        return None
+
+def count_tokens(text: str) -> int:
+    encoder = _get_token_encoder()
+    if encoder is not None:
+        return len(encoder.encode(text, disallowed_special=()))
+    return len(_APPROX_TOKEN.findall(text))
+
+def detect_heading(line: str) -> Optional[str]:
+    """Returns the section title if `line` looks like a section heading, else None."""
+    if len(line) > 90 or len(line.split()) > 10:
+        return None
+    bare = re.sub(rf'^{_SECTION_NUMBER}\s+', '', line).strip().rstrip(':')
+    if bare.lower() in _NAMED_HEADINGS:
+        return bare.title()
+    match = _NUMBERED_HEADING.match(line)
+    if match:
+        return match.group(1).strip()
+    if line.isupper() and sum(c.isalpha() for c in line) >= 4 and len(line.split()) <= 6:
+        return line.title()
+    return None
+
+def split_into_sections(pages: List[str]) -> List[Dict]:
+    """
+    Walks the per-page text line by line and returns blocks of
+    {"section": str, "page": int, "text": str}, one per (section, page) run.
+    Page numbers are 1-based. Standalone page numbers and arXiv side stamps are dropped.
+    """
+    blocks = []
+    section = DEFAULT_SECTION
+
+    for page_number, page_text in enumerate(pages, start=1):
+        lines = []
+
+        def flush():
+            if lines:
+                blocks.append({"section": section, "page": page_number, "text": _join_lines(lines)})
+                lines.clear()
+
+        for raw_line in page_text.splitlines():
+            line = raw_line.strip()
+            if not line or _PAGE_NUMBER.match(line) or _ARXIV_STAMP.match(line):
+                continue
+            heading = detect_heading(line)
+            if heading:
+                flush()
+                section = heading
+                continue
+            lines.append(line)
+        flush()
+
+    return blocks
+
+def _join_lines(lines: List[str]) -> str:
+    """Joins PDF lines, re-attaching words hyphenated across a line break."""
+    text = ""
+    for line in lines:
+        if text.endswith("-") and line[:1].islower():
+            text = text[:-1] + line
+        elif text:
+            text += " " + line
+        else:
+            text = line
+    return text
+
+def _split_long_sentence(sentence: str, max_tokens: int) -> List[str]:
+    # A running per-word count: re-counting the growing piece after every word is quadratic on long
+    # unpunctuated runs (tables, reference lists)
+    words = sentence.split()
+    pieces, current, current_tokens = [], [], 0
+    for word in words:
+        current_tokens += count_tokens(f" {word}" if current else word)
+        current.append(word)
+        if current_tokens >= max_tokens:
+            pieces.append(" ".join(current))
+            current, current_tokens = [], 0
+    if current:
+        pieces.append(" ".join(current))
+    return pieces
+
+def chunk_pages(
+    pages: List[str],
+    clean_func: Optional[Callable[[str], str]] = None, # e.g. TextCleaner().clean, applied per block
+    max_tokens: int = 400,
+    overlap_tokens: int = 40,
+) -> List[Dict]:
+    """
+    Structure-aware chunking of the per-page output of `extract_pages_from_pdf`.
+    Chunks never cross a section boundary and are sized in tokens. Each chunk is a dict:
+    {"text", "section", "page_start", "page_end"}.
+    """
+    chunks = []
+    blocks = split_into_sections(pages)
+
+    # Group consecutive blocks of the same section (a section can span several pages)
+    sections = []
+    for block in blocks:
+        text = clean_func(block["text"]) if clean_func else block["text"]
+        if not text:
+            continue
+        if sections and sections[-1]["section"] == block["section"]:
+            sections[-1]["parts"].append((block["page"], text))
+        else:
+            sections.append({"section": block["section"], "parts": [(block["page"], text)]})
+
+    for section in sections:
+        # (page, sentence, tokens) units, so every chunk knows which pages it covers
+        units = []
+        for page, text in section["parts"]:
+            for sentence in _SENTENCE_SPLIT.split(text):
+                sentence = sentence.strip()
+                if not sentence:
+                    continue
+                tokens = count_tokens(sentence)
+                if tokens > max_tokens:
+                    for piece in _split_long_sentence(sentence, max_tokens):
+                        units.append((page, piece, count_tokens(piece)))
+                else:
+                    units.append((page, sentence, tokens))
+
+        current, current_tokens = [], 0
+        for unit in units:
+            if current and current_tokens + unit[2] > max_tokens:
+                chunks.append(_make_chunk(section["section"], current))
+                # Carry trailing sentences into the next chunk as overlap, still within the section
+                overlap, overlap_size = [], 0
+                for prev in reversed(current):
+                    if overlap_size + prev[2] > overlap_tokens:
+                        break
+                    overlap.insert(0, prev)
+                    overlap_size += prev[2]
+                current, current_tokens = overlap, overlap_size
+            current.append(unit)
+            current_tokens += unit[2]
+        if current:
+            chunks.append(_make_chunk(section["section"], current))
+
+    return chunks
+
+def _make_chunk(section: str, units: List[tuple]) -> Dict:
+    return {
+        "text": " ".join(unit[1] for unit in units),
+        "section": section,
+        "page_start": units[0][0],
+        "page_end": units[-1][0],
+    }
\ No newline at end of file
@@ -15,8 +15,7 @@ def get_collections():
     return qdrant.get_collections()
 
 def collection_exists(collection_name: str) -> bool:
-    collections = get_collections().collections
-    return any(c.name == collection_name for c in collections)
+    return qdrant.collection_exists(collection_name=collection_name) # Looks up one name instead of listing all collections
 
 def create_collection(collection_name: str, vector_size: int):
     if collection_exists(collection_name):
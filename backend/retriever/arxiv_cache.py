@@ -0,0 +1,65 @@
+# retriever/arxiv_cache.py
+"""
+Persistent cache of arXiv search results, keyed by (normalized query, max_results).
+Stored in a small SQLite file so it survives restarts and is shared by every worker process on the host.
+"""
+import datetime
+import json
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+def normalize_query(query: str) -> str:
+    """Case and whitespace differences don't change arXiv's answer, so they shouldn't miss the cache."""
+    return " ".join(query.lower().split())
+
+class ArxivQueryCache:
+    def __init__(self, path: str, ttl: float):
+        self.path = path
+        self.ttl = ttl
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL") # Readers don't block the writer (multiple workers)
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS arxiv_queries ("
+                " query TEXT NOT NULL, max_results INTEGER NOT NULL, results TEXT NOT NULL, fetched_at REAL NOT NULL,"
+                " PRIMARY KEY (query, max_results))"
+            )
+
+    @contextmanager
+    def _connect(self):
+        # One short-lived connection per call keeps this safe to use from any thread
+        conn = sqlite3.connect(self.path, timeout=10)
+        try:
+            with conn: # Commits on success, rolls back on error
+                yield conn
+        finally:
+            conn.close()
+
+    def get(self, query: str, max_results: int) -> Optional[List[Dict]]:
+        """Returns the cached results, or None on a miss or an expired entry."""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT results, fetched_at FROM arxiv_queries WHERE query = ? AND max_results = ?",
+                (normalize_query(query), max_results),
+            ).fetchone()
+        if row is None or row[1] + self.ttl < time.time():
+            return None
+        results = json.loads(row[0])
+        for result in results:
+            result["published"] = datetime.date.fromisoformat(result["published"])
+        return results
+
+    def set(self, query: str, max_results: int, results: List[Dict]) -> None:
+        serialized = json.dumps([{**result, "published": result["published"].isoformat()} for result in results])
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO arxiv_queries (query, max_results, results, fetched_at) VALUES (?, ?, ?, ?)",
+                (normalize_query(query), max_results, serialized, time.time()),
+            )
+
+    def purge_expired(self) -> int:
+        with self._connect() as conn:
+            return conn.execute("DELETE FROM arxiv_queries WHERE fetched_at < ?", (time.time() - self.ttl,)).rowcount
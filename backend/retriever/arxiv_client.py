@@ -1,28 +1,152 @@
-import arxiv
-from typing import List, Dict
+import threading
+import time
+from typing import Iterator, List, Dict
 
-def search_arxiv(query: str, max_results: int = 5) -> List[Dict]:
-    results = []
-    pdf_urls = []
-    client = arxiv.Client()
+def _result_to_dict(result) -> Dict:
+    return {
+        "title": result.title,
+        "paper_id": result.get_short_id(),
+        "authors": [author.name for author in result.authors],
+        "published": result.published.date(),
+        "pdf_url": result.pdf_url,
+        "entry_id": result.entry_id,
+        "source": "arXiv",
+        "abstract": result.summary,
+        # "obj": result,
+    }
+
+_clients = {}
+_clients_lock = threading.Lock()
+# arxiv.Client enforces its delay between its own requests only; funnelling every fetch in the
+# process through one lock makes the rate limit hold across request threads too.
+_fetch_lock = threading.Lock()
+
+def get_arxiv_client(page_size: int = 100, delay_seconds: float = 3.0, num_retries: int = 3):
+    """
+    Returns a process-wide arxiv.Client for these settings, so the client's rate limiting (delay between
+    requests) is shared instead of every call starting from a fresh client that knows nothing of the last one.
+    """
+    import arxiv  # Imported on first use to keep app startup fast
+    key = (page_size, delay_seconds, num_retries)
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = _clients[key] = arxiv.Client(page_size=page_size, delay_seconds=delay_seconds, num_retries=num_retries)
+        return client
+
+def _iter_results(client, search) -> Iterator:
+    results = client.results(search)
+    while True:
+        with _fetch_lock: # A page request happens inside next(); never hold the lock across a yield
+            result = next(results, None)
+        if result is None:
+            return
+        yield result
+
+def iter_arxiv(query: str, max_results: int = 5, client=None, cache=None) -> Iterator[Dict]:
+    """
+    Yields results one by one as the arxiv client parses them, so callers can start work on the first paper early.
+    client: shared arxiv.Client (see get_arxiv_client); a default one is used if omitted.
+    cache:  optional retriever.arxiv_cache.ArxivQueryCache; a fresh hit never touches the network.
+    """
+    import arxiv  # Imported on first use to keep app startup fast
+    if cache is not None:
+        cached = cache.get(query, max_results)
+        if cached is not None:
+            yield from cached
+            return
+
+    client = client or get_arxiv_client()
     search = arxiv.Search(
         query=query,
         max_results=max_results,
         sort_by=arxiv.SortCriterion.Relevance
     )
+    results = []
+    for result in _iter_results(client, search):
+        results.append(_result_to_dict(result))
+        yield results[-1]
+
+    if cache is not None:
+        cache.set(query, max_results, results) # Only complete result lists are cached
+
+def search_arxiv(query: str, max_results: int = 5, client=None, cache=None) -> List[Dict]:
+    results = list(iter_arxiv(query, max_results=max_results, client=client, cache=cache))
+    pdf_urls = [{"pdf_url": result["pdf_url"]} for result in results]
+    return results, pdf_urls
+
+def fetch_arxiv_metadata(id_list: List[str], client=None, batch_size: int = 100) -> List[Dict]:
+    """
+    Current metadata for known arXiv IDs, fetched with `id_list` queries of up to batch_size IDs each
+    (one API request per batch instead of one per paper). IDs arXiv doesn't know are skipped.
+    Versioned IDs ("2303.08774v1") return that version; bare IDs return the latest.
+    """
+    import arxiv  # Imported on first use to keep app startup fast
+    client = client or get_arxiv_client()
+    results = []
+    for start in range(0, len(id_list), batch_size):
+        batch = list(id_list[start:start + batch_size])
+        search = arxiv.Search(id_list=batch, max_results=len(batch))
+        results.extend(_result_to_dict(result) for result in _iter_results(client, search))
+    return results
+
+ARXIV_API_URL = "https://export.arxiv.org/api/query"
+_ATOM = "{http://www.w3.org/2005/Atom}"
+
+def _parse_atom_entry(entry) -> Dict:
+    """Maps one Atom <entry> to the same dict shape search_arxiv produces."""
+    import datetime
+    entry_id = entry.findtext(f"{_ATOM}id", "").strip()
+    pdf_url = next(
+        (link.get("href") for link in entry.findall(f"{_ATOM}link") if link.get("title") == "pdf"),
+        None,
+    )
+    published = entry.findtext(f"{_ATOM}published", "").strip()
+    return {
+        "title": " ".join(entry.findtext(f"{_ATOM}title", "").split()), # Atom titles carry hard line breaks
+        "paper_id": entry_id.split("/abs/")[-1],                         # Same as arxiv.Result.get_short_id()
+        "authors": [author.findtext(f"{_ATOM}name", "").strip() for author in entry.findall(f"{_ATOM}author")],
+        "published": datetime.datetime.fromisoformat(published.replace("Z", "+00:00")).date(),
+        "pdf_url": pdf_url,
+        "entry_id": entry_id,
+        "source": "arXiv",
+        "abstract": entry.findtext(f"{_ATOM}summary", "").strip(),
+    }
+
+# The async path doesn't go through arxiv.Client, so it spaces its requests itself: each one reserves
+# the next free slot (at least delay_seconds after the previous one) and sleeps until then. The lock is
+# only held to reserve, never across an await, so it works from any event loop or thread.
+_next_async_slot = 0.0
+_async_slot_lock = threading.Lock()
+
+def _reserve_async_slot(delay_seconds: float) -> float:
+    """Seconds to wait before this process's next async arXiv request may be sent."""
+    global _next_async_slot
+    with _async_slot_lock:
+        now = time.monotonic()
+        slot = max(now, _next_async_slot)
+        _next_async_slot = slot + delay_seconds
+    return slot - now
+
+async def asearch_arxiv(query: str, max_results: int = 5, timeout: float = 30.0, delay_seconds: float = 3.0):
+    """
+    Async variant of search_arxiv for the ASGI serving path.
+    The arxiv package is synchronous, so this queries the Atom API directly with httpx.
+    Requests from this process are at least delay_seconds apart, like the sync client's.
+    Returns (results, pdf_urls) like search_arxiv.
+    """
+    import asyncio
+    import httpx
+    import xml.etree.ElementTree as ET
 
-    for result in client.results(search):
-        results.append({
-            "title": result.title,
-            "paper_id": result.get_short_id(),
-            "authors": [author.name for author in result.authors],
-            "published": result.published.date(),
-            "pdf_url": result.pdf_url,
-            "entry_id": result.entry_id,
-            "source": "arXiv",
-            "abstract": result.summary,
-            # "obj": result,
-        })
-        pdf_urls.append({"pdf_url": result.pdf_url})
+    params = {"search_query": query, "start": 0, "max_results": max_results, "sortBy": "relevance"}
+    wait = _reserve_async_slot(delay_seconds)
+    if wait > 0:
+        await asyncio.sleep(wait)
+    async with httpx.AsyncClient(timeout=timeout, follow_redirects=True) as client:
+        response = await client.get(ARXIV_API_URL, params=params)
+        response.raise_for_status()
 
+    results = [_parse_atom_entry(entry) for entry in ET.fromstring(response.content).findall(f"{_ATOM}entry")]
+    pdf_urls = [{"pdf_url": result["pdf_url"]} for result in results]
     return results, pdf_urls
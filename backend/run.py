@@ -6,4 +6,10 @@ config_name = os.getenv('FLASK_CONFIG') or 'dev'
 app = create_app(config_name)
 
 if __name__ == '__main__':
+    # Heavy dependencies are imported lazily; load them before serving the first request.
+    # Not done at import time so `flask db ...` and other CLI commands stay fast.
+    # With the debug reloader, only the child process that actually serves requests warms up.
+    if not app.debug or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        from app.warmup import warmup
+        warmup(app)
     app.run(debug=app.config.get('DEBUG', True), host='0.0.0.0', port=int(os.environ.get('PORT', 5000)))
\ No newline at end of file
@@ -0,0 +1,116 @@
+# summarizer/full_text_summarizer.py
+"""
+Map-reduce summarization of a paper's full text.
+
+Map: the paper's chunks (in document order) are packed into groups of at most `group_tokens` tokens
+and every group is summarized concurrently. Reduce: the partial summaries are combined, again in
+concurrent token-bounded groups, level by level until one summary is left. With the default budgets
+a typical paper needs one map round and one reduce round, so the wall time is about two LLM round
+trips however many chunks the paper has.
+
+Like llm_summarizer, the functions take the config and the completion function as parameters; the
+completion function is expected to apply the process-wide LLM concurrency limit.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from rag.structure_chunker import count_tokens
+from .llm_summarizer import _read_prompt, parse_llm_content, parse_llm_usage
+
+def group_texts(texts: list[str], max_tokens: int) -> list[list[str]]:
+    """
+    Packs consecutive texts into groups of at most max_tokens tokens (order is kept).
+    A single text longer than the budget gets a group of its own.
+    """
+    groups, current, current_tokens = [], [], 0
+    for text in texts:
+        tokens = count_tokens(text)
+        if current and current_tokens + tokens > max_tokens:
+            groups.append(current)
+            current, current_tokens = [], 0
+        current.append(text)
+        current_tokens += tokens
+    if current:
+        groups.append(current)
+    return groups
+
+def _position(index: int, count: int) -> str:
+    return "the whole text" if count == 1 else f"part {index + 1} of {count}"
+
+def _load_full_summary_prompts(config):
+    prompts_dir = config.get('PROMPTS_DIR', 'prompts/')
+    return {
+        "map": (_read_prompt(prompts_dir, "sys_role_chunk_sum.txt"), _read_prompt(prompts_dir, "user_prompt_chunk_sum.txt")),
+        "reduce": (_read_prompt(prompts_dir, "sys_role_full_sum.txt"), _read_prompt(prompts_dir, "user_prompt_full_sum.txt")),
+    }
+
+def summarize_full_text(
+    chunks: list[dict],     # Ordered chunks, each with 'text' (and optionally 'section')
+    paper_title: str,
+    config,                 # Flask app.config or a relevant dict
+    llm_completion_func,    # Thread-safe completion function (called from worker threads)
+    max_workers: int = 8,   # Concurrent LLM calls per round
+    temperature: float = 0.0,
+    top_p: float = 0.5,
+) -> dict:
+    """
+    Returns {'summary', 'chunk_count', 'llm_calls', 'rounds', 'input_tokens', 'output_tokens'}.
+    Raises ValueError when there is no chunk text to summarize.
+    """
+    texts = [
+        f"[{chunk['section']}] {chunk['text']}" if chunk.get("section") else chunk["text"]
+        for chunk in chunks if chunk.get("text")
+    ]
+    if not texts:
+        raise ValueError("No chunk text to summarize.")
+
+    model_name = config.get('LITELLM_MODEL_FULL_SUMMARY') or config.get('LITELLM_MODEL_SUMMARIZE', 'gemini/gemini-2.0-flash')
+    group_tokens = config.get('FULL_SUMMARY_GROUP_TOKENS', 6000)
+    reduce_tokens = config.get('FULL_SUMMARY_REDUCE_TOKENS', 12000)
+    partial_max_tokens = config.get('FULL_SUMMARY_PARTIAL_MAX_TOKENS', 300)
+    final_max_tokens = config.get('FULL_SUMMARY_MAX_TOKENS', 800)
+    prompts = _load_full_summary_prompts(config)
+    usage = {"llm_calls": 0, "rounds": 0, "input_tokens": 0, "output_tokens": 0}
+
+    def request(kind, group, index, count, max_tokens):
+        system_prompt, user_prompt_template = prompts[kind]
+        if kind == "map":
+            user_prompt = user_prompt_template.format(paper_title=paper_title, position=_position(index, count), passage="\n\n".join(group))
+        else:
+            user_prompt = user_prompt_template.format(paper_title=paper_title, position=_position(index, count), summaries="\n\n".join(group))
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt},
+        ]
+        return dict(model=model_name, messages=messages, max_tokens=max_tokens, temperature=temperature, top_p=top_p)
+
+    def run_round(executor, kind, groups, max_tokens):
+        # One round trip of wall time: every group of the level is in flight at once (up to max_workers)
+        responses = list(executor.map(
+            lambda args: llm_completion_func(**request(kind, args[1], args[0], len(groups), max_tokens)),
+            enumerate(groups),
+        ))
+        usage["rounds"] += 1
+        usage["llm_calls"] += len(responses)
+        for response in responses:
+            response_usage = parse_llm_usage(response)
+            usage["input_tokens"] += response_usage["input_tokens"] or 0
+            usage["output_tokens"] += response_usage["output_tokens"] or 0
+        return [parse_llm_content(response) or "" for response in responses]
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        groups = group_texts(texts, group_tokens)
+        if len(groups) == 1:
+            # Short paper: the whole text fits one call, which writes the final-length summary directly
+            summaries = run_round(executor, "map", groups, final_max_tokens)
+        else:
+            summaries = run_round(executor, "map", groups, partial_max_tokens)
+            while True:
+                groups = group_texts(summaries, reduce_tokens)
+                if len(groups) == len(summaries):
+                    # Every summary is over half the budget on its own: combine pairs so the tree still shrinks
+                    groups = [summaries[i:i + 2] for i in range(0, len(summaries), 2)]
+                # Intermediate levels keep partial summaries short; the last one writes the final summary
+                summaries = run_round(executor, "reduce", groups, final_max_tokens if len(groups) == 1 else partial_max_tokens)
+                if len(summaries) == 1:
+                    break
+
+    return {"summary": summaries[0], "chunk_count": len(texts), **usage}
@@ -1,6 +1,7 @@
 # summarizer/llm_summarizer.py
 # import litellm  # Keep this if LiteLLM is used directly, or remove if using our wrapper exclusively
 from flask import current_app
+import asyncio
 import os
 # Assuming litellm_service is accessible, adjust import path if necessary
 # If summarizer is outside 'app' package, this direct import won't work.
@@ -19,6 +20,69 @@ def get_llm_completion_function():
     import litellm
     return litellm.completion
 
+def _read_prompt(prompts_dir, file_name):
+    with open(os.path.join(prompts_dir, file_name), "r", encoding="utf-8") as f:
+        return f.read()
+
+def parse_llm_content(response):
+    """Extracts the message text from a LiteLLM (or dict-shaped) completion response."""
+    if hasattr(response, "choices"):
+        return response.choices[0].message.content
+    elif isinstance(response, dict) and "choices" in response:
+        return response["choices"][0]["message"]["content"]
+    elif hasattr(response, "content"): # For some LiteLLM raw responses
+        return response.content
+    return str(response) # Fallback
+
+def parse_llm_usage(response):
+    """Extracts token usage as {'input_tokens', 'output_tokens', 'total_tokens'} (values may be None)."""
+    if hasattr(response, "usage"):
+        usage = response.usage
+        return {
+            "input_tokens": getattr(usage, "prompt_tokens", None) or getattr(usage, "input_tokens", None),
+            "output_tokens": getattr(usage, "completion_tokens", None) or getattr(usage, "output_tokens", None),
+            "total_tokens": getattr(usage, "total_tokens", None),
+        }
+    elif isinstance(response, dict) and "usage" in response:
+        usage = response["usage"]
+        return {
+            "input_tokens": usage.get("prompt_tokens") or usage.get("input_tokens"),
+            "output_tokens": usage.get("completion_tokens") or usage.get("output_tokens"),
+            "total_tokens": usage.get("total_tokens"),
+        }
+    return {"input_tokens": None, "output_tokens": None, "total_tokens": None}
+
+def _load_paper_summary_prompts(config):
+    prompts_dir = config.get('PROMPTS_DIR', 'prompts/') # Default if not in config
+    return _read_prompt(prompts_dir, "sys_role_paper_sum.txt"), _read_prompt(prompts_dir, "user_prompt_paper_sum.txt")
+
+def _paper_summary_request(paper, system_prompt, user_prompt_template, model_name, max_tokens, temperature, top_p):
+    """Returns the completion kwargs for one paper, or None if there is no abstract to summarize."""
+    if not paper.get("abstract", ""):
+        return None
+    messages = [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt_template.format(paper_title=paper.get("title", ""), paper_abstract=paper.get("abstract", ""))},
+    ]
+    return dict(model=model_name, messages=messages, max_tokens=max_tokens, temperature=temperature, top_p=top_p)
+
+def _paper_summary_result(paper, response):
+    """Builds the per-paper summary dict; `response` is None when the paper had no abstract."""
+    if response is None:
+        summary = "Abstract not available to summarize."
+        usage_info = {"input_tokens": 0, "output_tokens": 0, "total_tokens": 0}
+    else:
+        summary = parse_llm_content(response)
+        usage_info = parse_llm_usage(response)
+    return {
+        "paper_id": paper.get("paper_id", ""), # Ensure your arxiv_client provides this
+        "title": paper.get("title", ""),
+        "abstract": paper.get("abstract", ""), # Keep original abstract for reference
+        "summary": summary,
+        "input_tokens": usage_info.get("input_tokens"),
+        "output_tokens": usage_info.get("output_tokens"),
+    }
+
 def summarize_arxiv_papers(
     arxiv_results,
     config, # Pass Flask app.config or a relevant dict
@@ -27,88 +91,40 @@ def summarize_arxiv_papers(
     temperature=0.0,
     top_p=0.5,
 ):
-    prompts_dir = config.get('PROMPTS_DIR', 'prompts/') # Default if not in config
     model_name = config.get('LITELLM_MODEL_SUMMARIZE', 'gemini/gemini-2.0-flash')
-
-    with open(os.path.join(prompts_dir, "sys_role_paper_sum.txt"), "r", encoding="utf-8") as f:
-        system_prompt = f.read()
-    with open(os.path.join(prompts_dir, "user_prompt_paper_sum.txt"), "r", encoding="utf-8") as f:
-        user_prompt_template = f.read() # Renamed for clarity
+    system_prompt, user_prompt_template = _load_paper_summary_prompts(config)
 
     summaries = []
     for paper in arxiv_results:
-        title = paper.get("title", "")
-        abstract = paper.get("abstract", "")
-        paper_id = paper.get("paper_id", "") # Ensure your arxiv_client provides this
-        if not abstract:
-            summary = "Abstract not available to summarize."
-            usage_info = {"input_tokens": 0, "output_tokens": 0, "total_tokens": 0}
-        else:
-            messages = [
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt_template.format(paper_title=title, paper_abstract=abstract)},
-            ]
-            response = llm_completion_func( # Use the passed function
-                model=model_name,
-                messages=messages,
-                max_tokens=max_tokens_per_summary,
-                temperature=temperature,
-                top_p=top_p,
-            )
-            # ... (rest of your response parsing logic remains the same)
-            if hasattr(response, "choices"):
-                summary = response.choices[0].message.content
-            elif isinstance(response, dict) and "choices" in response:
-                summary = response["choices"][0]["message"]["content"]
-            elif hasattr(response, "content"): # For some LiteLLM raw responses
-                summary = response.content
-            else:
-                summary = str(response) # Fallback
-
-            usage_info = {"input_tokens": None, "output_tokens": None, "total_tokens": None}
-            if hasattr(response, "usage"):
-                 usage = response.usage
-                 usage_info = {
-                     "input_tokens": getattr(usage, "prompt_tokens", None) or getattr(usage, "input_tokens", None),
-                     "output_tokens": getattr(usage, "completion_tokens", None) or getattr(usage, "output_tokens", None),
-                     "total_tokens": getattr(usage, "total_tokens", None),
-                 }
-            elif isinstance(response, dict) and "usage" in response:
-                 usage = response["usage"]
-                 usage_info = {
-                     "input_tokens": usage.get("prompt_tokens") or usage.get("input_tokens"),
-                     "output_tokens": usage.get("completion_tokens") or usage.get("output_tokens"),
-                     "total_tokens": usage.get("total_tokens"),
-                 }
-
-
-        summaries.append({
-            "paper_id": paper_id,
-            "title": title,
-            "abstract": abstract, # Keep original abstract for reference
-            "summary": summary,
-            "input_tokens": usage_info.get("input_tokens"),
-            "output_tokens": usage_info.get("output_tokens"),
-        })
+        request = _paper_summary_request(paper, system_prompt, user_prompt_template, model_name, max_tokens_per_summary, temperature, top_p)
+        response = llm_completion_func(**request) if request else None # Use the passed function
+        summaries.append(_paper_summary_result(paper, response))
     return summaries
 
-
-def synthesize_insights_from_summaries(
-    paper_summaries,
-    query,
-    config, # Pass Flask app.config or a relevant dict
-    llm_completion_func, # Pass the completion function
-    max_tokens_synthesis=300, # Renamed for clarity
+async def asummarize_arxiv_papers(
+    arxiv_results,
+    config,
+    allm_completion_func, # Async completion function, e.g. app.services.litellm_service.acompletion
+    max_tokens_per_summary=150,
     temperature=0.0,
     top_p=0.5,
 ):
+    """Async variant of summarize_arxiv_papers; all papers are summarized concurrently."""
+    model_name = config.get('LITELLM_MODEL_SUMMARIZE', 'gemini/gemini-2.0-flash')
+    system_prompt, user_prompt_template = _load_paper_summary_prompts(config)
+
+    async def summarize_one(paper):
+        request = _paper_summary_request(paper, system_prompt, user_prompt_template, model_name, max_tokens_per_summary, temperature, top_p)
+        response = await allm_completion_func(**request) if request else None
+        return _paper_summary_result(paper, response)
+
+    return list(await asyncio.gather(*(summarize_one(paper) for paper in arxiv_results)))
+
+def _synthesis_request(paper_summaries, query, config, max_tokens, temperature, top_p):
     prompts_dir = config.get('PROMPTS_DIR', 'prompts/')
     model_name = config.get('LITELLM_MODEL_SUMMARIZE', 'gemini/gemini-2.0-flash') # Or a different model for synthesis
-
-    with open(os.path.join(prompts_dir, "sys_role_final_response.txt"), "r", encoding="utf-8") as f:
-        system_prompt = f.read()
-    with open(os.path.join(prompts_dir, "user_prompt_final_response.txt"), "r", encoding="utf-8") as f:
-        user_prompt_template = f.read() # Renamed
+    system_prompt = _read_prompt(prompts_dir, "sys_role_final_response.txt")
+    user_prompt_template = _read_prompt(prompts_dir, "user_prompt_final_response.txt")
 
     summaries_str = "\n".join(
         f"[{paper['paper_id']}] Title: {paper['title']}\nSummary: {paper['summary']}"
@@ -118,35 +134,39 @@ def synthesize_insights_from_summaries(
         {"role": "system", "content": system_prompt},
         {"role": "user", "content": user_prompt_template.format(query=query, summaries=summaries_str)},
     ]
-    response = llm_completion_func( # Use the passed function
-        model=model_name,
-        messages=messages,
-        max_tokens=max_tokens_synthesis,
-        temperature=temperature,
-        top_p=top_p,
-    )
-    # ... (rest of your response parsing logic remains the same)
-    if hasattr(response, "choices"):
-        content = response.choices[0].message.content
-    elif isinstance(response, dict) and "choices" in response:
-        content = response["choices"][0]["message"]["content"]
-    elif hasattr(response, "content"):
-        content = response.content
-    else:
-        content = str(response)
+    return dict(model=model_name, messages=messages, max_tokens=max_tokens, temperature=temperature, top_p=top_p)
 
-    result = {
-        "content": content,
-        "input_tokens": None,
-        "output_tokens": None,
+def _synthesis_result(response):
+    usage = parse_llm_usage(response)
+    return {
+        "content": parse_llm_content(response),
+        "input_tokens": usage["input_tokens"],
+        "output_tokens": usage["output_tokens"],
     }
-    if hasattr(response, "usage"):
-         usage = response.usage
-         result["input_tokens"] = getattr(usage, "prompt_tokens", None) or getattr(usage, "input_tokens", None)
-         result["output_tokens"] = getattr(usage, "completion_tokens", None) or getattr(usage, "output_tokens", None)
-    elif isinstance(response, dict) and "usage" in response: # Check for dict based usage
-         usage = response["usage"]
-         result["input_tokens"] = usage.get("prompt_tokens") or usage.get("input_tokens")
-         result["output_tokens"] = usage.get("completion_tokens") or usage.get("output_tokens")
-
-    return result
\ No newline at end of file
+
+def synthesize_insights_from_summaries(
+    paper_summaries,
+    query,
+    config, # Pass Flask app.config or a relevant dict
+    llm_completion_func, # Pass the completion function
+    max_tokens_synthesis=300, # Renamed for clarity
+    temperature=0.0,
+    top_p=0.5,
+):
+    request = _synthesis_request(paper_summaries, query, config, max_tokens_synthesis, temperature, top_p)
+    response = llm_completion_func(**request) # Use the passed function
+    return _synthesis_result(response)
+
+async def asynthesize_insights_from_summaries(
+    paper_summaries,
+    query,
+    config,
+    allm_completion_func,
+    max_tokens_synthesis=300,
+    temperature=0.0,
+    top_p=0.5,
+):
+    """Async variant of synthesize_insights_from_summaries."""
+    request = _synthesis_request(paper_summaries, query, config, max_tokens_synthesis, temperature, top_p)
+    response = await allm_completion_func(**request)
+    return _synthesis_result(response)
\ No newline at end of file